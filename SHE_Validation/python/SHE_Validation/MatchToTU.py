@@ -28,6 +28,7 @@ from SHE_PPT.logging import getLogger
 from SHE_Validation.argument_parser import ValidationArgumentParser
 from SHE_Validation.constants.default_config import (D_VALIDATION_CONFIG_CLINE_ARGS, D_VALIDATION_CONFIG_DEFAULTS,
                                                      D_VALIDATION_CONFIG_TYPES, )
+from SHE_Validation.constants.test_info import NON_GLOBAL_BIN_PARAMETERS
 from SHE_Validation.executor import SheValExecutor, ValLogOptions
 from SHE_Validation.match_to_tu import match_to_tu_from_args
 
@@ -81,8 +82,27 @@ class TUMatchArgumentParser(ValidationArgumentParser):
                           help="OPTION: Path to where the SIM data is stored")
         self.add_argument('--match_threshold', type=float, default=0.3,
                           help="OPTION: Maximum distance allowed for a match in units of arcsec.")
+        self.add_argument('--match_object_union', action="store_true", default=False,
+                          help="OPTION: If set, will match the union of objects across all shear estimation methods "
+                               "once, rather than matching each method's table separately. Matches are the same "
+                               "either way if all methods have the same objects at the same positions, but may "
+                               "differ otherwise.")
+        self.add_argument('--tu_index_dir', type=str, default=None,
+                          help="OPTION: Directory in which to store and look up an index of the positions of sources "
+                               "in the TU catalogs, which will be built the first time it's needed. If not set, no "
+                               "index will be used.")
+        self.add_argument('--num_processes', type=int, default=1,
+                          help="OPTION: Number of processes to use to match tiles in parallel. If 1, tiles will be "
+                               "matched serially. The output is the same regardless of this setting.")
+        self.add_argument('--max_objects_per_tile', type=int, default=None,
+                          help="OPTION: If set, the region will be divided into tiles of roughly equal numbers of "
+                               "objects, with no more than this many each where possible, rather than a regular grid.")
         self.add_argument('--add_bin_columns', action="store_true", default=False,
                           help="OPTION: If set, will add columns to the output catalog with data used for binning.")
+        self.add_argument('--bin_parameters', type=str, nargs="+", default=None,
+                          choices=[bin_parameter.value for bin_parameter in NON_GLOBAL_BIN_PARAMETERS],
+                          help="OPTION: If adding bin columns, the bin parameters to add columns for. If not set, "
+                               "columns will be added for all. Exposures will only be read if 'bg' is included.")
 
 
 # noinspection PyPep8Naming
@@ -0,0 +1,152 @@
+"""
+:file: python/SHE_Validation/binning/bin_bitsets.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Compact representation of which objects are in a bin, as a packed array of bits aligned to a canonical order of
+object IDs
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from typing import Sequence
+
+import numpy as np
+
+from ..table_utility import IDIndex, MISSING_ROW
+
+# Number of bits set in each possible byte value, used to count the bits set in a packed array
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def get_canonical_ids(l_ids: Sequence[int]) -> np.ndarray:
+    """ Gets the canonical order of a list of object IDs which bitsets are aligned to: the sorted, unique IDs.
+    """
+    return np.unique(np.asarray(l_ids))
+
+
+class BinBitset:
+    """ Set of the objects in a bin, stored as a packed array of bits, one for each object in a canonical order of
+        object IDs (see `get_canonical_ids`), set if that object is in the bin. This uses one bit per object rather
+        than the 64 bits per object in the bin needed for an array of IDs, and bitsets can be intersected or combined
+        with fast bitwise operations.
+
+        Bitsets can only be combined if they're aligned to the same canonical IDs, which should be shared between them
+        rather than copied.
+
+        Parameters
+        ----------
+        bits : np.ndarray
+            Packed array of bits (as from `np.packbits`), with at least one bit for each canonical ID
+        l_canonical_ids : np.ndarray
+            The canonical IDs this bitset is aligned to
+    """
+
+    bits: np.ndarray
+    l_canonical_ids: np.ndarray
+
+    def __init__(self,
+                 bits: np.ndarray,
+                 l_canonical_ids: np.ndarray):
+
+        num_bytes = (len(l_canonical_ids) + 7) // 8
+        if len(bits) != num_bytes:
+            raise ValueError(f"Bitset for {len(l_canonical_ids)} objects must have {num_bytes} bytes, but has "
+                             f"{len(bits)}.")
+
+        self.bits = bits
+        self.l_canonical_ids = l_canonical_ids
+
+    # Alternate constructors
+
+    @classmethod
+    def from_mask(cls,
+                  l_is_in_bin: np.ndarray,
+                  l_canonical_ids: np.ndarray) -> "BinBitset":
+        """ Creates a bitset from an array of whether or not each canonical object is in the bin.
+        """
+        return cls(np.packbits(np.asarray(l_is_in_bin, dtype=bool)), l_canonical_ids)
+
+    @classmethod
+    def from_ids(cls,
+                 l_ids: Sequence[int],
+                 l_canonical_ids: np.ndarray) -> "BinBitset":
+        """ Creates a bitset from a list of the IDs of objects in the bin. IDs which aren't in the canonical IDs are
+            ignored.
+        """
+
+        l_is_in_bin: np.ndarray = np.zeros(len(l_canonical_ids), dtype=bool)
+
+        if len(l_canonical_ids) > 0 and len(l_ids) > 0:
+            l_positions: np.ndarray = IDIndex(l_canonical_ids).get_rows(l_ids, allow_missing=True)
+            l_is_in_bin[l_positions[l_positions != MISSING_ROW]] = True
+
+        return cls.from_mask(l_is_in_bin, l_canonical_ids)
+
+    # Operators
+
+    def __and__(self, other: "BinBitset") -> "BinBitset":
+        self._check_aligned(other)
+        return BinBitset(np.bitwise_and(self.bits, other.bits), self.l_canonical_ids)
+
+    def __or__(self, other: "BinBitset") -> "BinBitset":
+        self._check_aligned(other)
+        return BinBitset(np.bitwise_or(self.bits, other.bits), self.l_canonical_ids)
+
+    def __invert__(self) -> "BinBitset":
+
+        bits: np.ndarray = np.invert(self.bits)
+
+        # Make sure the padding bits at the end of the last byte stay unset
+        num_tail_bits = len(self.l_canonical_ids) % 8
+        if num_tail_bits > 0:
+            bits[-1] &= np.uint8((0xFF << (8 - num_tail_bits)) & 0xFF)
+
+        return BinBitset(bits, self.l_canonical_ids)
+
+    # Public methods
+
+    @property
+    def nbytes(self) -> int:
+        """ The memory used by the packed bits, not including the canonical IDs, which are shared between bitsets.
+        """
+        return self.bits.nbytes
+
+    def count(self) -> int:
+        """ Gets the number of objects in the bin.
+        """
+        return int(_POPCOUNT_TABLE[self.bits].sum(dtype=np.int64))
+
+    def to_mask(self) -> np.ndarray:
+        """ Gets an array of whether or not each canonical object is in the bin.
+        """
+        return np.unpackbits(self.bits, count=len(self.l_canonical_ids)).astype(bool)
+
+    def to_ids(self) -> np.ndarray:
+        """ Gets a sorted array of the IDs of the objects in the bin.
+        """
+        return self.l_canonical_ids[self.to_mask()]
+
+    # Private methods
+
+    def _check_aligned(self, other: "BinBitset") -> None:
+        """ Checks that another bitset is aligned to the same canonical IDs as this one.
+        """
+
+        if other.l_canonical_ids is self.l_canonical_ids:
+            return
+
+        if not np.array_equal(other.l_canonical_ids, self.l_canonical_ids):
+            raise ValueError("Bitsets can only be combined if they're aligned to the same canonical IDs.")
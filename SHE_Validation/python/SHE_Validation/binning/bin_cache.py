@@ -0,0 +1,253 @@
+"""
+:file: python/SHE_Validation/binning/bin_cache.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Process-wide cache of which objects are in each bin, to avoid recalculating bin memberships which are requested
+multiple times (e.g. for different test cases which share bins)
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import hashlib
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from astropy.table import Table
+
+from SHE_PPT.logging import getLogger
+
+logger = getLogger(__name__)
+
+# Default maximum total size of the ID arrays stored in the cache
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+
+
+def get_table_version(t: Optional[Table]) -> Optional[Tuple[int, int, Tuple[Tuple[str, int], ...]]]:
+    """ Gets a key which identifies the current version of a table: its identity, length, and the identity of each of
+        its columns. This changes whenever a column is added to, removed from, or replaced in the table, but not if
+        the values in a column are modified in place.
+    """
+
+    if t is None:
+        return None
+
+    return id(t), len(t), tuple((colname, id(t.columns[colname])) for colname in t.colnames)
+
+
+def get_ids_key(l_ids: Optional[Sequence[int]]) -> Optional[Tuple[str, int, str]]:
+    """ Gets a key which identifies the contents of a list of IDs, based on a hash of its data.
+    """
+
+    if l_ids is None:
+        return None
+
+    a_ids: np.ndarray = np.ascontiguousarray(l_ids)
+
+    return str(a_ids.dtype), len(a_ids), hashlib.blake2b(a_ids.tobytes(), digest_size=16).hexdigest()
+
+
+def get_bin_membership_key(bin_constraint_type: type,
+                           bin_parameter: Any,
+                           full_bin_limits: Sequence[float],
+                           l_tables: Sequence[Optional[Table]],
+                           method: Any = None,
+                           full_ids_key: Optional[Hashable] = None) -> Tuple[Hashable, ...]:
+    """ Gets the key to use in the cache for the IDs in each bin for a type of bin constraint applied to a list of
+        tables, optionally restricted to a list of IDs identified by `full_ids_key` (from `get_ids_key`).
+    """
+
+    return (bin_constraint_type,
+            bin_parameter,
+            tuple(np.asarray(full_bin_limits, dtype=float).tolist()),
+            tuple(get_table_version(t) for t in l_tables),
+            method,
+            full_ids_key)
+
+
+def _get_nbytes(l_l_binned_ids: Sequence[Sequence[int]]) -> int:
+    """ Gets the approximate memory used by a list of ID arrays for each bin.
+    """
+
+    return sum(getattr(l_binned_ids, "nbytes", 8 * len(l_binned_ids)) for l_binned_ids in l_l_binned_ids)
+
+
+class BinMembershipCache:
+    """ Least-recently-used cache of the IDs of objects in each bin, with a bound on the total size of the ID arrays
+        stored in it. Entries are keyed by the versions of the tables they were calculated from (see
+        `get_table_version`), so they will no longer be used if bin columns are added to the tables. Entries for tables
+        which have been deleted are discarded.
+
+        The lists of IDs returned from the cache are the same objects stored in it, so they must not be modified.
+
+        Parameters
+        ----------
+        max_bytes : int
+            Maximum total size of the ID arrays stored in the cache. If 0, nothing will be stored.
+    """
+
+    max_bytes: int
+
+    num_hits: int
+    num_misses: int
+    num_evictions: int
+
+    _d_entries: "OrderedDict[Hashable, Tuple[List[Sequence[int]], int]]"
+    _d_table_refs: Dict[int, weakref.ref]
+    _total_bytes: int
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+
+        self.max_bytes = max_bytes
+
+        self._d_entries = OrderedDict()
+        self._d_table_refs = {}
+        self._total_bytes = 0
+
+        self.reset_stats()
+
+    def __len__(self) -> int:
+        return len(self._d_entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._d_entries
+
+    @property
+    def total_bytes(self) -> int:
+        """ The total size of the ID arrays currently stored in the cache.
+        """
+        return self._total_bytes
+
+    def get(self, key: Hashable) -> Optional[List[Sequence[int]]]:
+        """ Gets the list of IDs in each bin stored for a key, or None if it isn't in the cache, updating the hit and
+            miss counters.
+        """
+
+        entry = self._d_entries.get(key)
+
+        if entry is None:
+            self.num_misses += 1
+            return None
+
+        self.num_hits += 1
+        self._d_entries.move_to_end(key)
+
+        # Return a new outer list, so that the cached one can't be modified
+        return list(entry[0])
+
+    def put(self,
+            key: Hashable,
+            l_l_binned_ids: Sequence[Sequence[int]],
+            l_tables: Sequence[Optional[Table]] = ()) -> None:
+        """ Stores the list of IDs in each bin for a key, evicting the least-recently-used entries as needed to stay
+            within the memory bound. If `l_tables` is provided, the entry will be discarded when any of these tables
+            is deleted.
+        """
+
+        nbytes = _get_nbytes(l_l_binned_ids)
+
+        if nbytes > self.max_bytes:
+            logger.debug(f"Not caching bin memberships of size {nbytes} bytes, which exceeds the cache's maximum size "
+                         f"of {self.max_bytes} bytes.")
+            return
+
+        if key in self._d_entries:
+            self._remove(key)
+
+        self._d_entries[key] = (list(l_l_binned_ids), nbytes)
+        self._total_bytes += nbytes
+
+        for t in l_tables:
+            if t is not None:
+                self._watch_table(t)
+
+        while self._total_bytes > self.max_bytes:
+            oldest_key = next(iter(self._d_entries))
+            self._remove(oldest_key)
+            self.num_evictions += 1
+
+    def clear(self) -> None:
+        """ Removes all entries from the cache, without resetting the hit and miss counters.
+        """
+        self._d_entries.clear()
+        self._d_table_refs.clear()
+        self._total_bytes = 0
+
+    def reset_stats(self) -> None:
+        """ Resets the hit, miss, and eviction counters.
+        """
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        """ Gets a dict of the hit, miss, and eviction counters, and the current number and size of entries.
+        """
+        return {"num_hits": self.num_hits,
+                "num_misses": self.num_misses,
+                "num_evictions": self.num_evictions,
+                "num_entries": len(self._d_entries),
+                "total_bytes": self._total_bytes, }
+
+    # Private methods
+
+    def _remove(self, key: Hashable) -> None:
+        """ Removes an entry from the cache.
+        """
+        _, nbytes = self._d_entries.pop(key)
+        self._total_bytes -= nbytes
+
+    def _watch_table(self, t: Table) -> None:
+        """ Sets up entries for a table to be discarded when it's deleted, so that they can't be confused with entries
+            for a new table which happens to reuse its id.
+        """
+
+        table_id = id(t)
+
+        table_ref = self._d_table_refs.get(table_id)
+        if table_ref is not None and table_ref() is t:
+            return
+
+        self._d_table_refs[table_id] = weakref.ref(t, lambda _: self._discard_table(table_id))
+
+    def _discard_table(self, table_id: int) -> None:
+        """ Discards all entries for a table which has been deleted.
+        """
+
+        self._d_table_refs.pop(table_id, None)
+
+        for key in [key for key in self._d_entries if _key_uses_table(key, table_id)]:
+            self._remove(key)
+
+
+def _key_uses_table(key: Hashable, table_id: int) -> bool:
+    """ Checks whether a key from get_bin_membership_key was made using a table with the given id.
+    """
+    try:
+        return any(table_version is not None and table_version[0] == table_id for table_version in key[3])
+    except (TypeError, IndexError):
+        return False
+
+
+# Cache shared by everything in this process which determines bin memberships
+BIN_MEMBERSHIP_CACHE = BinMembershipCache()
+
+
+def get_bin_membership_cache() -> BinMembershipCache:
+    """ Gets the process-wide bin membership cache.
+    """
+    return BIN_MEMBERSHIP_CACHE
@@ -21,10 +21,17 @@ Common functions and classes to aid with binning data
 # the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 import abc
-from typing import Any, Dict, List, Optional, Sequence, Set, Type, Union
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import (Any, Callable, Deque, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple, Type,
+                    Union, )
 
 import numpy as np
-from astropy.table import Column, Row, Table, vstack as table_vstack
+from astropy.io import fits
+from astropy.table import Column, Row, Table
 
 from SHE_PPT.constants.shear_estimation_methods import (D_SHEAR_ESTIMATION_METHOD_TABLE_FORMATS,
                                                         D_SHEAR_ESTIMATION_METHOD_TUM_TABLE_FORMATS,
@@ -35,13 +42,403 @@ from SHE_PPT.she_frame_stack import SHEFrameStack
 from SHE_PPT.table_formats.mer_final_catalog import tf as MFC_TF
 from SHE_PPT.table_formats.she_measurements import SheMeasurementsFormat
 from SHE_PPT.utility import is_nan_or_masked
+from .bin_bitsets import BinBitset, get_canonical_ids
+from .bin_cache import BinMembershipCache, get_bin_membership_cache, get_bin_membership_key, get_ids_key
 from .bin_data import D_COLUMN_ADDING_METHODS, TF as BIN_TF
 from ..constants.default_config import TOT_BIN_LIMITS
 from ..constants.test_info import BinParameters, TestCaseInfo
+from ..table_utility import (IDIndex, MISSING_ROW, TableBuffer, get_id_index, get_table_of_columns,
+                             read_memmapped_table, )
 
 POSSIBLE_BIN_TFS = (BIN_TF, *D_SHEAR_ESTIMATION_METHOD_TABLE_FORMATS.values(),
                     *D_SHEAR_ESTIMATION_METHOD_TUM_TABLE_FORMATS.values())
 
+# Default number of rows to evaluate the predicates of a plan on at a time, small enough that the temporary arrays for
+# each chunk stay in cache
+DEFAULT_PLAN_CHUNK_SIZE = 2 ** 16
+
+# Maximum number of compiled plans kept in the cache shared between bin constraints (see `BinConstraint.compile`)
+MAX_SHARED_PLANS = 256
+
+
+# Immutable predicates and plans for evaluating bin constraints
+
+
+@dataclass(frozen=True)
+class BinPredicate(abc.ABC):
+    """ Abstract base class for a single test of whether rows are in a bin, with everything it depends on (e.g. the
+        name of the column it tests) resolved in advance. Predicates are immutable and hashable, so they can be shared
+        between threads and used as keys to cache their results.
+
+        Parameters
+        ----------
+        colname : Optional[str]
+            The name of the column this predicate tests, or None if it doesn't test a single column.
+    """
+
+    colname: Optional[str]
+
+    @abc.abstractmethod
+    def is_in_bin(self, data: Union[Row, Table]) -> Union[bool, np.ndarray]:
+        """ Checks whether a row, or each row of a table, satisfies this predicate.
+        """
+        pass
+
+    def can_evaluate_in_chunks(self, t: Table) -> bool:
+        """ Checks whether this predicate can be evaluated on chunks of the values in its column of a table with
+            `and_is_in_bin_for_chunk`. If not, it must be evaluated on the whole table with `is_in_bin`.
+        """
+        return False
+
+    def and_is_in_bin_for_chunk(self,
+                                l_values: Optional[np.ndarray],
+                                l_is_masked: Optional[np.ndarray],
+                                l_is_in_bin: np.ndarray) -> None:
+        """ Evaluates this predicate on a chunk of the values in its column (and their mask, if any are masked), and
+            ANDs the result into `l_is_in_bin` in place.
+        """
+        raise NotImplementedError(f"{type(self).__name__} can't be evaluated in chunks.")
+
+
+@dataclass(frozen=True)
+class RangeBinPredicate(BinPredicate):
+    """ Predicate which checks if the value in a column is within a range, excluding NaN and masked values. If the
+        column name is None, everything passes. See RangeBinConstraint.
+
+        Parameters (in addition to those inherited from BinPredicate)
+        ----------
+        bin_limits : Tuple[float, float]
+            The min and max of the range
+        include_min : bool
+            Whether min <= val (True) or min < val (False) is checked
+        include_max : bool
+            Whether val <= max (True) or val < max (False) is checked
+        bin_parameter : Optional[BinParameters]
+            The bin parameter whose bin limits this predicate checks, or None if it doesn't depend on bin limits
+    """
+
+    bin_limits: Tuple[float, float]
+    include_min: bool = True
+    include_max: bool = False
+    bin_parameter: Optional[BinParameters] = None
+
+    def is_in_bin(self, data: Union[Row, Table]) -> Union[bool, np.ndarray]:
+
+        # If the column is None, everything passes as no constraint is applied
+        if self.colname is None:
+            if isinstance(data, Row):
+                return True
+            return True * np.ones(len(data), dtype=bool)
+
+        # First check for any NaN or masked values, and exclude them from the bin
+        l_nan_or_masked = is_nan_or_masked(data[self.colname])
+
+        # Check against min and max, based on whether they're included in the bin or not
+        if self.include_min:
+            l_min_check = self.bin_limits[0] <= data[self.colname]
+        else:
+            l_min_check = self.bin_limits[0] < data[self.colname]
+        if self.include_max:
+            l_max_check = self.bin_limits[1] >= data[self.colname]
+        else:
+            l_max_check = self.bin_limits[1] > data[self.colname]
+
+        l_min_and_max_check = np.logical_and(l_min_check, l_max_check)
+
+        l_in_bin = np.where(l_nan_or_masked, False, l_min_and_max_check)
+
+        return l_in_bin
+
+    def can_evaluate_in_chunks(self, t: Table) -> bool:
+        return self.colname is None or _is_1d_column(t, self.colname)
+
+    def and_is_in_bin_for_chunk(self,
+                                l_values: Optional[np.ndarray],
+                                l_is_masked: Optional[np.ndarray],
+                                l_is_in_bin: np.ndarray) -> None:
+
+        if self.colname is None:
+            return
+
+        # NaN values fail both comparisons, so they don't need to be checked for separately
+        l_check: np.ndarray = np.empty(len(l_is_in_bin), dtype=bool)
+
+        if self.include_min:
+            np.less_equal(self.bin_limits[0], l_values, out=l_check)
+        else:
+            np.less(self.bin_limits[0], l_values, out=l_check)
+        l_is_in_bin &= l_check
+
+        if self.include_max:
+            np.greater_equal(self.bin_limits[1], l_values, out=l_check)
+        else:
+            np.greater(self.bin_limits[1], l_values, out=l_check)
+        l_is_in_bin &= l_check
+
+        if l_is_masked is not None:
+            l_is_in_bin &= ~l_is_masked
+
+
+@dataclass(frozen=True)
+class ValueBinPredicate(BinPredicate):
+    """ Predicate which checks if the value in a column exactly matches (or doesn't) a value. See ValueBinConstraint.
+
+        Parameters (in addition to those inherited from BinPredicate)
+        ----------
+        value : Any
+            The value that must (not) be matched
+        invert : bool
+            If True, checks that the value is not matched
+    """
+
+    value: Any
+    invert: bool = False
+
+    def is_in_bin(self, data: Union[Row, Table]) -> Union[bool, np.ndarray]:
+
+        matches_value: bool = data[self.colname] == self.value
+
+        if not self.invert:
+            return matches_value
+        return np.logical_not(matches_value)
+
+    def can_evaluate_in_chunks(self, t: Table) -> bool:
+        return _is_1d_column(t, self.colname, allow_masked=False)
+
+    def and_is_in_bin_for_chunk(self,
+                                l_values: Optional[np.ndarray],
+                                l_is_masked: Optional[np.ndarray],
+                                l_is_in_bin: np.ndarray) -> None:
+
+        l_matches_value: np.ndarray = np.asarray(l_values == self.value, dtype=bool)
+
+        if self.invert:
+            np.logical_not(l_matches_value, out=l_matches_value)
+        l_is_in_bin &= l_matches_value
+
+
+@dataclass(frozen=True)
+class BitFlagsBinPredicate(BinPredicate):
+    """ Predicate which checks if the value in a column matches (or doesn't) a set of bit flags. See
+        BitFlagsBinConstraint.
+
+        Parameters (in addition to those inherited from BinPredicate)
+        ----------
+        bit_flags : int
+            The bit flags that must (not) be matched
+        invert : bool
+            If True, checks that the bit flags are not matched
+    """
+
+    bit_flags: int
+    invert: bool = False
+
+    def is_in_bin(self, data: Union[Row, Table]) -> Union[bool, np.ndarray]:
+
+        # Perform a bitwise and to check against the flags
+        flag_match: Union[int, np.ndarray] = np.bitwise_and(data[self.colname], self.bit_flags)
+
+        # Convert to bool or array of bools
+        if isinstance(flag_match, np.ndarray):
+            bool_flag_match = flag_match.astype(bool)
+        else:
+            bool_flag_match = bool(flag_match)
+
+        # Invert if desired and return
+        if not self.invert:
+            return bool_flag_match
+        return np.logical_not(bool_flag_match)
+
+    def can_evaluate_in_chunks(self, t: Table) -> bool:
+        return _is_1d_column(t, self.colname, allow_masked=False)
+
+    def and_is_in_bin_for_chunk(self,
+                                l_values: Optional[np.ndarray],
+                                l_is_masked: Optional[np.ndarray],
+                                l_is_in_bin: np.ndarray) -> None:
+
+        l_flag_match: np.ndarray = np.bitwise_and(l_values, self.bit_flags).astype(bool)
+
+        if self.invert:
+            np.logical_not(l_flag_match, out=l_flag_match)
+        l_is_in_bin &= l_flag_match
+
+
+@dataclass(frozen=True)
+class BinConstraintPredicate(BinPredicate):
+    """ Predicate which applies a bin constraint directly, for types of bin constraints which don't provide their own
+        predicates. This is compared and hashed by the identity of the bin constraint.
+
+        Parameters (in addition to those inherited from BinPredicate)
+        ----------
+        bin_constraint : BinConstraint
+            The bin constraint to apply
+        data_stack : Optional[SHEFrameStack]
+            (Optional) The data stack to pass to the bin constraint
+    """
+
+    bin_constraint: "BinConstraint"
+    data_stack: Optional[SHEFrameStack] = None
+
+    def is_in_bin(self, data: Union[Row, Table]) -> Union[bool, np.ndarray]:
+        return self.bin_constraint.is_in_bin(data, data_stack=self.data_stack)
+
+
+@dataclass(frozen=True)
+class BinConstraintPlan:
+    """ Immutable plan for evaluating a bin constraint, compiled against the schema of a table (see
+        `BinConstraint.compile`). This holds an ordered list of predicates, with all column names resolved and any
+        missing bin data columns already added to the table, so it can be applied to many tables with the same schema,
+        and re-targeted to other bin limits, without repeating that work.
+
+        Parameters
+        ----------
+        l_predicates : Tuple[BinPredicate, ...]
+            The predicates which rows must all satisfy to be in the bin, in the order they're evaluated
+    """
+
+    l_predicates: Tuple[BinPredicate, ...]
+
+    @property
+    def l_required_colnames(self) -> Tuple[str, ...]:
+        """ The names of the columns a table must have for this plan to be applied to it, in the order they're first
+            used.
+        """
+        return tuple(dict.fromkeys(predicate.colname for predicate in self.l_predicates
+                                   if predicate.colname is not None))
+
+    @property
+    def l_binned_predicates(self) -> Tuple[RangeBinPredicate, ...]:
+        """ The predicates which depend on the bin limits for a bin parameter.
+        """
+        return tuple(predicate for predicate in self.l_predicates
+                     if isinstance(predicate, RangeBinPredicate) and predicate.bin_parameter is not None)
+
+    def is_compatible(self, t: Union[Row, Table]) -> bool:
+        """ Checks whether a table has all the columns needed to apply this plan to it.
+        """
+        s_colnames = set(t.colnames)
+        return all(colname in s_colnames for colname in self.l_required_colnames)
+
+    def is_in_bin(self, data: Union[Row, Table]) -> Union[bool, np.ndarray]:
+        """ Checks whether a row, or each row of a table, satisfies all predicates of this plan.
+        """
+
+        if isinstance(data, Table):
+            return self.get_l_is_row_in_bin(data)
+
+        if len(self.l_predicates) == 0:
+            return True
+
+        return np.logical_and.reduce([predicate.is_in_bin(data) for predicate in self.l_predicates])
+
+    def get_l_is_row_in_bin(self,
+                            t: Table,
+                            chunk_size: int = DEFAULT_PLAN_CHUNK_SIZE) -> np.ndarray:
+        """ Gets whether each row of a table satisfies all predicates of this plan. The table is processed in chunks
+            of rows, with each predicate ANDed in place into a single output mask, so that only small temporary arrays
+            are needed. Once no rows in a chunk are left in the bin, the remaining predicates are skipped for it.
+        """
+
+        num_rows: int = len(t)
+        l_is_row_in_bin: np.ndarray = np.ones(num_rows, dtype=bool)
+
+        # Predicates which can't be evaluated in chunks are evaluated on the whole table first
+        l_chunked_predicates: List[Tuple[BinPredicate, Optional[np.ndarray], Optional[np.ndarray]]] = []
+        for predicate in self.l_predicates:
+            if predicate.can_evaluate_in_chunks(t):
+                l_chunked_predicates.append((predicate, *_get_values_and_mask(t, predicate.colname)))
+            else:
+                l_is_row_in_bin &= np.asarray(predicate.is_in_bin(t), dtype=bool)
+
+        for start in range(0, num_rows, chunk_size):
+            stop: int = min(start + chunk_size, num_rows)
+
+            # Take a view of the output for this chunk, so that predicates are ANDed into it in place
+            l_is_chunk_in_bin: np.ndarray = l_is_row_in_bin[start:stop]
+
+            for predicate, l_values, l_is_masked in l_chunked_predicates:
+                if not l_is_chunk_in_bin.any():
+                    break
+                predicate.and_is_in_bin_for_chunk(None if l_values is None else l_values[start:stop],
+                                                  None if l_is_masked is None else l_is_masked[start:stop],
+                                                  l_is_chunk_in_bin)
+
+        return l_is_row_in_bin
+
+    def with_bin_limits(self, bin_limits: Sequence[float]) -> "BinConstraintPlan":
+        """ Gets a copy of this plan which checks against different bin limits for its bin parameter.
+        """
+
+        l_binned_predicates = self.l_binned_predicates
+
+        return BinConstraintPlan(tuple(replace(predicate, bin_limits=tuple(bin_limits))
+                                       if predicate in l_binned_predicates else predicate
+                                       for predicate in self.l_predicates))
+
+
+def _is_1d_column(t: Table,
+                  colname: str,
+                  allow_masked: bool = True) -> bool:
+    """ Checks whether a table has a one-dimensional column with the given name, and optionally that it isn't masked.
+    """
+
+    if colname not in t.colnames:
+        return False
+
+    col: Column = t[colname]
+
+    return col.ndim == 1 and (allow_masked or not isinstance(col, np.ma.MaskedArray))
+
+
+def _get_values_and_mask(t: Table,
+                         colname: Optional[str]) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """ Gets arrays of the values in a column of a table and whether each is masked, without copying the column. The
+        mask is None if no values are masked, and both are None if the column name is None.
+    """
+
+    if colname is None:
+        return None, None
+
+    col: Column = t[colname]
+
+    l_is_masked: Optional[np.ndarray] = None
+    if isinstance(col, np.ma.MaskedArray):
+        l_is_masked = np.ma.getmaskarray(col)
+        if not l_is_masked.any():
+            l_is_masked = None
+
+    return np.asarray(col), l_is_masked
+
+
+# Cache of compiled plans shared between bin constraints, keyed on their plan keys (see `BinConstraint.get_plan_key`)
+# and the column names of the tables they were compiled against
+_d_shared_plans: "OrderedDict[Hashable, BinConstraintPlan]" = OrderedDict()
+_shared_plans_lock = threading.Lock()
+
+
+def _get_shared_plan(key: Hashable) -> Optional[BinConstraintPlan]:
+    """ Gets a plan from the shared cache, or None if it isn't in it.
+    """
+
+    with _shared_plans_lock:
+        plan: Optional[BinConstraintPlan] = _d_shared_plans.get(key)
+        if plan is not None:
+            _d_shared_plans.move_to_end(key)
+        return plan
+
+
+def _put_shared_plan(key: Hashable,
+                     plan: BinConstraintPlan) -> None:
+    """ Adds a plan to the shared cache, discarding the least-recently-used plans if it's full.
+    """
+
+    with _shared_plans_lock:
+        _d_shared_plans[key] = plan
+        _d_shared_plans.move_to_end(key)
+        while len(_d_shared_plans) > MAX_SHARED_PLANS:
+            _d_shared_plans.popitem(last=False)
+
 
 class BinConstraint(abc.ABC):
     """ Abstract base class describing a single requirement for an object (row) to fall within a bin.
@@ -54,12 +451,16 @@ class BinConstraint(abc.ABC):
 
     bin_parameter: Optional[BinParameters] = None
 
+    _d_plans: Dict[Tuple[Tuple[str, ...], int], BinConstraintPlan]
+
     def __init__(self, bin_parameter: Optional[BinParameters] = None):
         """ Initializes values only if not None, to allow simple overriding in inherited classes.
         """
         if bin_parameter:
             self.bin_parameter = bin_parameter
 
+        self._d_plans = {}
+
     # Protected methods
 
     @abc.abstractmethod
@@ -101,6 +502,77 @@ class BinConstraint(abc.ABC):
 
         return l_is_row_in_bin
 
+    def get_l_predicates(self,
+                         t: Union[Row, Table],
+                         data_stack: Optional[SHEFrameStack] = None) -> List[BinPredicate]:
+        """ Gets the list of predicates which a row must satisfy to meet this bin constraint, resolved against the
+            columns of the provided table. Subclasses should override this to provide predicates which can be
+            evaluated without referring back to the bin constraint; by default, a predicate which applies the bin
+            constraint directly is returned.
+        """
+        return [BinConstraintPredicate(colname=None, bin_constraint=self, data_stack=data_stack)]
+
+    def compile(self,
+                t: Union[Row, Table],
+                data_stack: Optional[SHEFrameStack] = None) -> BinConstraintPlan:
+        """ Compiles this bin constraint against the schema of a table into an immutable plan for evaluating it, adding
+            any bin data columns missing from the table. The plan can then be applied to this table and any others
+            with the same schema, without repeating that work.
+
+            Parameters
+            ----------
+            t : astropy.table.Table
+                The table to compile the bin constraint against
+            data_stack : Optional[SHEFrameStack]
+                (Optional) A data stack to use to add any bin data columns missing from the table
+
+            Return
+            ------
+            plan : BinConstraintPlan
+                The compiled plan
+        """
+
+        # Plans are cached keyed on the column names of the table after compiling, since compiling may add columns to
+        # it, and a table without those columns will need them added again
+        plan_key: Optional[Hashable] = self.get_plan_key()
+
+        if plan_key is None:
+            # Plans for this bin constraint can't be shared, so cache them here. These are also keyed on the data stack,
+            # since the predicates may refer to it
+            plan: Optional[BinConstraintPlan] = self._d_plans.get((tuple(t.colnames), id(data_stack)))
+            if plan is None:
+                plan = BinConstraintPlan(tuple(self.get_l_predicates(t, data_stack=data_stack)))
+                self._d_plans[(tuple(t.colnames), id(data_stack))] = plan
+            return plan
+
+        plan = _get_shared_plan((plan_key, tuple(t.colnames)))
+        if plan is None:
+            plan = BinConstraintPlan(tuple(self.get_l_predicates(t, data_stack=data_stack)))
+            _put_shared_plan((plan_key, tuple(t.colnames)), plan)
+            return plan
+
+        # The shared plan may have been compiled for a bin constraint with other bin limits, so re-target it to ours
+        binned_bin_limits: Optional[Tuple[float, ...]] = self.get_binned_bin_limits()
+        if binned_bin_limits is not None:
+            plan = plan.with_bin_limits(binned_bin_limits)
+
+        return plan
+
+    def get_plan_key(self) -> Optional[Hashable]:
+        """ Gets a key identifying the plan this bin constraint compiles to against a table, apart from the bin limits
+            for its bin parameter (see `get_binned_bin_limits`). Bin constraints with the same plan key share compiled
+            plans (see `compile`). Returns None if plans can't be shared with other bin constraints, which is the
+            default; subclasses which override `get_l_predicates` should override this to return a key of everything
+            the predicates depend on other than the table.
+        """
+        return None
+
+    def get_binned_bin_limits(self) -> Optional[Tuple[float, ...]]:
+        """ Gets the bin limits for the bin parameter this bin constraint checks, which are left out of its plan key,
+            or None if it doesn't check one.
+        """
+        return None
+
     def get_rows_in_bin(self,
                         t: Table,
                         l_full_ids: Optional[Sequence[int]] = None,
@@ -203,30 +675,30 @@ class RangeBinConstraint(BinConstraint):
                   *_args, **_kwargs) -> Union[bool, np.ndarray]:
         """ Checks if the data is within the bin limits.
         """
-        # If the column is None, everything passes as no constraint is applied
-        if self.bin_colname is None:
-            if isinstance(data, Row):
-                return True
-            return True * np.ones(len(data), dtype=bool)
+        return self._get_predicate(self.bin_colname).is_in_bin(data)
 
-        # First check for any NaN or masked values, and exclude them from the bin
-        l_nan_or_masked = is_nan_or_masked(data[self.bin_colname])
+    # Public methods
 
-        # Check against min and max, based on whether they're included in the bin or not
-        if self.include_min:
-            l_min_check = self.bin_limits[0] <= data[self.bin_colname]
-        else:
-            l_min_check = self.bin_limits[0] < data[self.bin_colname]
-        if self.include_max:
-            l_max_check = self.bin_limits[1] >= data[self.bin_colname]
-        else:
-            l_max_check = self.bin_limits[1] > data[self.bin_colname]
+    def get_l_predicates(self,
+                         t: Union[Row, Table],
+                         data_stack: Optional[SHEFrameStack] = None) -> List[BinPredicate]:
+        return [self._get_predicate(self.bin_colname)]
 
-        l_min_and_max_check = np.logical_and(l_min_check, l_max_check)
+    def get_plan_key(self) -> Optional[Hashable]:
+        return type(self), self.bin_colname, tuple(self.bin_limits), self.include_min, self.include_max
 
-        l_in_bin = np.where(l_nan_or_masked, False, l_min_and_max_check)
+    # Private methods
 
-        return l_in_bin
+    def _get_predicate(self,
+                       bin_colname: Optional[str],
+                       bin_parameter: Optional[BinParameters] = None) -> RangeBinPredicate:
+        """ Gets the predicate for this bin constraint applied to the given column.
+        """
+        return RangeBinPredicate(colname=bin_colname,
+                                 bin_limits=tuple(self.bin_limits),
+                                 include_min=self.include_min,
+                                 include_max=self.include_max,
+                                 bin_parameter=bin_parameter)
 
 
 class ValueBinConstraint(BinConstraint):
@@ -270,11 +742,19 @@ class ValueBinConstraint(BinConstraint):
                   *_args, **_kwargs) -> Union[bool, np.ndarray]:
         """ Checks if the data (does not) matches the desired value.
         """
-        matches_value: bool = data[self.bin_colname] == self.value
+        return self.get_l_predicates(data)[0].is_in_bin(data)
 
-        if not self.invert:
-            return matches_value
-        return np.logical_not(matches_value)
+    # Public methods
+
+    def get_l_predicates(self,
+                         t: Union[Row, Table],
+                         data_stack: Optional[SHEFrameStack] = None) -> List[BinPredicate]:
+        return [ValueBinPredicate(colname=self.bin_colname, value=self.value, invert=self.invert)]
+
+    def get_plan_key(self) -> Optional[Hashable]:
+        if not isinstance(self.value, Hashable):
+            return None
+        return type(self), self.bin_colname, self.value, self.invert
 
 
 class BitFlagsBinConstraint(BinConstraint):
@@ -318,19 +798,17 @@ class BitFlagsBinConstraint(BinConstraint):
                   *_args, **_kwargs) -> Union[bool, np.ndarray]:
         """ Checks if the data (does not) match the flags.
         """
-        # Perform a bitwise and to check against the flags
-        flag_match: Union[int, np.ndarray] = np.bitwise_and(data[self.bin_colname], self.bit_flags)
+        return self.get_l_predicates(data)[0].is_in_bin(data)
 
-        # Convert to bool or array of bools
-        if isinstance(flag_match, np.ndarray):
-            bool_flag_match = flag_match.astype(bool)
-        else:
-            bool_flag_match = bool(flag_match)
+    # Public methods
 
-        # Invert if desired and return
-        if not self.invert:
-            return bool_flag_match
-        return np.logical_not(bool_flag_match)
+    def get_l_predicates(self,
+                         t: Union[Row, Table],
+                         data_stack: Optional[SHEFrameStack] = None) -> List[BinPredicate]:
+        return [BitFlagsBinPredicate(colname=self.bin_colname, bit_flags=self.bit_flags, invert=self.invert)]
+
+    def get_plan_key(self) -> Optional[Hashable]:
+        return type(self), self.bin_colname, self.bit_flags, self.invert
 
 
 class MultiBinConstraint(BinConstraint):
@@ -351,13 +829,54 @@ class MultiBinConstraint(BinConstraint):
 
     def is_in_bin(self, data: Union[Row, Table],
                   *args, **kwargs) -> Union[bool, np.ndarray]:
-        """ Checks if the data is in all bin constraints.
+        """ Checks if the data is in all bin constraints. For a table, this compiles the bin constraints and evaluates
+            them all together in chunks of rows (see `BinConstraintPlan.get_l_is_row_in_bin`).
         """
 
+        if isinstance(data, Table):
+            return self.compile(data, data_stack=kwargs.get("data_stack")).get_l_is_row_in_bin(data)
+
         l_l_is_in_bin: List[np.ndarray] = [bin_constraint.is_in_bin(data, *args, **kwargs)
                                            for bin_constraint in self.l_bin_constraints]
         return np.logical_and.reduce(l_l_is_in_bin)
 
+    # Public methods
+
+    def get_l_predicates(self,
+                         t: Union[Row, Table],
+                         data_stack: Optional[SHEFrameStack] = None) -> List[BinPredicate]:
+        """ Gets the predicates of all bin constraints, in order.
+        """
+        return [predicate
+                for bin_constraint in self.l_bin_constraints
+                for predicate in bin_constraint.get_l_predicates(t, data_stack=data_stack)]
+
+    def get_plan_key(self) -> Optional[Hashable]:
+        """ Gets a key made up of the plan keys of all bin constraints, or None if plans for any of them can't be
+            shared, or if more than one checks a bin parameter, since a plan can then only be re-targeted to a single
+            set of bin limits.
+        """
+
+        l_plan_keys: List[Optional[Hashable]] = [bin_constraint.get_plan_key()
+                                                 for bin_constraint in self.l_bin_constraints]
+        if any(plan_key is None for plan_key in l_plan_keys) or len(self._get_l_binned_bin_limits()) > 1:
+            return None
+
+        return type(self), tuple(l_plan_keys)
+
+    def get_binned_bin_limits(self) -> Optional[Tuple[float, ...]]:
+        l_binned_bin_limits = self._get_l_binned_bin_limits()
+        return l_binned_bin_limits[0] if len(l_binned_bin_limits) == 1 else None
+
+    # Private methods
+
+    def _get_l_binned_bin_limits(self) -> List[Tuple[float, ...]]:
+        """ Gets the bin limits for the bin parameter of each bin constraint which checks one.
+        """
+        return [binned_bin_limits for binned_bin_limits in (bin_constraint.get_binned_bin_limits()
+                                                            for bin_constraint in self.l_bin_constraints)
+                if binned_bin_limits is not None]
+
 
 class HeteroBinConstraint:
     """ Class for constraining on the intersection of multiple bins on multiple tables.
@@ -379,13 +898,50 @@ class HeteroBinConstraint:
                        l_full_ids: Optional[Sequence[int]] = None,
                        *args, **kwargs) -> Sequence[int]:
         """ Checks if the data is in all bin constraints, where the list of tables
-            is aligned with the list of bin constraints
+            is aligned with the list of bin constraints, and returns a sorted array of the IDs of objects which are.
         """
 
-        l_s_ids_in_bin: List[Set[int]] = [
-            set(bin_constraint.get_ids_in_bin(table, *args, l_full_ids=l_full_ids, **kwargs))
-            for bin_constraint, table in zip(self.l_bin_constraints, l_tables)]
-        return np.array(list(set.intersection(*l_s_ids_in_bin)))
+        l_l_ids_in_bin: List[Sequence[int]] = [bin_constraint.get_ids_in_bin(table, *args, l_full_ids=l_full_ids,
+                                                                             **kwargs)
+                                               for bin_constraint, table in zip(self.l_bin_constraints, l_tables)]
+        return get_intersection_of_ids(l_l_ids_in_bin)
+
+
+def get_intersection_of_ids(l_l_ids: Sequence[Sequence[int]]) -> np.ndarray:
+    """ Gets a sorted array of the unique IDs which are in all of the provided lists of IDs.
+    """
+
+    l_a_ids: List[np.ndarray] = [_get_sorted_unique_ids(l_ids) for l_ids in l_l_ids]
+
+    # Use the integer type of the non-empty lists for the output, so that empty lists (which default to float) don't
+    # change it
+    l_dtypes = [a_ids.dtype for a_ids in l_a_ids if len(a_ids) > 0]
+    dtype = np.result_type(*l_dtypes) if len(l_dtypes) > 0 else int
+
+    # Intersect the arrays in order of increasing size, so that the intermediate results are as small as possible
+    l_a_ids.sort(key=len)
+    a_ids_in_all: np.ndarray = l_a_ids[0]
+    for a_ids in l_a_ids[1:]:
+        a_ids_in_all = np.intersect1d(a_ids_in_all, a_ids, assume_unique=True)
+
+    return a_ids_in_all.astype(dtype, copy=False)
+
+
+def _get_sorted_unique_ids(l_ids: Sequence[int]) -> np.ndarray:
+    """ Gets a sorted array of the unique IDs in a list. This sorts and then drops repeated IDs, which is much faster
+        for large arrays of IDs than np.unique in some versions of NumPy.
+    """
+
+    a_sorted_ids: np.ndarray = np.sort(np.asarray(l_ids))
+
+    if len(a_sorted_ids) == 0:
+        return a_sorted_ids
+
+    l_is_first = np.empty(len(a_sorted_ids), dtype=bool)
+    l_is_first[0] = True
+    np.not_equal(a_sorted_ids[1:], a_sorted_ids[:-1], out=l_is_first[1:])
+
+    return a_sorted_ids[l_is_first]
 
 
 # Bin constraints for specific use cases
@@ -452,10 +1008,53 @@ class BinParameterBinConstraint(RangeBinConstraint):
                   **_kwargs) -> Union[bool, np.ndarray]:
         """ Need to check what implementation we need based on the bin parameter.
         """
+        return self.compile(data, data_stack=data_stack).is_in_bin(data)
+
+    # Public methods
+
+    def get_l_predicates(self,
+                         t: Union[Row, Table],
+                         data_stack: Optional[SHEFrameStack] = None) -> List[BinPredicate]:
+        """ Gets the predicate for this bin constraint, resolving which column of the table the data for the bin
+            parameter is in, and adding it if necessary.
+        """
+        return [self._get_predicate(self._get_bin_colname(t, data_stack=data_stack),
+                                    bin_parameter=self.bin_parameter)]
+
+    def get_plan_key(self) -> Optional[Hashable]:
+        """ Gets a key for the plan, leaving out the bin limits, so that plans are shared between bins.
+        """
+        return type(self), self.bin_parameter, self.include_min, self.include_max
+
+    def get_binned_bin_limits(self) -> Optional[Tuple[float, ...]]:
+        return tuple(self.bin_limits)
+
+    def get_bin_data(self,
+                     data: Union[Row, Table],
+                     data_stack: Optional[SHEFrameStack] = None) -> Optional[Column]:
+        """ Gets the data for this bin parameter from the table, adding a column for it if necessary, or None for the
+            TOT case, where no data is needed.
+        """
+
+        bin_colname: Optional[str] = self._get_bin_colname(data, data_stack=data_stack)
+
+        if bin_colname is None:
+            return None
+
+        return data[bin_colname]
+
+    # Private methods
+
+    def _get_bin_colname(self,
+                         data: Union[Row, Table],
+                         data_stack: Optional[SHEFrameStack] = None) -> Optional[str]:
+        """ Determines the name of the column the data for this bin parameter is in, adding a column for it if
+            necessary, or None for the TOT case, where no data is needed.
+        """
 
         # For TOT case, we don't need any special setup
         if self.bin_parameter == BinParameters.TOT:
-            return super().is_in_bin(data)
+            return None
 
         new_bin_colname: Optional[str] = None
 
@@ -484,9 +1083,7 @@ class BinParameterBinConstraint(RangeBinConstraint):
         if new_bin_colname not in data.colnames:
             D_COLUMN_ADDING_METHODS[self.bin_parameter](data, data_stack)
 
-        self.bin_colname = new_bin_colname
-
-        return super().is_in_bin(data)
+        return new_bin_colname
 
 
 class FitclassZeroBinConstraint(ValueBinConstraint):
@@ -652,6 +1249,310 @@ class GoodBinnedGalaxyMeasurementHBC(HeteroBinConstraint):
         super().__init__(l_bin_constraints=[det_bin_bc, good_meas_bc])
 
 
+# Engine to apply bin constraints for all bins at once
+
+
+class BinAssignmentEngine:
+    """ Class to get the IDs of objects in each bin for many bin constraints, evaluating each part of them on each
+        table only once. When applying a bin constraint separately to each bin of each test case, the full tables are
+        rescanned for each, recalculating everything which doesn't depend on the bin limits (e.g. the good-measurement
+        mask for a method) each time.
+
+        Instead, this compiles each bin constraint against the table it applies to (see `BinConstraint.compile`), and
+        splits the plan into the predicate which depends on the bin limits and the predicates which don't. The latter
+        are each evaluated once per table and cached, and the index of the bin each object falls into is determined
+        once per bin column and set of bin limits. The IDs in each bin are then
+        found from these in a single grouping pass. The results are the same as from applying a bin constraint with
+        each set of bin limits in turn.
+
+        Parameters
+        ----------
+        l_full_ids : Optional[Sequence[int]]
+            (Optional) A list of IDs to check. If not provided, all IDs in the tables will be checked.
+        data_stack : Optional[SHEFrameStack]
+            (Optional) A data stack to use to add any bin data columns missing from the detections table.
+    """
+
+    l_full_ids: Optional[Sequence[int]]
+    data_stack: Optional[SHEFrameStack]
+
+    _d_l_is_row_in_bin: Dict[Tuple[int, BinPredicate], np.ndarray]
+    _d_l_bin_indices: Dict[Tuple[int, Optional[str], Tuple[float, ...]], Optional[np.ndarray]]
+    _d_l_is_id_in_full_ids: Dict[int, np.ndarray]
+    _d_l_canonical_positions: Dict[Tuple[int, int], np.ndarray]
+
+    def __init__(self,
+                 l_full_ids: Optional[Sequence[int]] = None,
+                 data_stack: Optional[SHEFrameStack] = None):
+
+        self.l_full_ids = l_full_ids
+        self.data_stack = data_stack
+
+        self._d_l_is_row_in_bin = {}
+        self._d_l_bin_indices = {}
+        self._d_l_is_id_in_full_ids = {}
+        self._d_l_canonical_positions = {}
+
+    # Public methods
+
+    def get_l_l_binned_ids(self,
+                           bin_constraint_type: Type,
+                           bin_parameter: BinParameters,
+                           full_bin_limits: Sequence[float],
+                           detections_table: Table,
+                           measurements_table: Optional[Table] = None,
+                           method: Optional[ShearEstimationMethods] = None) -> Optional[List[Sequence[int]]]:
+        """ Gets a list of the IDs in each bin for a type of bin constraint, in the same format as would be given by
+            applying it to each bin in turn. If the type is a HeteroBinConstraint, `method` must be provided, and the
+            constraints are applied to the detections and measurements tables in turn; if no measurements table is
+            provided in this case, no IDs will be in any bin.
+
+            Returns None if the bin constraint can't be split up to be evaluated for all bins at once (e.g. if it
+            depends on more than one bin parameter, the bin limits aren't sorted, or both the min and max of each bin
+            are included in it, so that values at a limit are in two bins), in which case it should be applied to
+            each bin in turn instead.
+        """
+
+        num_bins: int = len(full_bin_limits) - 1
+
+        l_bin_constraints_and_tables = self._get_l_bin_constraints_and_tables(bin_constraint_type=bin_constraint_type,
+                                                                              bin_parameter=bin_parameter,
+                                                                              full_bin_limits=full_bin_limits,
+                                                                              detections_table=detections_table,
+                                                                              measurements_table=measurements_table,
+                                                                              method=method)
+        if l_bin_constraints_and_tables is None:
+            return [[] for _ in range(num_bins)]
+
+        # Get the IDs in each bin for each table
+        l_l_l_table_binned_ids: List[List[Column]] = []
+        for bin_constraint, t in l_bin_constraints_and_tables:
+            l_l_table_binned_rows = self._get_l_l_table_binned_rows(bin_constraint=bin_constraint,
+                                                                    full_bin_limits=full_bin_limits,
+                                                                    t=t)
+            if l_l_table_binned_rows is None:
+                return None
+            l_ids: Column = t[MFC_TF.ID]
+            l_l_l_table_binned_ids.append([l_ids[l_rows] for l_rows in l_l_table_binned_rows])
+
+        if len(l_l_l_table_binned_ids) == 1:
+            return l_l_l_table_binned_ids[0]
+
+        # For a HeteroBinConstraint, take the intersection of the IDs in each bin for each table
+        return [get_intersection_of_ids(l_l_ids_in_bin) for l_l_ids_in_bin in zip(*l_l_l_table_binned_ids)]
+
+    def get_l_binned_bitsets(self,
+                             bin_constraint_type: Type,
+                             bin_parameter: BinParameters,
+                             full_bin_limits: Sequence[float],
+                             detections_table: Table,
+                             l_canonical_ids: np.ndarray,
+                             measurements_table: Optional[Table] = None,
+                             method: Optional[ShearEstimationMethods] = None) -> Optional[List[BinBitset]]:
+        """ As `get_l_l_binned_ids`, except gets a bitset aligned to the provided canonical IDs for each bin. Objects
+            with IDs which aren't in the canonical IDs are left out. For a HeteroBinConstraint, the bitsets for each
+            table are intersected with a bitwise and.
+        """
+
+        num_bins: int = len(full_bin_limits) - 1
+
+        l_bin_constraints_and_tables = self._get_l_bin_constraints_and_tables(bin_constraint_type=bin_constraint_type,
+                                                                              bin_parameter=bin_parameter,
+                                                                              full_bin_limits=full_bin_limits,
+                                                                              detections_table=detections_table,
+                                                                              measurements_table=measurements_table,
+                                                                              method=method)
+        if l_bin_constraints_and_tables is None:
+            return [BinBitset.from_ids([], l_canonical_ids) for _ in range(num_bins)]
+
+        l_binned_bitsets: Optional[List[BinBitset]] = None
+        for bin_constraint, t in l_bin_constraints_and_tables:
+            l_l_table_binned_rows = self._get_l_l_table_binned_rows(bin_constraint=bin_constraint,
+                                                                    full_bin_limits=full_bin_limits,
+                                                                    t=t)
+            if l_l_table_binned_rows is None:
+                return None
+
+            # Get the position of each row in the canonical order, and make a bitset for each bin from these
+            l_positions: np.ndarray = self._get_l_canonical_positions(t, l_canonical_ids)
+
+            l_table_binned_bitsets: List[BinBitset] = []
+            for l_rows in l_l_table_binned_rows:
+                l_row_positions = l_positions[l_rows]
+                l_is_in_bin = np.zeros(len(l_canonical_ids), dtype=bool)
+                l_is_in_bin[l_row_positions[l_row_positions != MISSING_ROW]] = True
+                l_table_binned_bitsets.append(BinBitset.from_mask(l_is_in_bin, l_canonical_ids))
+
+            if l_binned_bitsets is None:
+                l_binned_bitsets = l_table_binned_bitsets
+            else:
+                l_binned_bitsets = [binned_bitset & table_binned_bitset
+                                    for binned_bitset, table_binned_bitset in zip(l_binned_bitsets,
+                                                                                  l_table_binned_bitsets)]
+
+        return l_binned_bitsets
+
+    # Private methods
+
+    @staticmethod
+    def _get_l_bin_constraints_and_tables(bin_constraint_type: Type,
+                                          bin_parameter: BinParameters,
+                                          full_bin_limits: Sequence[float],
+                                          detections_table: Table,
+                                          measurements_table: Optional[Table],
+                                          method: Optional[ShearEstimationMethods]
+                                          ) -> Optional[List[Tuple[BinConstraint, Table]]]:
+        """ Makes a bin constraint of the desired type for the first bin, to determine its structure, and gets a list
+            of each constraint it's made up of and the table it applies to. Returns None for a HeteroBinConstraint if
+            there's no measurements table, in which case no objects are in any bin.
+        """
+
+        bin_limits: Sequence[float] = full_bin_limits[0:2]
+
+        if not issubclass(bin_constraint_type, HeteroBinConstraint):
+            return [(bin_constraint_type(bin_parameter=bin_parameter, bin_limits=bin_limits), detections_table)]
+
+        if measurements_table is None:
+            return None
+
+        hetero_bin_constraint: HeteroBinConstraint = bin_constraint_type(method=method,
+                                                                         bin_parameter=bin_parameter,
+                                                                         bin_limits=bin_limits, )
+
+        return list(zip(hetero_bin_constraint.l_bin_constraints, [detections_table, measurements_table]))
+
+    def _get_l_l_table_binned_rows(self,
+                                   bin_constraint: BinConstraint,
+                                   full_bin_limits: Sequence[float],
+                                   t: Table) -> Optional[List[np.ndarray]]:
+        """ Gets a list of the indices of the rows of a table in each bin, in the order they are in the table, or None
+            if the bin constraint can't be split up.
+        """
+
+        num_bins: int = len(full_bin_limits) - 1
+
+        plan: BinConstraintPlan = bin_constraint.compile(t, data_stack=self.data_stack)
+
+        l_binned_predicates: Tuple[RangeBinPredicate, ...] = plan.l_binned_predicates
+        if len(l_binned_predicates) > 1:
+            return None
+
+        # Get the combined mask of all predicates which don't depend on the bin limits
+        l_is_row_in_all_bins: np.ndarray = np.ones(len(t), dtype=bool)
+        for predicate in plan.l_predicates:
+            if predicate not in l_binned_predicates:
+                l_is_row_in_all_bins &= self._get_l_is_row_in_bin(predicate, t)
+        if self.l_full_ids is not None:
+            l_is_row_in_all_bins &= self._get_l_is_id_in_full_ids(t)
+
+        # Get the index of the bin each row is in, or None if rows are in all bins
+        l_bin_indices: Optional[np.ndarray] = None
+        if len(l_binned_predicates) == 1:
+            binned_predicate: RangeBinPredicate = l_binned_predicates[0]
+            if not np.all(np.diff(full_bin_limits) >= 0):
+                return None
+            if binned_predicate.include_min and binned_predicate.include_max:
+                return None
+            l_bin_indices = self._get_l_bin_indices(binned_predicate, full_bin_limits, t)
+
+        if l_bin_indices is None:
+            l_rows_in_all_bins: np.ndarray = np.flatnonzero(l_is_row_in_all_bins)
+            return [l_rows_in_all_bins for _ in range(num_bins)]
+
+        # Group the rows by bin, keeping them in the order they are in the table within each bin
+        l_rows: np.ndarray = np.flatnonzero(l_is_row_in_all_bins & (l_bin_indices >= 0))
+        l_row_bin_indices: np.ndarray = l_bin_indices[l_rows]
+        l_rows = l_rows[np.argsort(l_row_bin_indices, kind="stable")]
+        l_bin_ends: np.ndarray = np.cumsum(np.bincount(l_row_bin_indices, minlength=num_bins))
+
+        return [l_rows[bin_end - bin_size:bin_end]
+                for bin_end, bin_size in zip(l_bin_ends, np.diff(l_bin_ends, prepend=0))]
+
+    def _get_l_canonical_positions(self,
+                                   t: Table,
+                                   l_canonical_ids: np.ndarray) -> np.ndarray:
+        """ Gets the position of the ID of each row of a table in the canonical IDs, or MISSING_ROW for IDs which aren't
+            in them, evaluating it only once for each table and set of canonical IDs.
+        """
+
+        key = (id(t), id(l_canonical_ids))
+
+        if key not in self._d_l_canonical_positions:
+            canonical_id_index = IDIndex(l_canonical_ids)
+            self._d_l_canonical_positions[key] = canonical_id_index.get_rows(t[MFC_TF.ID], allow_missing=True)
+
+        return self._d_l_canonical_positions[key]
+
+    def _get_l_is_row_in_bin(self,
+                             predicate: BinPredicate,
+                             t: Table) -> np.ndarray:
+        """ Gets whether each row of a table satisfies a predicate which doesn't depend on the bin limits, evaluating
+            it only once for each table and each distinct predicate.
+        """
+
+        key = (id(t), predicate)
+
+        if key not in self._d_l_is_row_in_bin:
+            self._d_l_is_row_in_bin[key] = BinConstraintPlan((predicate,)).get_l_is_row_in_bin(t)
+
+        return self._d_l_is_row_in_bin[key]
+
+    def _get_l_is_id_in_full_ids(self, t: Table) -> np.ndarray:
+        """ Gets whether the ID of each row of a table is in the list of full IDs, evaluating it only once for each
+            table.
+        """
+
+        key = id(t)
+
+        if key not in self._d_l_is_id_in_full_ids:
+            self._d_l_is_id_in_full_ids[key] = np.isin(t[MFC_TF.ID], self.l_full_ids)
+
+        return self._d_l_is_id_in_full_ids[key]
+
+    def _get_l_bin_indices(self,
+                           predicate: RangeBinPredicate,
+                           full_bin_limits: Sequence[float],
+                           t: Table) -> Optional[np.ndarray]:
+        """ Gets the index of the bin each row of a table is in for the column a predicate checks, or -1 for rows not
+            in any bin, or None if all rows are in all bins, evaluating it only once for each table, column, set of
+            bin limits, and choice of which limits are included in bins. The bin limits must be sorted, and the min
+            and max of each bin must not both be included in it.
+        """
+
+        key = (id(t), predicate.colname, tuple(full_bin_limits), predicate.include_min, predicate.include_max)
+
+        if key not in self._d_l_bin_indices:
+
+            l_bin_indices: Optional[np.ndarray] = None
+            if predicate.colname is not None:
+
+                bin_data: Column = t[predicate.colname]
+                l_bin_limits: np.ndarray = np.asarray(full_bin_limits)
+                l_values: np.ndarray = np.asarray(bin_data)
+                num_bins: int = len(l_bin_limits) - 1
+
+                # Search for the bin each value is in. If the min of each bin is included in it, count the limits
+                # each value is at or above, otherwise count the limits it's above, which is one more than the index
+                # of the bin it's in, with values at a limit in the bin above or below it respectively
+                side: str = "right" if predicate.include_min else "left"
+                l_bin_indices = np.searchsorted(l_bin_limits, l_values, side=side) - 1
+
+                # Values beyond the upper limit aren't in any bin, nor are NaN or masked values
+                l_bin_indices[l_bin_indices >= num_bins] = -1
+                l_bin_indices[np.asarray(is_nan_or_masked(bin_data), dtype=bool)] = -1
+
+                # If neither limit is included in bins, values at the max of their bin aren't in it either
+                if not predicate.include_min and not predicate.include_max:
+                    l_in_bin: np.ndarray = l_bin_indices >= 0
+                    l_is_at_max: np.ndarray = np.zeros(len(t), dtype=bool)
+                    l_is_at_max[l_in_bin] = l_values[l_in_bin] == l_bin_limits[l_bin_indices[l_in_bin] + 1]
+                    l_bin_indices[l_is_at_max] = -1
+
+            self._d_l_bin_indices[key] = l_bin_indices
+
+        return self._d_l_bin_indices[key]
+
+
 # Functions to apply bin constraints
 
 
@@ -699,15 +1600,97 @@ def _get_ids_in_hetero_bin(bin_parameter: BinParameters,
     return l_binned_ids
 
 
+def _get_l_l_binned_ids(bin_assignment_engine: BinAssignmentEngine,
+                        bin_constraint_type: Type,
+                        bin_parameter: BinParameters,
+                        full_bin_limits: Sequence[float],
+                        detections_table: Table,
+                        l_full_ids: Optional[Sequence[int]],
+                        measurements_table: Optional[Table] = None,
+                        method: Optional[ShearEstimationMethods] = None,
+                        data_stack: Optional[SHEFrameStack] = None,
+                        use_cache: bool = True,
+                        full_ids_key: Optional[Hashable] = None) -> List[Sequence[int]]:
+    """ Gets a list of the IDs in each bin for a bin parameter, using the process-wide bin membership cache if desired.
+        If using the cache, `full_ids_key` should be the key for `l_full_ids` from `get_ids_key`.
+    """
+
+    is_hetero: bool = issubclass(bin_constraint_type, HeteroBinConstraint)
+
+    # The method and measurements table are only used for HeteroBinConstraints
+    if not is_hetero:
+        measurements_table = None
+        method = None
+
+    bin_membership_cache: BinMembershipCache = get_bin_membership_cache()
+    l_tables: List[Optional[Table]] = [detections_table, measurements_table]
+
+    def get_key() -> Hashable:
+        return get_bin_membership_key(bin_constraint_type=bin_constraint_type,
+                                      bin_parameter=bin_parameter,
+                                      full_bin_limits=full_bin_limits,
+                                      l_tables=l_tables,
+                                      method=method,
+                                      full_ids_key=full_ids_key)
+
+    if use_cache:
+        l_l_binned_ids: Optional[List[Sequence[int]]] = bin_membership_cache.get(get_key())
+        if l_l_binned_ids is not None:
+            return l_l_binned_ids
+
+    # Get the ID lists for all bins at once if possible
+    l_l_binned_ids = bin_assignment_engine.get_l_l_binned_ids(bin_constraint_type=bin_constraint_type,
+                                                              bin_parameter=bin_parameter,
+                                                              full_bin_limits=full_bin_limits,
+                                                              detections_table=detections_table,
+                                                              measurements_table=measurements_table,
+                                                              method=method)
+
+    # Otherwise, loop over bins, getting IDs for each and adding them to the list
+    if l_l_binned_ids is None:
+
+        num_bins: int = len(full_bin_limits) - 1
+        l_l_binned_ids = [[]] * num_bins
+
+        for bin_index in range(num_bins):
+
+            if not is_hetero:
+                l_l_binned_ids[bin_index] = _get_ids_in_bin(bin_parameter=bin_parameter,
+                                                            bin_constraint_type=bin_constraint_type,
+                                                            full_bin_limits=full_bin_limits,
+                                                            bin_index=bin_index,
+                                                            detections_table=detections_table,
+                                                            l_full_ids=l_full_ids,
+                                                            data_stack=data_stack)
+            elif measurements_table is not None:
+                l_l_binned_ids[bin_index] = _get_ids_in_hetero_bin(bin_parameter=bin_parameter,
+                                                                   method=method,
+                                                                   bin_constraint_type=bin_constraint_type,
+                                                                   full_bin_limits=full_bin_limits,
+                                                                   bin_index=bin_index,
+                                                                   detections_table=detections_table,
+                                                                   l_full_ids=l_full_ids,
+                                                                   measurements_table=measurements_table,
+                                                                   data_stack=data_stack)
+            # If we don't have data for a given method, there are no IDs for it, so we leave the list empty
+
+    # Store the result in the cache, with a key determined now in case any bin columns were added to the tables
+    if use_cache:
+        bin_membership_cache.put(get_key(), l_l_binned_ids, l_tables=l_tables)
+
+    return l_l_binned_ids
+
+
 def get_ids_for_bins(d_bin_limits: Dict[BinParameters, Sequence[float]],
                      detections_table: Table,
                      l_full_ids: Optional[Sequence[int]] = None,
                      l_bin_parameters: Sequence[BinParameters] = BinParameters,
                      data_stack: Optional[SHEFrameStack] = None,
                      bin_constraint_type: Type = VisDetBinParameterBinConstraint,
+                     use_cache: bool = True,
                      ) -> Dict[BinParameters, List[Sequence[int]]]:
     """ Creates a bin constraint for each bin parameter in a list (default all), then applies it to the detections
-        table.
+        table. If `use_cache` is True, results will be taken from and stored in the process-wide bin membership cache.
 
         Returns a dict of bin_parameter: List[np.ndarray<int> of IDs in each bin].
     """
@@ -715,6 +1698,9 @@ def get_ids_for_bins(d_bin_limits: Dict[BinParameters, Sequence[float]],
     # Init output dict
     d_l_l_binned_ids: Dict[BinParameters, List[Sequence[int]]] = {}
 
+    bin_assignment_engine = BinAssignmentEngine(l_full_ids=l_full_ids, data_stack=data_stack)
+    full_ids_key: Optional[Hashable] = get_ids_key(l_full_ids) if use_cache else None
+
     # For each test case info, create a bin constraint and apply it
     for bin_parameter in l_bin_parameters:
 
@@ -723,23 +1709,16 @@ def get_ids_for_bins(d_bin_limits: Dict[BinParameters, Sequence[float]],
         num_bins: int = len(full_bin_limits) - 1
         assert num_bins >= 1
 
-        # Start a list of the ID lists for this test case
-        l_l_binned_ids: List[Sequence[int]] = [[]] * num_bins
-
-        # Loop over bins, getting IDs for each and adding them to the list
-        for bin_index in range(num_bins):
-
-            l_binned_ids: Sequence[int] = _get_ids_in_bin(bin_parameter=bin_parameter,
-                                                          bin_constraint_type=bin_constraint_type,
-                                                          full_bin_limits=full_bin_limits,
-                                                          bin_index=bin_index,
-                                                          detections_table=detections_table,
-                                                          l_full_ids=l_full_ids,
-                                                          data_stack=data_stack)
-            l_l_binned_ids[bin_index] = l_binned_ids
-
-        # Add the list to the output dictionary
-        d_l_l_binned_ids[bin_parameter] = l_l_binned_ids
+        # Get the list of the ID lists for this bin parameter, and add it to the output dictionary
+        d_l_l_binned_ids[bin_parameter] = _get_l_l_binned_ids(bin_assignment_engine=bin_assignment_engine,
+                                                              bin_constraint_type=bin_constraint_type,
+                                                              bin_parameter=bin_parameter,
+                                                              full_bin_limits=full_bin_limits,
+                                                              detections_table=detections_table,
+                                                              l_full_ids=l_full_ids,
+                                                              data_stack=data_stack,
+                                                              use_cache=use_cache,
+                                                              full_ids_key=full_ids_key)
 
     return d_l_l_binned_ids
 
@@ -751,20 +1730,21 @@ def get_ids_for_test_cases(l_test_case_info: Sequence[TestCaseInfo],
                            d_measurements_tables: Optional[Dict[ShearEstimationMethods, Table]] = None,
                            data_stack: Optional[SHEFrameStack] = None,
                            bin_constraint_type: Type = GoodBinnedMeasurementHBC,
+                           use_cache: bool = True,
                            ) -> Dict[str, List[Sequence[int]]]:
-    """ Creates a bin constraint for each test case, then applies it to the detections table.
+    """ Creates a bin constraint for each test case, then applies it to the detections table. If `use_cache` is True,
+        results will be taken from and stored in the process-wide bin membership cache, so that test cases which share
+        bins (or repeated calls with the same tables) don't need to recalculate them.
 
         Returns a dict of test_case_info.name: List[np.ndarray<int> of IDs in each bin].
     """
 
-    # Get a set of the bin parameters we want to use
-    s_bin_parameters: Set[BinParameters] = set()
-    for test_case_info in l_test_case_info:
-        s_bin_parameters.add(test_case_info.bin_parameter)
-
     # Init output dict
     d_l_l_binned_ids: Dict[str, List[Sequence[int]]] = {}
 
+    bin_assignment_engine = BinAssignmentEngine(l_full_ids=l_full_ids, data_stack=data_stack)
+    full_ids_key: Optional[Hashable] = get_ids_key(l_full_ids) if use_cache else None
+
     # For each test case info, create a bin constraint and apply it
     for test_case_info in l_test_case_info:
 
@@ -774,90 +1754,109 @@ def get_ids_for_test_cases(l_test_case_info: Sequence[TestCaseInfo],
         num_bins: int = len(full_bin_limits) - 1
         assert num_bins >= 1
 
-        # Start a list of the ID lists for this test case
-        l_l_binned_ids: List[Sequence[int]] = [[]] * num_bins
+        measurements_table: Optional[Table] = None
+        if issubclass(bin_constraint_type, HeteroBinConstraint) and d_measurements_tables:
+            measurements_table = d_measurements_tables[test_case_info.method]
+
+        # Get the list of the ID lists for this test case, and add it to the output dictionary
+        d_l_l_binned_ids[test_case_info.name] = _get_l_l_binned_ids(bin_assignment_engine=bin_assignment_engine,
+                                                                    bin_constraint_type=bin_constraint_type,
+                                                                    bin_parameter=bin_parameter,
+                                                                    full_bin_limits=full_bin_limits,
+                                                                    detections_table=detections_table,
+                                                                    l_full_ids=l_full_ids,
+                                                                    measurements_table=measurements_table,
+                                                                    method=test_case_info.method,
+                                                                    data_stack=data_stack,
+                                                                    use_cache=use_cache,
+                                                                    full_ids_key=full_ids_key)
 
-        # Loop over bins, getting IDs for each and adding them to the list
-        for bin_index in range(num_bins):
+    return d_l_l_binned_ids
 
-            l_l_binned_ids[bin_index] = _get_l_binned_ids(test_case_info=test_case_info,
-                                                          bin_constraint_type=bin_constraint_type,
-                                                          full_bin_limits=full_bin_limits,
-                                                          bin_index=bin_index,
-                                                          detections_table=detections_table,
-                                                          l_full_ids=l_full_ids,
-                                                          d_measurements_tables=d_measurements_tables,
-                                                          data_stack=data_stack)
 
-        # Add the list to the output dictionary
-        d_l_l_binned_ids[test_case_info.name] = l_l_binned_ids
+def get_bitsets_for_test_cases(l_test_case_info: Sequence[TestCaseInfo],
+                               d_bin_limits: Dict[BinParameters, Sequence[float]],
+                               detections_table: Table,
+                               l_full_ids: Optional[Sequence[int]] = None,
+                               d_measurements_tables: Optional[Dict[ShearEstimationMethods, Table]] = None,
+                               data_stack: Optional[SHEFrameStack] = None,
+                               bin_constraint_type: Type = GoodBinnedMeasurementHBC,
+                               l_canonical_ids: Optional[np.ndarray] = None,
+                               ) -> Dict[str, List[BinBitset]]:
+    """ As `get_ids_for_test_cases`, except gets a bitset of the objects in each bin, which uses much less memory than
+        an array of their IDs. The bitsets are aligned to the provided canonical IDs (which should be sorted and
+        unique), or if not provided, to the IDs in the detections table; objects with other IDs are left out.
+
+        Returns a dict of test_case_info.name: List[BinBitset of objects in each bin].
+    """
 
-    return d_l_l_binned_ids
+    if l_canonical_ids is None:
+        l_canonical_ids = get_canonical_ids(detections_table[MFC_TF.ID])
+
+    # Init output dict
+    d_l_binned_bitsets: Dict[str, List[BinBitset]] = {}
 
+    bin_assignment_engine = BinAssignmentEngine(l_full_ids=l_full_ids, data_stack=data_stack)
+
+    # For each test case info, create a bin constraint and apply it
+    for test_case_info in l_test_case_info:
+
+        # Get data relevant for this bin parameter
+        bin_parameter = test_case_info.bin_parameter
+        full_bin_limits: Sequence[float] = d_bin_limits[bin_parameter]
+        num_bins: int = len(full_bin_limits) - 1
+        assert num_bins >= 1
 
-def _get_l_binned_ids(test_case_info: TestCaseInfo,
-                      bin_constraint_type: Type,
-                      full_bin_limits: np.ndarray,
-                      bin_index: int,
-                      detections_table: Table,
-                      l_full_ids: Optional[Sequence[int]],
-                      d_measurements_tables: Dict[ShearEstimationMethods, Table],
-                      data_stack: SHEFrameStack):
-    # Special processing if we have a HeteroBinConstraint
-    if issubclass(bin_constraint_type, HeteroBinConstraint):
         measurements_table: Optional[Table] = None
-        if d_measurements_tables:
+        if issubclass(bin_constraint_type, HeteroBinConstraint) and d_measurements_tables:
             measurements_table = d_measurements_tables[test_case_info.method]
-        if measurements_table is None:
-            # If we don't have data for a given method, return no IDs for it
-            l_binned_ids: Sequence[int] = []
-        else:
-            l_binned_ids: Sequence[int] = _get_ids_in_hetero_bin(bin_parameter=test_case_info.bin_parameter,
-                                                                 method=test_case_info.method,
-                                                                 bin_constraint_type=bin_constraint_type,
-                                                                 full_bin_limits=full_bin_limits,
-                                                                 bin_index=bin_index,
-                                                                 detections_table=detections_table,
-                                                                 l_full_ids=l_full_ids,
-                                                                 measurements_table=measurements_table,
-                                                                 data_stack=data_stack)
-    else:
-        l_binned_ids: Sequence[int] = _get_ids_in_bin(bin_parameter=test_case_info.bin_parameter,
-                                                      bin_constraint_type=bin_constraint_type,
-                                                      full_bin_limits=full_bin_limits,
-                                                      bin_index=bin_index,
-                                                      detections_table=detections_table,
-                                                      l_full_ids=l_full_ids,
-                                                      data_stack=data_stack)
-    return l_binned_ids
+
+        l_binned_bitsets: Optional[List[BinBitset]] = bin_assignment_engine.get_l_binned_bitsets(
+            bin_constraint_type=bin_constraint_type,
+            bin_parameter=bin_parameter,
+            full_bin_limits=full_bin_limits,
+            detections_table=detections_table,
+            l_canonical_ids=l_canonical_ids,
+            measurements_table=measurements_table,
+            method=test_case_info.method)
+
+        # If the bin constraint can't be evaluated for all bins at once, get the IDs in each bin and convert them
+        if l_binned_bitsets is None:
+            l_l_binned_ids = _get_l_l_binned_ids(bin_assignment_engine=bin_assignment_engine,
+                                                 bin_constraint_type=bin_constraint_type,
+                                                 bin_parameter=bin_parameter,
+                                                 full_bin_limits=full_bin_limits,
+                                                 detections_table=detections_table,
+                                                 l_full_ids=l_full_ids,
+                                                 measurements_table=measurements_table,
+                                                 method=test_case_info.method,
+                                                 data_stack=data_stack,
+                                                 use_cache=False)
+            l_binned_bitsets = [BinBitset.from_ids(l_binned_ids, l_canonical_ids)
+                                for l_binned_ids in l_l_binned_ids]
+
+        d_l_binned_bitsets[test_case_info.name] = l_binned_bitsets
+
+    return d_l_binned_bitsets
 
 
 def get_table_of_ids(t: Table,
                      l_ids: Sequence[int],
-                     id_colname: str = MFC_TF.ID) -> Table:
-    """ Gets a version of a table with just the objects with IDs in the provided list, with handling for empty lists.
+                     id_colname: str = MFC_TF.ID) -> Union[Table, Row]:
+    """ Gets a version of a table with just the objects with IDs in the provided list, in the order of the list, with
+        handling for empty lists and for IDs which aren't in the table, which are skipped. As with selecting rows with
+        `t.loc`, all rows are returned for IDs which appear in more than one row of the table, and if only one row is
+        found, it's returned as a Row rather than a Table.
     """
 
-    # Make sure the ID column name is set as an index for the table
-    if id_colname not in t.indices:
-        t.add_index(id_colname)
-
-    # Make sure the IDs list is the proper type
-    if not isinstance(l_ids, np.ndarray):
-        l_ids = np.array(l_ids)
-
-    # Return an empty table if the ID list is empty
-    if len(l_ids) == 0:
-        return t[np.zeros_like(t[id_colname], dtype=bool)]
+    # Use the sorted-ID index cached for this table, so that it only needs to be built once for all bins. IDs which
+    # aren't in the table are skipped
+    l_rows: np.ndarray = get_id_index(t, id_colname).get_all_rows(l_ids)
 
-    try:
-        table_in_bin: Table = t.loc[l_ids]
-    except KeyError:
-        # If we get here, at least one ID in the list isn't in the table, so we'll have to prune the list
-        l_ids_in_table = [object_id for object_id in l_ids if object_id in t[id_colname]]
-        table_in_bin: Table = t.loc[l_ids_in_table]
+    if len(l_rows) == 1:
+        return t[l_rows[0]]
 
-    return table_in_bin
+    return t[l_rows]
 
 
 class BinnedTableLoader(TableLoader):
@@ -909,17 +1908,60 @@ class BinnedTableLoader(TableLoader):
 
 class BinnedMultiTableLoader(MultiTableLoader):
     """ Class to handle loading in binned data from multiple tables.
+
+        The tables loaded from each file are combined by appending them in order to a TableBuffer, so that their data is
+        only copied once, rather than stacking them with `vstack`. When loading all objects with only some columns,
+        the buffer is preallocated for the total number of rows in the files, read from their headers.
+
+        Parameters (in addition to those inherited from MultiTableLoader)
+        ----------
+        id_colname : Optional[str]
+            (Optional) The name of the ID column of the tables. If not provided, the MER Final Catalog ID column name is
+            used.
+        l_colnames : Optional[Sequence[str]]
+            (Optional) The names of the columns to load from the tables. If provided, only these columns, the ID column,
+            and any columns needed to apply a bin constraint are read from each file, with memory-mapping, rather than
+            the full tables being loaded by the file loaders. If not provided, all columns are loaded.
+        num_threads : int
+            The number of threads to use to load files concurrently. If 1, files will be loaded serially. The output is
+            the same regardless of this setting.
+        max_files_in_flight : Optional[int]
+            (Optional) The maximum number of files to be loading, or to have loaded but not yet added to the combined
+            table, at once when loading with multiple threads. If not provided, twice the number of threads is used.
+        max_bytes_in_flight : Optional[int]
+            (Optional) The maximum total size on disk of the files to be loading, or to have loaded but not yet added
+            to the combined table, at once when loading with multiple threads. A single file larger than this will
+            still be loaded, on its own. If not provided, the size of the files isn't limited (or checked).
     """
 
     id_colname: str = MFC_TF.ID
+    l_colnames: Optional[Sequence[str]] = None
+
+    num_threads: int = 1
+    max_files_in_flight: Optional[int] = None
+    max_bytes_in_flight: Optional[int] = None
+
+    _d_memmapped_tables: Dict[str, Table]
 
     def __init__(self,
                  id_colname: Optional[str] = None,
+                 l_colnames: Optional[Sequence[str]] = None,
+                 num_threads: int = 1,
+                 max_files_in_flight: Optional[int] = None,
+                 max_bytes_in_flight: Optional[int] = None,
                  *args, **kwargs):
 
         super().__init__(*args, **kwargs)
         if id_colname:
             self.id_colname = id_colname
+        if l_colnames is not None:
+            self.l_colnames = l_colnames
+
+        self.num_threads = num_threads
+        self.max_files_in_flight = max_files_in_flight
+        self.max_bytes_in_flight = max_bytes_in_flight
+
+        self._d_memmapped_tables = {}
 
     # Private methods
 
@@ -935,33 +1977,164 @@ class BinnedMultiTableLoader(MultiTableLoader):
             t = file_loader.get(*args, **kwargs)
         return t
 
-    # Public methods
-
-    def get_table_for_ids(self,
-                          l_ids: Sequence[int],
-                          keep_open: bool = True,
-                          *args, **kwargs) -> Optional[Table]:
-        """ Get a table with only objects with IDs in the list.
+    @staticmethod
+    def __get_qualified_filename(file_loader: TableLoader) -> str:
+        """ Gets the fully-qualified filename of the file a file loader loads from. """
+        return os.path.join(file_loader.workdir, file_loader.filename)
+
+    def __get_total_num_rows(self) -> int:
+        """ Gets the total number of rows in the tables of all files, reading only their headers. """
+        return sum(int(fits.getval(self.__get_qualified_filename(file_loader), "NAXIS2", ext=1))
+                   for file_loader in self.l_file_loaders)
+
+    def __get_memmapped_table(self,
+                              file_loader: TableLoader,
+                              keep_open: bool = True) -> Table:
+        """ Reads the table a file loader loads from with memory-mapping, keeping it open to be reused if desired,
+            until `close_all` is called.
         """
 
-        l_binned_tables: List[Optional[Table]] = [None] * len(self.l_file_loaders)
+        qualified_filename: str = self.__get_qualified_filename(file_loader)
+
+        t: Optional[Table] = self._d_memmapped_tables.get(qualified_filename)
+        if t is None:
+            t = read_memmapped_table(qualified_filename)
+            if keep_open:
+                self._d_memmapped_tables[qualified_filename] = t
 
-        # Get a binned table from each file loader
-        i: int
-        file_loader: TableLoader
-        for i, file_loader in enumerate(self.l_file_loaders):
+        return t
 
+    # Protected methods
+
+    def _get_table(self,
+                   file_loader: TableLoader,
+                   keep_open: bool = True,
+                   bin_constraint: Optional[BinConstraint] = None,
+                   *args, **kwargs) -> Table:
+        """ Gets the table from a file loader, with only the rows in the bin if a bin constraint is provided.
+
+            If the columns to load were specified, only those and the ID column are read from the file, which is
+            memory-mapped, and kept open to be reused if desired. If a bin constraint is provided, it's first evaluated
+            in chunks of rows on the memory-mapped columns it needs, and the other columns are then read for only the
+            rows in the bin. The columns needed to apply the bin constraint are included in the output table.
+
+            Otherwise, the full table is loaded with the file loader, keeping it open if desired, and the bin
+            constraint, if provided, is applied to it.
+        """
+
+        if self.l_colnames is None:
             t: Table = self.__get_with_keep_open(file_loader, keep_open, *args, **kwargs)
+            if bin_constraint is None:
+                return t
+            return bin_constraint.get_rows_in_bin(t=t)
+
+        t = self.__get_memmapped_table(file_loader, keep_open)
+
+        l_colnames: List[str] = [self.id_colname, *self.l_colnames]
 
-            l_binned_tables[i] = get_table_of_ids(t=t,
-                                                  l_ids=l_ids,
-                                                  id_colname=self.id_colname)
+        # Invalid values aren't masked when reading with memory-mapping, so mask them in the output, so that it's the
+        # same as if the full table had been loaded. NaN values aren't in any range, so this doesn't affect the rows
+        # in the bin
+        if bin_constraint is None:
+            return get_table_of_columns(t, l_colnames, mask_invalid=True)
+
+        plan: BinConstraintPlan = bin_constraint.compile(t)
+        l_is_row_in_bin: np.ndarray = plan.get_l_is_row_in_bin(t)
+
+        return get_table_of_columns(t, [*l_colnames, *plan.l_required_colnames],
+                                    l_rows=np.flatnonzero(l_is_row_in_bin),
+                                    mask_invalid=True)
+
+    def _iter_tables(self,
+                     get_table: Callable[[TableLoader], Union[Table, Row]]) -> Iterator[Union[Table, Row]]:
+        """ Iterates over the tables got from each file loader with the provided function, in the order of the file
+            loaders. If `num_threads` is greater than 1, files are loaded concurrently by a pool of threads, within the
+            limits set by `max_files_in_flight` and `max_bytes_in_flight`.
+        """
+
+        if self.num_threads <= 1:
+            for file_loader in self.l_file_loaders:
+                yield get_table(file_loader)
+            return
+
+        max_files_in_flight: int = (self.max_files_in_flight if self.max_files_in_flight is not None
+                                    else 2 * self.num_threads)
+
+        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+
+            q_in_flight: Deque[Tuple[Future, int]] = deque()
+            bytes_in_flight: int = 0
+
+            for file_loader in self.l_file_loaders:
+
+                # Only check the size of the file if it's limited
+                file_bytes: int = 0
+                if self.max_bytes_in_flight is not None:
+                    file_bytes = os.path.getsize(self.__get_qualified_filename(file_loader))
+
+                # Yield the earliest tables, waiting for them to be loaded if necessary, until there's room for this
+                # file within the limits
+                while q_in_flight and (len(q_in_flight) >= max_files_in_flight or
+                                       (self.max_bytes_in_flight is not None and
+                                        bytes_in_flight + file_bytes > self.max_bytes_in_flight)):
+                    future, future_bytes = q_in_flight.popleft()
+                    bytes_in_flight -= future_bytes
+                    yield future.result()
+
+                q_in_flight.append((executor.submit(get_table, file_loader), file_bytes))
+                bytes_in_flight += file_bytes
+
+            while q_in_flight:
+                future, _ = q_in_flight.popleft()
+                yield future.result()
+
+    def _get_combined_table(self,
+                            get_table: Callable[[TableLoader], Union[Table, Row]],
+                            max_rows: Optional[int] = None) -> Optional[Table]:
+        """ Gets a table from each file loader with the provided function, and combines them in order into a single
+            table. Returns None if there are no file loaders. If `max_rows` is provided, space for this many rows is
+            allocated for the combined table in advance.
+        """
 
         # Check that we have at least one table
-        if len(l_binned_tables) == 0:
+        if len(self.l_file_loaders) == 0:
             return None
 
-        return table_vstack(tables=l_binned_tables)
+        table_buffer: TableBuffer
+        if max_rows is None:
+            table_buffer = TableBuffer()
+        else:
+            table_buffer = TableBuffer(max_rows=max_rows, initial_capacity=max_rows)
+
+        for t in self._iter_tables(get_table):
+            if isinstance(t, Row):
+                t = Table(t)
+            table_buffer.append(t)
+
+        return table_buffer.to_table()
+
+    # Public methods
+
+    def close_all(self, *args, **kwargs) -> None:
+        """ Closes all files, including any memory-mapped tables kept open.
+        """
+        self._d_memmapped_tables = {}
+        super().close_all(*args, **kwargs)
+
+    def get_table_for_ids(self,
+                          l_ids: Sequence[int],
+                          keep_open: bool = True,
+                          *args, **kwargs) -> Optional[Table]:
+        """ Get a table with only objects with IDs in the list.
+        """
+
+        def get_table(file_loader: TableLoader) -> Union[Table, Row]:
+            t: Table = self._get_table(file_loader, keep_open, None, *args, **kwargs)
+            return get_table_of_ids(t=t,
+                                    l_ids=l_ids,
+                                    id_colname=self.id_colname)
+
+        return self._get_combined_table(get_table)
 
     def get_table_for_all(self,
                           keep_open: bool = True,
@@ -969,16 +2142,16 @@ class BinnedMultiTableLoader(MultiTableLoader):
         """ Get a combined table of all objects.
         """
 
-        if keep_open:
-            self.load_all(*args, **kwargs)
+        def get_table(file_loader: TableLoader) -> Table:
+            return self._get_table(file_loader, keep_open, None, *args, **kwargs)
 
-        l_binned_tables: List[Table] = self.get_all(*args, **kwargs)
-
-        # Check that we have at least one table
-        if len(l_binned_tables) == 0:
-            return None
+        # When loading only some columns, the files are read by name, so preallocate the combined table with the number
+        # of rows in their headers. Otherwise, leave the files to the file loaders, and let the combined table grow
+        max_rows: Optional[int] = None
+        if self.l_colnames is not None:
+            max_rows = self.__get_total_num_rows()
 
-        return table_vstack(tables=l_binned_tables)
+        return self._get_combined_table(get_table, max_rows=max_rows)
 
     def get_table_for_bin_constraint(self,
                                      bin_constraint: BinConstraint,
@@ -989,20 +2162,7 @@ class BinnedMultiTableLoader(MultiTableLoader):
             Requires the table format to properly check estimates tables.
         """
 
-        l_binned_tables: List[Optional[Table]] = [None] * len(self.l_file_loaders)
-
-        # Get a binned table from each file loader
-        i: int
-        file_loader: TableLoader
-        for i, file_loader in enumerate(self.l_file_loaders):
-
-            t: Table = self.__get_with_keep_open(file_loader, keep_open, *args, **kwargs)
-
-            # Get a list of IDs for this bin constraint
-            l_binned_tables[i] = bin_constraint.get_rows_in_bin(t=t)
-
-        # Check that we have at least one table
-        if len(l_binned_tables) == 0:
-            return None
+        def get_table(file_loader: TableLoader) -> Table:
+            return self._get_table(file_loader, keep_open, bin_constraint, *args, **kwargs)
 
-        return table_vstack(tables=l_binned_tables)
+        return self._get_combined_table(get_table)
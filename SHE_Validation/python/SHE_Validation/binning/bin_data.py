@@ -20,16 +20,18 @@ Table format and useful functions for determining bin data
 # You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
 # the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
-from typing import Iterable, Optional, Sequence
+from typing import Iterable, Optional, Sequence, Tuple
 
 import numpy as np
 from astropy.table import Column, Table
 
 from SHE_PPT.logging import getLogger
+from SHE_PPT.she_frame import SHEFrame
 from SHE_PPT.she_frame_stack import SHEFrameStack
 from SHE_PPT.table_formats.mer_final_catalog import tf as MFC_TF
 from SHE_PPT.table_utility import SheTableFormat, SheTableMeta
 from ..constants.test_info import BinParameters, NON_GLOBAL_BIN_PARAMETERS
+from ..table_utility import MAX_REPORTED_MISSING_IDS, MISSING_ROW, get_id_index
 
 logger = getLogger(__name__)
 
@@ -176,33 +178,112 @@ def add_bg_column(t: Table,
     if TF.bg in t.colnames:
         return
 
-    l_object_ids: Sequence[int] = t[MFC_TF.ID]
+    l_object_ids: np.ndarray = np.asarray(t[MFC_TF.ID])
 
-    bg_data: np.ndarray = np.zeros_like(l_object_ids, dtype=TF.dtypes[TF.bg])
+    bg_data: np.ndarray = get_mean_bg_levels(l_object_ids, data_stack).astype(TF.dtypes[TF.bg])
 
-    # Loop over objects to calculate background level
-    for object_index, object_id in enumerate(l_object_ids):
+    bg_column: Column = Column(data=bg_data, name=TF.bg, dtype=TF.dtypes[TF.bg])
 
-        # Get the background level from background image at the object position
-        stamp_stack = data_stack.extract_galaxy_stack(object_id, width=BG_STAMP_SIZE, extract_stacked_stamp=False)
-        l_background_level = [None] * len(stamp_stack.exposures)
-        for exp_index, exp_image in enumerate(stamp_stack.exposures):
-            if exp_image is not None:
-                l_background_level[exp_index] = exp_image.background_map.mean()
+    t.add_column(bg_column)
 
-        # Calculate the mean background level of all valid exposures
-        bg_array: np.ndarray = np.array(l_background_level)
-        valid_bg: np.ndarray = bg_array != None  # noqa E711
-        # noinspection PyUnresolvedReferences
-        if valid_bg.sum() > 0:
-            bg_data[object_index] = bg_array[valid_bg].mean()
-        else:
-            # No data, so set -99 for mean background level
-            bg_data[object_index] = -99
 
-    bg_column: Column = Column(data=bg_data, name=TF.bg, dtype=TF.dtypes[TF.bg])
+def get_mean_bg_levels(l_object_ids: np.ndarray,
+                       data_stack: SHEFrameStack,
+                       stamp_size: int = BG_STAMP_SIZE) -> np.ndarray:
+    """ Gets the mean background level across all exposures at the position of each object, or -99 for objects which
+        aren't in any exposure. This gives the same result as extracting a stamp of size `stamp_size` for each object
+        in turn from each exposure and taking the mean of its background map, but works on all objects at once for
+        each detector of each exposure.
+    """
 
-    t.add_column(bg_column)
+    num_objects = len(l_object_ids)
+
+    l_ra, l_dec = _get_detection_world_positions(l_object_ids, data_stack)
+
+    # Accumulate the sum and count of valid background levels for each object, to take the mean across exposures
+    l_bg_sum: np.ndarray = np.zeros(num_objects, dtype=float)
+    l_bg_count: np.ndarray = np.zeros(num_objects, dtype=int)
+
+    for exposure in data_stack.exposures:
+        if exposure is None:
+            continue
+
+        l_exp_bg = _get_exposure_bg_levels(exposure, l_ra, l_dec, stamp_size=stamp_size)
+
+        l_valid_bg = ~np.isnan(l_exp_bg)
+        l_bg_sum[l_valid_bg] += l_exp_bg[l_valid_bg]
+        l_bg_count[l_valid_bg] += 1
+
+    # Where there's no data, set -99 for mean background level
+    l_mean_bg: np.ndarray = np.full(num_objects, -99, dtype=float)
+    l_has_bg = l_bg_count > 0
+    l_mean_bg[l_has_bg] = l_bg_sum[l_has_bg] / l_bg_count[l_has_bg]
+
+    return l_mean_bg
+
+
+def _get_detection_world_positions(l_object_ids: np.ndarray,
+                                   data_stack: SHEFrameStack) -> Tuple[np.ndarray, np.ndarray]:
+    """ Gets the world coordinates of each object from the data stack's detections catalogue, as are used when
+        extracting stamps for it.
+    """
+
+    detections_catalogue: Table = data_stack.detections_catalogue
+
+    l_rows = get_id_index(detections_catalogue, MFC_TF.ID).get_rows(l_object_ids)
+
+    return (np.asarray(detections_catalogue[MFC_TF.gal_x_world], dtype=float)[l_rows],
+            np.asarray(detections_catalogue[MFC_TF.gal_y_world], dtype=float)[l_rows])
+
+
+def _get_exposure_bg_levels(exposure: SHEFrame,
+                            l_ra: np.ndarray,
+                            l_dec: np.ndarray,
+                            stamp_size: int = BG_STAMP_SIZE) -> np.ndarray:
+    """ Gets the mean background level in a stamp of size `stamp_size` in an exposure at each of the provided
+        positions, or NaN for positions not on any detector. As when extracting a stamp, each position is assigned to
+        the first detector it's found on, and the stamp is padded with zeros where it extends off the detector.
+    """
+
+    l_bg: np.ndarray = np.full(len(l_ra), np.nan, dtype=float)
+    l_unassigned: np.ndarray = np.ones(len(l_ra), dtype=bool)
+
+    for detector in np.ravel(exposure.detectors):
+        if detector is None:
+            continue
+
+        l_i = np.flatnonzero(l_unassigned)
+        if len(l_i) == 0:
+            break
+
+        # Convert all remaining positions to pixel coordinates on this detector at once
+        l_x, l_y = detector.world2pix(l_ra[l_i], l_dec[l_i])
+        l_x = np.asarray(l_x, dtype=float)
+        l_y = np.asarray(l_y, dtype=float)
+
+        nx, ny = detector.shape
+        l_on_detector = (l_x >= 0) & (l_x <= nx) & (l_y >= 0) & (l_y <= ny)
+
+        l_i = l_i[l_on_detector]
+        l_x_min = np.round(l_x[l_on_detector] - stamp_size / 2).astype(int)
+        l_y_min = np.round(l_y[l_on_detector] - stamp_size / 2).astype(int)
+
+        # Sum the background over each pixel offset within the stamps in turn, for all positions at once. Pixels off
+        # the detector are left out of the sum, which is the same as padding them with zeros
+        l_detector_bg_sum = np.zeros(len(l_i), dtype=float)
+        for dx in range(stamp_size):
+            l_x_pix = l_x_min + dx
+            l_x_in_bounds = (l_x_pix >= 0) & (l_x_pix < nx)
+            for dy in range(stamp_size):
+                l_y_pix = l_y_min + dy
+                l_in_bounds = l_x_in_bounds & (l_y_pix >= 0) & (l_y_pix < ny)
+                l_detector_bg_sum[l_in_bounds] += detector.background_map[l_x_pix[l_in_bounds],
+                                                                          l_y_pix[l_in_bounds]]
+
+        l_bg[l_i] = l_detector_bg_sum / stamp_size ** 2
+        l_unassigned[l_i] = False
+
+    return l_bg
 
 
 def add_epoch_column(t: Table,
@@ -256,17 +337,18 @@ def _determine_data_table(t: Table,
           data_colname in data_stack.detections_catalogue.colnames):
         full_data_table: Table = data_stack.detections_catalogue
 
-        # We need to make sure IDs align, so here we select on IDs in t
-        if MFC_TF.ID not in full_data_table.indices:
-            full_data_table.add_index(MFC_TF.ID)
+        # We need to make sure IDs align, so here we select the rows of the full table for the IDs in t, using an
+        # index which is cached for the table so that it only needs to be built once for all bin columns
+        l_rows = get_id_index(full_data_table, MFC_TF.ID).get_rows(t[MFC_TF.ID], allow_missing=True)
 
-        l_ids = t[MFC_TF.ID]
+        # Raise a KeyError for any missing IDs, as selecting them with `loc` would
+        l_is_missing = l_rows == MISSING_ROW
+        if np.any(l_is_missing):
+            l_missing_ids = np.asarray(t[MFC_TF.ID])[l_is_missing]
+            raise KeyError(f"{len(l_missing_ids)} of {len(l_rows)} IDs were not found in the detections catalogue, "
+                           f"including: {l_missing_ids[:MAX_REPORTED_MISSING_IDS].tolist()}")
 
-        # Special handling for zero-length data
-        if len(l_ids) == 0:
-            data_table = full_data_table[np.zeros_like(t[MFC_TF.ID], dtype=bool)]
-        else:
-            data_table = Table(full_data_table.loc[l_ids])
+        data_table = full_data_table[l_rows]
 
     else:
         raise ValueError("Cannot find necessary data to calculate bin data in either target table or data stack.")
@@ -281,14 +363,26 @@ D_COLUMN_ADDING_METHODS = {
     BinParameters.SIZE: add_size_column,
     BinParameters.EPOCH: add_epoch_column}
 
+# Bin parameters to add data for with add_binning_data by default, in the order columns are added for them
+L_BINNING_DATA_PARAMETERS = [BinParameters.SNR,
+                             BinParameters.COLOUR,
+                             BinParameters.SIZE,
+                             BinParameters.BG,
+                             BinParameters.EPOCH]
+
 
 def add_binning_data(t: Table,
-                     data_stack: SHEFrameStack):
-    """ Adds columns with bin data to a table.
+                     data_stack: SHEFrameStack,
+                     l_bin_parameters: Optional[Iterable[BinParameters]] = None):
+    """ Adds columns with bin data to a table, for all non-global bin parameters, or only those in `l_bin_parameters`
+        if provided.
+
+        The data stack is only used as needed, so if it's a LazySHEFrameStack, exposures will only be read in if BG
+        data is to be added.
     """
 
-    add_snr_column(t, data_stack)
-    add_colour_column(t, data_stack)
-    add_size_column(t, data_stack)
-    add_bg_column(t, data_stack)
-    add_epoch_column(t, data_stack)
+    s_bin_parameters = set(l_bin_parameters) if l_bin_parameters is not None else set(L_BINNING_DATA_PARAMETERS)
+
+    for bin_parameter in L_BINNING_DATA_PARAMETERS:
+        if bin_parameter in s_bin_parameters:
+            D_COLUMN_ADDING_METHODS[bin_parameter](t, data_stack)
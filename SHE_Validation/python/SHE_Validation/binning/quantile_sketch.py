@@ -0,0 +1,269 @@
+"""
+:file: python/SHE_Validation/binning/quantile_sketch.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Mergeable sketch of the distribution of a bin parameter, which can be filled by streaming a single column from each
+of many catalogs, for determining bin limits automatically from all of them
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from astropy.io import fits
+
+from SHE_PPT.logging import getLogger
+
+logger = getLogger(__name__)
+
+# Default maximum number of values stored in the lowest level of a sketch. Sketches of up to this many values are
+# exact, and the error in the rank of quantiles estimated from larger sketches is roughly 1 / DEFAULT_SKETCH_SIZE
+DEFAULT_SKETCH_SIZE = 4096
+
+# Number of rows of a column to add to a sketch at a time when reading it from a file
+SKETCH_READ_CHUNK_SIZE = 1024 ** 2
+
+# Maximum number of sketches of columns of files kept in the cache (see `get_sketch_for_file`)
+MAX_CACHED_FILE_SKETCHES = 256
+
+# Ratio of the capacity of each level of a sketch to the capacity of the level above it
+_LEVEL_CAPACITY_RATIO = 2 / 3
+
+# Minimum capacity of any level of a sketch
+_MIN_LEVEL_CAPACITY = 2
+
+
+class QuantileSketch:
+    """ Mergeable sketch of a distribution of values, which can be used to estimate its quantiles without storing all
+        of the values. This is a KLL sketch: values are stored in levels, with each value in level h representing 2^h
+        of the values added. When a level exceeds its capacity, it's sorted and every other value is promoted to the
+        next level, alternating which are promoted so that estimates are unbiased on average.
+
+        Until more than `sketch_size` values have been added, all values are stored in the lowest level, and the sketch
+        is exact. Values which are inf, NaN, or masked are ignored.
+
+        Parameters
+        ----------
+        sketch_size : int
+            The maximum number of values stored in the lowest level of the sketch. The total number of values stored
+            is at most about three times this.
+    """
+
+    sketch_size: int
+    num_values: int
+
+    l_levels: List[np.ndarray]
+    _num_compactions: int
+
+    def __init__(self, sketch_size: int = DEFAULT_SKETCH_SIZE):
+
+        self.sketch_size = sketch_size
+        self.num_values = 0
+
+        self.l_levels = [np.array([], dtype=float)]
+        self._num_compactions = 0
+
+    def __len__(self) -> int:
+        return self.num_values
+
+    @property
+    def is_exact(self) -> bool:
+        """ Whether or not the sketch still stores every value added to it.
+        """
+        return len(self.l_levels) == 1
+
+    @property
+    def nbytes(self) -> int:
+        """ The memory used by the values stored in the sketch.
+        """
+        return sum(level.nbytes for level in self.l_levels)
+
+    def update(self, l_values: Sequence[float]) -> None:
+        """ Adds an array of values to the sketch, ignoring any which are inf, NaN, or masked.
+        """
+
+        l_good_values: np.ndarray = np.ma.masked_invalid(l_values).compressed().astype(float)
+
+        if len(l_good_values) == 0:
+            return
+
+        self.l_levels[0] = np.concatenate((self.l_levels[0], l_good_values))
+        self.num_values += len(l_good_values)
+
+        self._compress()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """ Adds all values from another sketch to this one. The other sketch isn't modified.
+        """
+
+        if other.num_values == 0:
+            return
+
+        while len(self.l_levels) < len(other.l_levels):
+            self.l_levels.append(np.array([], dtype=float))
+
+        for level_index, level in enumerate(other.l_levels):
+            self.l_levels[level_index] = np.concatenate((self.l_levels[level_index], level))
+
+        self.num_values += other.num_values
+
+        self._compress()
+
+    def get_sorted_values_and_weights(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ Gets a sorted array of the values stored in the sketch, and the number of values added to the sketch which
+            each represents.
+        """
+
+        l_values: np.ndarray = np.concatenate(self.l_levels)
+        l_weights: np.ndarray = np.concatenate([np.full(len(level), 2 ** level_index, dtype=np.int64)
+                                                for level_index, level in enumerate(self.l_levels)])
+
+        l_sorted = np.argsort(l_values, kind="stable")
+
+        return l_values[l_sorted], l_weights[l_sorted]
+
+    # Private methods
+
+    def _get_level_capacity(self, level_index: int) -> int:
+        """ Gets the maximum number of values which can be stored in a level of the sketch before it's compacted. The
+            top level has the full capacity, with each level below it having a fraction of the capacity of the one
+            above it.
+        """
+        depth = len(self.l_levels) - 1 - level_index
+        return max(_MIN_LEVEL_CAPACITY, int(np.ceil(self.sketch_size * _LEVEL_CAPACITY_RATIO ** depth)))
+
+    def _compress(self) -> None:
+        """ Compacts any levels of the sketch which exceed their capacity, adding levels as needed.
+        """
+
+        level_index = 0
+        while level_index < len(self.l_levels):
+
+            if len(self.l_levels[level_index]) <= self._get_level_capacity(level_index):
+                level_index += 1
+                continue
+
+            if level_index == len(self.l_levels) - 1:
+                self.l_levels.append(np.array([], dtype=float))
+
+            l_sorted_level: np.ndarray = np.sort(self.l_levels[level_index])
+
+            # If there's an odd number of values, keep the largest in this level, so the rest can be paired up
+            num_kept = len(l_sorted_level) % 2
+            l_compacted: np.ndarray = l_sorted_level[:len(l_sorted_level) - num_kept]
+
+            offset = self._num_compactions % 2
+            self._num_compactions += 1
+
+            self.l_levels[level_index] = l_sorted_level[len(l_sorted_level) - num_kept:]
+            self.l_levels[level_index + 1] = np.concatenate((self.l_levels[level_index + 1], l_compacted[offset::2]))
+
+            # Adding a level lowers the capacity of all levels below it, so start again from the bottom
+            level_index = 0
+
+
+# Cache of the sketch of each column of each file, keyed by the file's absolute path, size, and modification time (so
+# that it will be recalculated if the file changes), the column name, and the sketch size. The least-recently-used
+# sketches are discarded once it holds more than MAX_CACHED_FILE_SKETCHES
+_d_file_sketch_cache: "OrderedDict[Tuple[str, int, int, str, int], QuantileSketch]" = OrderedDict()
+_file_sketch_cache_lock = threading.Lock()
+
+
+def _get_cached_file_sketch(key: Tuple[str, int, int, str, int]) -> Optional[QuantileSketch]:
+    """ Gets a sketch from the file sketch cache, or None if it isn't in it.
+    """
+
+    with _file_sketch_cache_lock:
+        sketch: Optional[QuantileSketch] = _d_file_sketch_cache.get(key)
+        if sketch is not None:
+            _d_file_sketch_cache.move_to_end(key)
+        return sketch
+
+
+def _put_cached_file_sketch(key: Tuple[str, int, int, str, int],
+                            sketch: QuantileSketch) -> None:
+    """ Adds a sketch to the file sketch cache, discarding the least-recently-used sketches if it's full.
+    """
+
+    with _file_sketch_cache_lock:
+        _d_file_sketch_cache[key] = sketch
+        _d_file_sketch_cache.move_to_end(key)
+        while len(_d_file_sketch_cache) > MAX_CACHED_FILE_SKETCHES:
+            _d_file_sketch_cache.popitem(last=False)
+
+
+def get_sketch_for_file(qualified_filename: str,
+                        colname: str,
+                        sketch_size: int = DEFAULT_SKETCH_SIZE) -> Optional[QuantileSketch]:
+    """ Gets a sketch of the values in a column of the first table extension of a FITS file, reading only that column
+        in chunks. Returns None if the file doesn't have the column.
+
+        The sketch is cached for each file and column (up to MAX_CACHED_FILE_SKETCHES of them), and recalculated if
+        the file is modified, so the returned sketch must not be modified.
+    """
+
+    stat = os.stat(qualified_filename)
+    key = (os.path.abspath(qualified_filename), stat.st_size, stat.st_mtime_ns, colname, sketch_size)
+
+    sketch = _get_cached_file_sketch(key)
+    if sketch is not None:
+        return sketch
+
+    with fits.open(qualified_filename, memmap=True) as hdulist:
+        data = hdulist[1].data
+
+        if data is None or colname not in data.columns.names:
+            return None
+
+        col = data[colname]
+
+        sketch = QuantileSketch(sketch_size)
+        for start in range(0, len(col), SKETCH_READ_CHUNK_SIZE):
+            sketch.update(np.array(col[start:start + SKETCH_READ_CHUNK_SIZE]))
+
+    _put_cached_file_sketch(key, sketch)
+
+    return sketch
+
+
+def get_sketch_for_files(l_filenames: Sequence[str],
+                         colname: str,
+                         workdir: str = "",
+                         sketch_size: int = DEFAULT_SKETCH_SIZE) -> QuantileSketch:
+    """ Gets a sketch of the values in a column of the first table extension of each of a list of FITS files, with
+        filenames relative to the workdir, by merging the sketch of each file. Files which don't have the column are
+        skipped with a warning.
+    """
+
+    sketch = QuantileSketch(sketch_size)
+
+    for filename in l_filenames:
+
+        qualified_filename = os.path.join(workdir, filename)
+
+        file_sketch = get_sketch_for_file(qualified_filename, colname, sketch_size)
+        if file_sketch is None:
+            logger.warning(f"File {qualified_filename} has no column {colname}, so will not be used to determine "
+                           f"bin limits.")
+            continue
+
+        sketch.merge(file_sketch)
+
+    return sketch
@@ -21,15 +21,15 @@ Utility functions related to binning
 # the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 from copy import deepcopy
-from typing import Dict, TYPE_CHECKING, Union
+from typing import Dict, Optional, Sequence, TYPE_CHECKING, Union
 
 import numpy as np
 from astropy.table import Table
-from scipy.stats.mstats_basic import mquantiles
 
 from SHE_PPT.constants.classes import BinParameters
 from SHE_PPT.utility import is_inf_nan_or_masked
 from SHE_Validation.binning.bin_data import BIN_TF
+from SHE_Validation.binning.quantile_sketch import QuantileSketch, get_sketch_for_files
 from SHE_Validation.constants.default_config import (DEFAULT_AUTO_BIN_LIMITS, DEFAULT_N_BIN_LIMITS_QUANTILES,
                                                      STR_AUTO_BIN_LIMITS_HEAD,
                                                      TOT_BIN_LIMITS, )
@@ -55,7 +55,9 @@ MSG_BAD_BIN_LIMITS_VALUE = ("Provided bin limits value ('%s') is of unrecognized
 def get_d_l_bin_limits(pipeline_config,
                        bin_data_table=None,
                        l_bin_parameters=BinParameters,
-                       d_local_bin_keys=None):
+                       d_local_bin_keys=None,
+                       l_bin_data_filenames: Optional[Sequence[str]] = None,
+                       workdir: str = ""):
     """Convert the bin limits in a pipeline_config (after type conversion) into a dict of arrays.
 
     Parameters
@@ -65,8 +67,8 @@ def get_d_l_bin_limits(pipeline_config,
         desired types. The entries specifying bin limits should be in the format of either an iterable of the
         bin_limits_key limits, or a string of the format "auto-N" (for some positive integer N). In the former case,
         this iterable will be converted into a np.ndarray. In the latter case, a np.ndarray will be created with bin
-        limits to define N quantiles of the data to be binned, by referencing the data in the `bin_data_table` input
-        parameter.
+        limits to define N quantiles of the data to be binned, by referencing the data in the `bin_data_table` or
+        `l_bin_data_filenames` input parameter.
     bin_data_table : Table or None
         Table containing data to be binned, in case of automatic binning of any parameter. See description of
         `pipeline_config` above for details.
@@ -78,6 +80,12 @@ def get_d_l_bin_limits(pipeline_config,
         specifically for an individual validation test. If this is `None` (default), the keys for specifying bin limits
         globally will be used for all parameters. Similarly, if the entry for any bin parameter is `None`,
         the global key will be used for it.
+    l_bin_data_filenames : Sequence[str] or None
+        Filenames of FITS tables containing data to be binned, relative to `workdir`. If provided, this will be used
+        instead of `bin_data_table` for automatic binning, by streaming the column for each bin parameter from each
+        file into a quantile sketch, so that the bin limits reflect the data in all files without loading them.
+    workdir : str
+        The working directory, which `l_bin_data_filenames` are relative to.
 
     Returns
     -------
@@ -118,10 +126,18 @@ def get_d_l_bin_limits(pipeline_config,
 
         if isinstance(bin_limits_value, str):
 
+            # Use the provided files if we have them, otherwise the provided table
+            if l_bin_data_filenames is not None:
+                d_bin_limits[bin_parameter] = get_auto_bin_limits_from_files(bin_parameter=bin_parameter,
+                                                                             l_bin_data_filenames=l_bin_data_filenames,
+                                                                             workdir=workdir,
+                                                                             bin_limits_value=bin_limits_value)
+                continue
+
             # Raise an exception if no table was provided but we need one due to bin limits being specified via a string
             if bin_data_table is None:
-                raise ValueError(
-                    f"'{STR_AUTO_BIN_LIMITS_HEAD}' bin limits were requested, but no `bin_data_table` was provided.")
+                raise ValueError(f"'{STR_AUTO_BIN_LIMITS_HEAD}' bin limits were requested, but no `bin_data_table` or "
+                                 f"`l_bin_data_filenames` was provided.")
             d_bin_limits[bin_parameter] = get_auto_bin_limits_from_table(bin_parameter=bin_parameter,
                                                                          bin_limits_value=bin_limits_value,
                                                                          bin_data_table=bin_data_table)
@@ -148,6 +164,24 @@ def get_auto_bin_limits_from_table(bin_parameter: BinParameters,
     return l_quantiles
 
 
+def get_auto_bin_limits_from_files(bin_parameter: BinParameters,
+                                   l_bin_data_filenames: Sequence[str],
+                                   workdir: str = "",
+                                   bin_limits_value: str = DEFAULT_AUTO_BIN_LIMITS) -> np.ndarray:
+    """ Determines bin limits automatically from data for the relevant bin parameter in the provided FITS tables,
+        reading only the column for that bin parameter from each file.
+    """
+
+    # Interpret the provided value to get the number of quantiles
+    num_quantiles = _get_n_quantiles(bin_limits_value)
+
+    sketch = get_sketch_for_files(l_bin_data_filenames,
+                                  colname=getattr(BIN_TF, bin_parameter.value),
+                                  workdir=workdir)
+
+    return get_auto_bin_limits_from_sketch(sketch, num_quantiles)
+
+
 def get_auto_bin_limits_from_data(l_data: np.ndarray,
                                   num_quantiles: int = DEFAULT_N_BIN_LIMITS_QUANTILES) -> np.ndarray:
     """ Determines bin limits from an array of data and the desired number of quantiles to split the data into.
@@ -157,63 +191,81 @@ def get_auto_bin_limits_from_data(l_data: np.ndarray,
     l_l_is_good = np.where(np.logical_not(is_inf_nan_or_masked(np.asarray(l_data))))
     l_data = np.asarray(l_data)[l_l_is_good]
 
+    # Sort the data once, so that everything can be done with binary searches on it
+    return _get_auto_bin_limits_from_sorted_data(np.sort(l_data), num_quantiles)
+
+
+def get_auto_bin_limits_from_sketch(sketch: QuantileSketch,
+                                    num_quantiles: int = DEFAULT_N_BIN_LIMITS_QUANTILES) -> np.ndarray:
+    """ Determines bin limits from a sketch of the distribution of data and the desired number of quantiles to split
+        the data into. If the sketch is exact, this gives the same bin limits as `get_auto_bin_limits_from_data` would
+        for all the data added to it.
+    """
+
+    l_sorted_values, l_weights = sketch.get_sorted_values_and_weights()
+
+    if sketch.is_exact:
+        return _get_auto_bin_limits_from_sorted_data(l_sorted_values, num_quantiles)
+
+    return _get_auto_bin_limits_from_sorted_data(l_sorted_values, num_quantiles, l_cum_weights=np.cumsum(l_weights))
+
+
+def _get_auto_bin_limits_from_sorted_data(l_sorted_data: np.ndarray,
+                                          num_quantiles: int,
+                                          l_cum_weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """ Determines bin limits from a sorted array of good data and the desired number of quantiles to split the data
+        into. If `l_cum_weights` is provided, it's the cumulative sum of the number of values each element of the
+        data represents, otherwise each represents a single value.
+    """
+
     # Check for no good data, and return dummy bins if so
-    if len(l_data) == 0:
+    if len(l_sorted_data) == 0:
         return np.linspace(-1e99, 1e99, num_quantiles + 1)
 
-    # Use scipy to calculate bin limits via empirical qunatiles
+    num_data = len(l_sorted_data)
+
+    # Calculate bin limits via empirical quantiles
     l_prob: np.ndarray = np.linspace(0, 1, num_quantiles + 1, endpoint=True)
-    l_quantiles: np.ndarray = mquantiles(l_data, prob=l_prob, alphap=0, betap=1)
+    l_quantiles: np.ndarray = _get_quantiles_of_sorted_data(l_sorted_data, l_prob, l_cum_weights)
 
     # Override the first and last limit with -1e99 and 1e99 respectively
     l_quantiles[0] = -1e99
     l_quantiles[-1] = 1e99
 
     # Check if any of the bin limits exactly equal a value in the data, and if so, slightly decrease that bin limit
-    test_shifting: bool = False
-    for bin_index in range(num_quantiles - 1):
-        bin_max = l_quantiles[bin_index + 1]
-        if np.any(bin_max == l_data):
-            test_shifting = True
+    l_bin_max: np.ndarray = l_quantiles[1:-1]
+    l_i_lo: np.ndarray = np.searchsorted(l_sorted_data, l_bin_max, side="left")
+    l_i_hi: np.ndarray = np.searchsorted(l_sorted_data, l_bin_max, side="right")
 
     # If no bin limits match data values, we can return here
-    if not test_shifting:
+    if not np.any(l_i_hi > l_i_lo):
         return l_quantiles
 
-    # Since the mquantiles isn't consistent with how it sets quantiles, we have to test both shifting up and down, to
-    # see which gives the better distribution of bin limits
-
-    # Create lists of bin limits, shifted in each direction
-    l_quantiles_down = deepcopy(l_quantiles)
-    l_quantiles_up = deepcopy(l_quantiles)
-    for bin_index in range(num_quantiles - 1):
-        bin_max = l_quantiles[bin_index + 1]
+    # Since the interpolation of quantiles isn't consistent in which side of a data value it places them, we have to
+    # test both shifting up and down, to see which gives the better distribution of bin limits
 
-        # Find the value closest to this limit, but below it
-        dist_below: np.ndarray = np.where(l_data < bin_max, bin_max - l_data, 1e99)
-        closest_value_below: float = bin_max - np.min(dist_below)
+    # Find the value closest to each limit, but below it. The sorted data just before where the limit would be
+    # inserted is the closest below it
+    l_dist_below: np.ndarray = np.full(len(l_bin_max), 1e99)
+    l_has_below: np.ndarray = l_i_lo > 0
+    l_dist_below[l_has_below] = l_bin_max[l_has_below] - l_sorted_data[l_i_lo[l_has_below] - 1]
+    l_closest_value_below: np.ndarray = l_bin_max - l_dist_below
 
-        # Find the value closest to this limit, but above it
-        dist_above: np.ndarray = np.where(l_data > bin_max, l_data - bin_max, 1e99)
-        closest_value_above: float = bin_max + np.min(dist_above)
+    # Find the value closest to each limit, but above it
+    l_dist_above: np.ndarray = np.full(len(l_bin_max), 1e99)
+    l_has_above: np.ndarray = l_i_hi < num_data
+    l_dist_above[l_has_above] = l_sorted_data[l_i_hi[l_has_above]] - l_bin_max[l_has_above]
+    l_closest_value_above: np.ndarray = l_bin_max + l_dist_above
 
-        # Place the bin limit between this and where it was
-        l_quantiles_down[bin_index + 1] = (closest_value_below + bin_max) / 2
-        l_quantiles_up[bin_index + 1] = (closest_value_above + bin_max) / 2
+    # Create lists of bin limits, shifted in each direction to between the limit and the closest value
+    l_quantiles_down = np.copy(l_quantiles)
+    l_quantiles_up = np.copy(l_quantiles)
+    l_quantiles_down[1:-1] = (l_closest_value_below + l_bin_max) / 2
+    l_quantiles_up[1:-1] = (l_closest_value_above + l_bin_max) / 2
 
     # Count the number in each bin, for each way to set quantiles
-    l_num_in_bin_down = np.zeros(num_quantiles, dtype=int)
-    l_num_in_bin_up = np.zeros(num_quantiles, dtype=int)
-    for bin_index in range(num_quantiles):
-        bin_down_lo: float = l_quantiles_down[bin_index]
-        bin_down_hi: float = l_quantiles_down[bin_index + 1]
-
-        l_num_in_bin_down[bin_index] = np.sum(np.logical_and(l_data >= bin_down_lo, l_data < bin_down_hi))
-
-        bin_up_lo: float = l_quantiles_up[bin_index]
-        bin_up_hi: float = l_quantiles_up[bin_index + 1]
-
-        l_num_in_bin_up[bin_index] = np.sum(np.logical_and(l_data >= bin_up_lo, l_data < bin_up_hi))
+    l_num_in_bin_down = _get_num_in_bins_of_sorted_data(l_sorted_data, l_quantiles_down, l_cum_weights)
+    l_num_in_bin_up = _get_num_in_bins_of_sorted_data(l_sorted_data, l_quantiles_up, l_cum_weights)
 
     # Determine which is better, by having lower standard deviation in number, and use that
     if np.std(l_num_in_bin_down) < np.std(l_num_in_bin_up):
@@ -222,6 +274,49 @@ def get_auto_bin_limits_from_data(l_data: np.ndarray,
         return l_quantiles_up
 
 
+def _get_quantiles_of_sorted_data(l_sorted_data: np.ndarray,
+                                  l_prob: np.ndarray,
+                                  l_cum_weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """ Calculates empirical quantiles of sorted data at the provided probabilities, in the same way as scipy's
+        `mquantiles` with `alphap=0` and `betap=1`, but without sorting the data again. If `l_cum_weights` is
+        provided, each element of the data is treated as that many repeated values.
+    """
+
+    num_data = len(l_sorted_data) if l_cum_weights is None else int(l_cum_weights[-1])
+
+    if num_data == 1:
+        return np.full(len(l_prob), l_sorted_data[0], dtype=float)
+
+    aleph: np.ndarray = num_data * l_prob
+    k: np.ndarray = np.floor(aleph.clip(1, num_data - 1)).astype(int)
+    gamma: np.ndarray = (aleph - k).clip(0, 1)
+
+    # Get the element of the data which each rank falls in
+    if l_cum_weights is None:
+        l_i_below, l_i_above = k - 1, k
+    else:
+        l_i_below = np.searchsorted(l_cum_weights, k - 1, side="right")
+        l_i_above = np.searchsorted(l_cum_weights, k, side="right")
+
+    return (1. - gamma) * l_sorted_data[l_i_below] + gamma * l_sorted_data[l_i_above]
+
+
+def _get_num_in_bins_of_sorted_data(l_sorted_data: np.ndarray,
+                                    l_bin_limits: np.ndarray,
+                                    l_cum_weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """ Counts the number of values of sorted data in each bin, where values are in a bin if they're greater than or
+        equal to its lower limit and less than its upper limit. If `l_cum_weights` is provided, each element of the
+        data is counted as that many values.
+    """
+
+    # The number of values less than each limit. If limits are out of order, the bin between them is empty
+    l_num_below: np.ndarray = np.searchsorted(l_sorted_data, l_bin_limits, side="left")
+    if l_cum_weights is not None:
+        l_num_below = np.concatenate(([0], l_cum_weights))[l_num_below]
+
+    return np.maximum(np.diff(l_num_below), 0)
+
+
 def _get_n_quantiles(bin_limits_value: str) -> int:
     """ Parse a provided string to check for validity and determine the desired number of quantiles.
     """
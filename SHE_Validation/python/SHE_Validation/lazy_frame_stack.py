@@ -0,0 +1,114 @@
+"""
+:file: python/SHE_Validation/lazy_frame_stack.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Class which acts as an SHEFrameStack, but only reads in exposure data if it's needed
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from typing import Any, Dict, Optional, Type
+
+from astropy.table import Table
+
+from SHE_PPT.logging import getLogger
+from SHE_PPT.she_frame_stack import SHEFrameStack
+
+logger = getLogger(__name__)
+
+
+class LazySHEFrameStack:
+    """ Stand-in for an SHEFrameStack, which is read in as needed. The detections catalogue is read on its own the
+        first time it's requested, without reading any exposures. The full stack, including exposure images and
+        background maps, is only read the first time anything else is requested from it (e.g. through
+        `extract_galaxy_stack`), and is then used for all further requests.
+
+        This means that if only data from the detections catalogue is needed (e.g. to calculate SNR, colour, and size
+        bin data), no exposure data will be read at all. If the full stack is needed, the detections catalogue will
+        end up being read twice, but this is small compared to the exposure data.
+
+        Parameters
+        ----------
+        exposure_listfile_filename : Optional[str]
+            Filename of the listfile of exposure products, as for SHEFrameStack.read
+        detections_listfile_filename : Optional[str]
+            Filename of the listfile of detections catalog products, as for SHEFrameStack.read
+        **kwargs : Any
+            Further keyword arguments to pass to SHEFrameStack.read, e.g. `object_id_list` and `workdir`
+    """
+
+    # Type of frame stack to read in, which can be overridden for testing
+    frame_stack_type: Type[SHEFrameStack] = SHEFrameStack
+
+    _d_read_kwargs: Dict[str, Any]
+    _detections_stack: Optional[SHEFrameStack]
+    _full_stack: Optional[SHEFrameStack]
+
+    def __init__(self,
+                 exposure_listfile_filename: Optional[str],
+                 detections_listfile_filename: Optional[str],
+                 **kwargs: Any):
+
+        self._d_read_kwargs = {"exposure_listfile_filename": exposure_listfile_filename,
+                               "detections_listfile_filename": detections_listfile_filename,
+                               **kwargs}
+
+        self._detections_stack = None
+        self._full_stack = None
+
+    @property
+    def is_fully_read(self) -> bool:
+        """ Whether or not the full stack, including exposures, has been read in.
+        """
+        return self._full_stack is not None
+
+    @property
+    def detections_catalogue(self) -> Optional[Table]:
+        """ The detections catalogue, read in on its own if the full stack hasn't already been read.
+        """
+
+        if self._full_stack is not None:
+            return self._full_stack.detections_catalogue
+
+        if self._detections_stack is None:
+            logger.info("Reading in detections catalogue for data stack, without exposures.")
+            self._detections_stack = self.frame_stack_type.read(**{**self._d_read_kwargs,
+                                                                   "exposure_listfile_filename": None})
+
+        return self._detections_stack.detections_catalogue
+
+    @property
+    def full_stack(self) -> SHEFrameStack:
+        """ The full stack, including exposures, read in the first time it's requested.
+        """
+
+        if self._full_stack is None:
+            logger.info("Reading in full data stack, including exposures.")
+            self._full_stack = self.frame_stack_type.read(**self._d_read_kwargs)
+            self._detections_stack = None
+
+        return self._full_stack
+
+    def __getattr__(self, name: str) -> Any:
+        """ Gets any attribute not defined in this class from the full stack, reading it in if necessary.
+        """
+
+        # Don't read in the stack for private attributes, which might be requested e.g. while copying or pickling
+        # before __init__ has set up this object's own attributes
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        return getattr(self.full_stack, name)
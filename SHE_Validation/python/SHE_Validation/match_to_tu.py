@@ -22,37 +22,91 @@ Code to implement matching of shear estimates catalogs to SIM's TU galaxy and st
 
 import os
 from argparse import Namespace
-from typing import Dict, List, Optional, Sequence, Set, Tuple
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from copy import deepcopy
+from functools import partial
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple, Union
 
 import numpy as np
 from astropy.coordinates import SkyCoord
 from astropy.io import fits
 from astropy.io.fits import table_to_hdu
-from astropy.table import Column, Table, join, vstack
+from astropy.table import Column, Table, vstack
+from scipy.spatial import cKDTree
 
 import SHE_Validation
 from SHE_PPT import file_io, products
 from SHE_PPT.constants.config import ValidationConfigKeys
 from SHE_PPT.constants.shear_estimation_methods import (D_SHEAR_ESTIMATION_METHOD_TUM_TABLE_FORMATS,
                                                         ShearEstimationMethods, )
-from SHE_PPT.file_io import read_d_method_tables, read_listfile, read_table
+from SHE_PPT.file_io import read_d_method_tables, read_listfile
 from SHE_PPT.logging import getLogger
 from SHE_PPT.product_utility import get_data_filename_from_product
-from SHE_PPT.she_frame_stack import SHEFrameStack
 from SHE_PPT.table_formats.she_tu_matched import SheTUMatchedFormat, tf as tum_tf
 from SHE_PPT.utility import is_nan_or_masked
 from SHE_Validation.binning.bin_data import add_binning_data
+from SHE_Validation.constants.test_info import BinParameters
+from SHE_Validation.lazy_frame_stack import LazySHEFrameStack
+from SHE_Validation.table_utility import (BinTableStream, IDIndex, TableBuffer, get_table_of_columns,
+                                          mask_invalid_values, )
+from SHE_Validation.tiling import TilePlan, plan_balanced_tiles
+from SHE_Validation.tu_catalog_index import TUCatalogIndex, get_tu_ra_dec
 from SHE_Validation.utility import get_object_id_list_from_se_tables
 
 logger = getLogger(__name__)
 
 max_coverage = 1.0  # deg
 
-
-def select_true_universe_sources(catalog_filenames, ra_range, dec_range, path):
+# Arguments shared by all tiles when matching in parallel, set up once in each worker process by _init_tile_worker
+_d_worker_shared_args: Dict[str, Any] = {}
+
+# Columns in the TU star and galaxy catalogs which aren't needed for matching, and so don't need to be read in
+L_UNUSED_TU_STAR_COLUMNS = ['DIST', 'TU_MAG_H_2MASS', 'SED_TEMPLATE',
+                            'AV', 'TU_FNU_VIS', 'TU_FNU_Y_NISP', 'TU_FNU_J_NISP',
+                            'TU_FNU_H_NISP', 'TU_FNU_G_DECAM', 'TU_FNU_R_DECAM',
+                            'TU_FNU_I_DECAM', 'TU_FNU_Z_DECAM', 'TU_FNU_U_MEGACAM',
+                            'TU_FNU_R_MEGACAM', 'TU_FNU_G_JPCAM', 'TU_FNU_I_PANSTARRS',
+                            'TU_FNU_Z_PANSTARRS', 'TU_FNU_Z_HSC', 'TU_FNU_G_GAIA',
+                            'TU_FNU_BP_GAIA', 'TU_FNU_RP_GAIA', 'TU_FNU_U_LSST',
+                            'TU_FNU_G_LSST', 'TU_FNU_R_LSST', 'TU_FNU_I_LSST',
+                            'TU_FNU_Z_LSST', 'TU_FNU_Y_LSST', 'TU_FNU_U_KIDS',
+                            'TU_FNU_G_KIDS', 'TU_FNU_R_KIDS', 'TU_FNU_I_KIDS',
+                            'TU_FNU_J_2MASS', 'TU_FNU_H_2MASS', 'TU_FNU_KS_2MASS',
+                            'GAIA_RA', 'GAIA_RA_ERROR', 'GAIA_DEC', 'GAIA_DEC_ERROR',
+                            'GAIA_PHOT_G_MEAN_FLUX', 'GAIA_PHOT_G_MEAN_FLUX_ERROR',
+                            'GAIA_PHOT_BP_MEAN_FLUX', 'GAIA_PHOT_BP_MEAN_FLUX_ERROR',
+                            'GAIA_PHOT_RP_MEAN_FLUX', 'GAIA_PHOT_RP_MEAN_FLUX_ERROR']
+
+L_UNUSED_TU_GALAXY_COLUMNS = ['SOURCE_ID', 'HALO_ID', 'RA', 'DEC',
+                              'EXT_LAW', 'EBV', 'HALPHA_LOGFLAM_EXT_MAG',
+                              'HBETA_LOGFLAM_EXT_MAG', 'O2_LOGFLAM_EXT_MAG',
+                              'O3_LOGFLAM_EXT_MAG', 'N2_LOGFLAM_EXT_MAG',
+                              'S2_LOGFLAM_EXT_MAG', 'AV', 'TU_FNU_VIS_MAG',
+                              'TU_FNU_Y_NISP_MAG', 'TU_FNU_J_NISP_MAG', 'TU_FNU_H_NISP_MAG',
+                              'TU_FNU_G_DECAM_MAG', 'TU_FNU_R_DECAM_MAG',
+                              'TU_FNU_I_DECAM_MAG', 'TU_FNU_Z_DECAM_MAG',
+                              'TU_FNU_U_MEGACAM_MAG', 'TU_FNU_R_MEGACAM_MAG',
+                              'TU_FNU_G_JPCAM_MAG', 'TU_FNU_I_PANSTARRS_MAG',
+                              'TU_FNU_Z_PANSTARRS_MAG', 'TU_FNU_Z_HSC_MAG',
+                              'TU_FNU_G_GAIA_MAG', 'TU_FNU_BP_GAIA_MAG', 'TU_FNU_RP_GAIA_MAG',
+                              'TU_FNU_U_LSST_MAG', 'TU_FNU_G_LSST_MAG', 'TU_FNU_R_LSST_MAG',
+                              'TU_FNU_I_LSST_MAG', 'TU_FNU_Z_LSST_MAG', 'TU_FNU_Y_LSST_MAG',
+                              'TU_FNU_U_KIDS_MAG', 'TU_FNU_G_KIDS_MAG', 'TU_FNU_R_KIDS_MAG',
+                              'TU_FNU_I_KIDS_MAG', 'TU_FNU_J_2MASS_MAG',
+                              'TU_FNU_H_2MASS_MAG', 'TU_FNU_KS_2MASS_MAG']
+
+
+def select_true_universe_sources(catalog_filenames, ra_range, dec_range, path,
+                                 columns: Optional[Sequence[str]] = None,
+                                 excluded_columns: Optional[Sequence[str]] = None,
+                                 tu_index: Optional[TUCatalogIndex] = None):
     """ Loads all the True Universe catalog files and selects only those
     sources that fall inside the specified (RA, Dec) region.
 
+    Only the (RA, Dec) columns are read for all sources; the columns to be output (all columns by default, or
+    those specified by `columns`, minus any in `excluded_columns`) are read only for the selected sources. If an
+    index is provided, it will be used to read the (RA, Dec) of only those sources near the region.
     """
     # Loop over the True Universe catalog files and select the relevant sources
     merged_catalog: Optional[Table] = None
@@ -67,28 +121,35 @@ def select_true_universe_sources(catalog_filenames, ra_range, dec_range, path):
 
         logger.debug("Reading overlapping sources from " + qualified_filename + ".")
 
-        # Load the catalog table
+        with fits.open(qualified_filename, memmap=True, character_as_bytes=True) as hdulist:
+
+            catalog_hdu: fits.BinTableHDU = hdulist[1]
 
-        catalog = read_table(qualified_filename)
+            # Get the (RA, Dec) columns, for only sources near the range if we have an index
+            l_rows, ra, dec = _get_tu_rows_ra_dec(catalog_hdu, qualified_filename,
+                                                  ra_range=ra_range,
+                                                  dec_range=dec_range,
+                                                  tu_index=tu_index)
 
-        # Get the (RA, Dec) columns
-        ra = catalog["RA_MAG"] if "RA_MAG" in catalog.colnames else catalog["RA"]
-        dec = catalog["DEC_MAG"] if "DEC_MAG" in catalog.colnames else catalog["DEC"]
+            # Check which sources fall inside the given (RA, Dec) ranges
+            cond_ra = np.logical_and(ra > ra_range[0], ra < ra_range[1])
+            cond_dec = np.logical_and(dec > dec_range[0], dec < dec_range[1])
+            cond = np.logical_and(cond_ra, cond_dec)
 
-        # Check which sources fall inside the given (RA, Dec) ranges
-        cond_ra = np.logical_and(ra > ra_range[0], ra < ra_range[1])
-        cond_dec = np.logical_and(dec > dec_range[0], dec < dec_range[1])
-        cond = np.logical_and(cond_ra, cond_dec)
+            # Load the desired columns of the catalog table, for only the selected sources
+            catalog = _read_tu_rows(catalog_hdu, l_rows[cond],
+                                    columns=columns,
+                                    excluded_columns=excluded_columns)
 
         # Skip this catalog if no values in it are valid
-        if not np.any(cond):
+        if len(catalog) == 0:
             continue
 
         # Add the selected sources to the merged catalog
         if merged_catalog is None:
-            merged_catalog = catalog[cond]
+            merged_catalog = catalog
         else:
-            merged_catalog = vstack([merged_catalog, catalog[cond]])
+            merged_catalog = vstack([merged_catalog, catalog])
 
     if merged_catalog is None:
 
@@ -96,13 +157,160 @@ def select_true_universe_sources(catalog_filenames, ra_range, dec_range, path):
 
         if catalog is not None and cond is not None:
             logger.warning(err)
-            merged_catalog = catalog[cond]
+            merged_catalog = catalog
         else:
             raise ValueError(err)
 
     return merged_catalog
 
 
+def bucket_true_universe_sources(catalog_filenames: Sequence[str],
+                                 tile_plan: TilePlan,
+                                 path: str,
+                                 columns: Optional[Sequence[str]] = None,
+                                 excluded_columns: Optional[Sequence[str]] = None,
+                                 tu_index: Optional[TUCatalogIndex] = None) -> Dict[int, Table]:
+    """ Loads each of the True Universe catalog files once, and sorts the sources in them into the tiles defined by
+        the provided plan. The table for each tile is identical to what would be returned by
+        select_true_universe_sources for that tile's range, including the handling of tiles with no sources in them.
+        As with that function, only the (RA, Dec) columns are read for sources which don't fall within any tile, and
+        if an index is provided, these are only read for sources near the tiles.
+
+        Returns a dict of tile index: Table of sources in that tile.
+    """
+
+    d_l_tile_catalogs: Dict[int, List[Table]] = {tile_i: [] for tile_i in range(len(tile_plan))}
+    catalog: Optional[Table] = None
+
+    logger.info("Reading in overlapping sources for all tiles.")
+
+    for filename in catalog_filenames:
+
+        qualified_filename = file_io.find_file(filename, path=path)
+
+        logger.debug("Reading overlapping sources from " + qualified_filename + ".")
+
+        with fits.open(qualified_filename, memmap=True, character_as_bytes=True) as hdulist:
+
+            catalog_hdu: fits.BinTableHDU = hdulist[1]
+
+            # Determine which tile (if any) each source is in
+            l_rows, ra, dec = _get_tu_rows_ra_dec_in_plan(catalog_hdu, qualified_filename,
+                                                          tile_plan=tile_plan,
+                                                          tu_index=tu_index)
+            l_tile_i = tile_plan.get_tile_indices(ra, dec)
+
+            # Load the desired columns of the catalog table, for only the sources which are in a tile
+            l_is_in_tile = l_tile_i >= 0
+            catalog = _read_tu_rows(catalog_hdu, l_rows[l_is_in_tile],
+                                    columns=columns,
+                                    excluded_columns=excluded_columns)
+            l_tile_i = l_tile_i[l_is_in_tile]
+
+        # Group the rows by tile, using a stable sort so that rows within each tile keep their order in the file
+        l_sorted_rows = np.argsort(l_tile_i, kind="stable")
+        l_sorted_tile_i = l_tile_i[l_sorted_rows]
+        l_unique_tile_i, l_starts = np.unique(l_sorted_tile_i, return_index=True)
+        l_ends = np.append(l_starts[1:], len(l_sorted_tile_i))
+
+        for tile_i, start, end in zip(l_unique_tile_i, l_starts, l_ends):
+            d_l_tile_catalogs[int(tile_i)].append(catalog[l_sorted_rows[start:end]])
+
+    if catalog is None:
+        raise ValueError(f"No TU sources found in regions: {tile_plan.get_bounding_ranges()}")
+
+    # Combine the tables for each tile, discarding the lists as we go to keep memory usage down
+    d_tile_catalogs: Dict[int, Table] = {}
+    for tile_i in list(d_l_tile_catalogs):
+        l_tile_catalogs = d_l_tile_catalogs.pop(tile_i)
+        if len(l_tile_catalogs) == 0:
+            ra_range, dec_range = tile_plan.l_tile_ranges[tile_i]
+            logger.warning(f"No TU sources found in region: \nR.A.: {ra_range}\nDec.: {dec_range}")
+            d_tile_catalogs[tile_i] = catalog[np.zeros(len(catalog), dtype=bool)]
+        elif len(l_tile_catalogs) == 1:
+            d_tile_catalogs[tile_i] = l_tile_catalogs[0]
+        else:
+            d_tile_catalogs[tile_i] = vstack(l_tile_catalogs)
+
+    return d_tile_catalogs
+
+
+def _get_tu_rows_ra_dec(catalog_hdu: fits.BinTableHDU,
+                        qualified_filename: str,
+                        ra_range: Optional[Sequence[float]],
+                        dec_range: Optional[Sequence[float]],
+                        tu_index: Optional[TUCatalogIndex] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Gets the rows and (RA, Dec) of the sources in a TU catalog which might be within the provided range. If an
+        index is provided, it will be used to find only those sources near the range, otherwise all sources in the
+        catalog will be returned.
+    """
+    if tu_index is not None:
+        return tu_index.get_ra_dec_in_range(qualified_filename, ra_range=ra_range, dec_range=dec_range)
+
+    ra, dec = get_tu_ra_dec(catalog_hdu.data)
+    return np.arange(len(ra)), ra, dec
+
+
+def _read_tu_rows(catalog_hdu: fits.BinTableHDU,
+                  l_rows: np.ndarray,
+                  columns: Optional[Sequence[str]] = None,
+                  excluded_columns: Optional[Sequence[str]] = None) -> Table:
+    """ Reads the desired columns for only the selected rows of a (possibly memory-mapped) TU catalog HDU into a
+        table. The data is copied, so the table remains valid after the file is closed. The table has the same
+        metadata, column attributes, and masking as if the catalog were read in full and the rows selected from it,
+        provided the HDU was opened with `character_as_bytes=True`, as it is when a table is read from a file.
+    """
+
+    if columns is None:
+        columns = catalog_hdu.columns.names
+    if excluded_columns is not None:
+        s_excluded_columns = set(excluded_columns)
+        columns = [colname for colname in columns if colname not in s_excluded_columns]
+
+    # Read the HDU without stripping spaces or masking invalid values, so its columns are views of the
+    # (memory-mapped) data, and do these for only the selected rows once they've been copied
+    catalog_mmap = Table.read(catalog_hdu, mask_invalid=False, strip_spaces=False)
+    catalog = get_table_of_columns(catalog_mmap, columns, l_rows=l_rows)
+
+    for col in catalog.itercols():
+        if col.dtype.kind == "S":
+            col.data[:] = np.char.rstrip(col.data)
+    mask_invalid_values(catalog)
+
+    return catalog
+
+
+def _get_tu_rows_ra_dec_in_plan(catalog_hdu: fits.BinTableHDU,
+                                qualified_filename: str,
+                                tile_plan: TilePlan,
+                                tu_index: Optional[TUCatalogIndex] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Gets the rows and (RA, Dec) of the sources in a TU catalog which might be within any tile of the provided
+        plan, sorted by row. If an index is provided, it will be used to find only those sources near the tiles,
+        otherwise all sources in the catalog will be returned.
+    """
+    if tu_index is None:
+        return _get_tu_rows_ra_dec(catalog_hdu, qualified_filename, ra_range=None, dec_range=None)
+
+    l_l_rows, l_l_ra, l_l_dec = [], [], []
+    for ra_range, dec_range in tile_plan.get_bounding_ranges():
+        l_rows, ra, dec = _get_tu_rows_ra_dec(catalog_hdu, qualified_filename,
+                                              ra_range=ra_range,
+                                              dec_range=dec_range,
+                                              tu_index=tu_index)
+        l_l_rows.append(l_rows)
+        l_l_ra.append(ra)
+        l_l_dec.append(dec)
+
+    if len(l_l_rows) == 0:
+        return np.array([], dtype=int), np.array([], dtype=float), np.array([], dtype=float)
+
+    # The bounding ranges don't overlap, but the index returns sources in whole cells, so if two ranges are within a
+    # cell of each other, the sources in it will be found for both. Keep only one of each, sorted back into order
+    l_rows, l_unique = np.unique(np.concatenate(l_l_rows), return_index=True)
+
+    return l_rows, np.concatenate(l_l_ra)[l_unique], np.concatenate(l_l_dec)[l_unique]
+
+
 def match_to_tu_from_args(args):
     """ Main function for performing True Universe matching
     """
@@ -124,63 +332,113 @@ def match_to_tu_from_args(args):
     (ra_range,
      dec_range) = determine_coord_range(d_shear_tables, match_threshold)
 
-    ra_limits = np.linspace(ra_range[0], ra_range[1], num=int(
-        (ra_range[1] - ra_range[0]) / max_coverage) + 2, endpoint=True)
-    dec_limits = np.linspace(dec_range[0], dec_range[1], num=int(
-        (dec_range[1] - dec_range[0]) / max_coverage) + 2, endpoint=True)
+    # Plan the tiles we'll match within
+    tile_plan = plan_tiles(d_shear_tables,
+                           ra_range=ra_range,
+                           dec_range=dec_range,
+                           max_objects_per_tile=args.max_objects_per_tile)
+
+    # If desired, use an index of the TU source positions to read only sources near the region we're matching within
+    tu_index: Optional[TUCatalogIndex] = None
+    if args.tu_index_dir is not None:
+        tu_index = TUCatalogIndex(args.tu_index_dir)
+
+    # Read in each TU catalog only once, sorting the sources in them into the tiles we'll match within
+    d_tile_star_catalogs = bucket_true_universe_sources(catalog_filenames=star_catalog_filenames,
+                                                        tile_plan=tile_plan,
+                                                        path=search_path,
+                                                        excluded_columns=L_UNUSED_TU_STAR_COLUMNS,
+                                                        tu_index=tu_index)
+    d_tile_galaxy_catalogs = bucket_true_universe_sources(catalog_filenames=galaxy_catalog_filenames,
+                                                          tile_plan=tile_plan,
+                                                          path=search_path,
+                                                          excluded_columns=L_UNUSED_TU_GALAXY_COLUMNS,
+                                                          tu_index=tu_index)
+
+    # If desired, determine the union of objects across all methods, so we can match them all at once
+    union_positions: Optional[UnionPositions] = None
+    if args.match_object_union:
+        union_positions = UnionPositions(d_shear_tables)
+
+    d_shared_args: Dict[str, Any] = {"shear_tables": d_shear_tables,
+                                     "galaxy_catalog_filenames": galaxy_catalog_filenames,
+                                     "star_catalog_filenames": star_catalog_filenames,
+                                     "match_threshold": match_threshold,
+                                     "search_path": search_path,
+                                     "union_positions": union_positions}
+
+    l_d_tile_args = get_l_d_tile_args(tile_plan, d_tile_star_catalogs, d_tile_galaxy_catalogs)
+
+    # If desired, set up to add the data necessary for binning to each tile's galaxy table as it's matched, reading in
+    # the data stack only as it's needed for this
+    prepare_gal_matched_table: Optional[Callable[[Table], None]] = None
+    if args.pipeline_config[ValidationConfigKeys.TUM_ADD_BIN_COLUMNS]:
+        s_object_ids: Set[int] = get_object_id_list_from_se_tables(d_shear_tables)
+        data_stack = LazySHEFrameStack(exposure_listfile_filename=args.data_images,
+                                       detections_listfile_filename=args.detections_tables,
+                                       object_id_list=s_object_ids,
+                                       workdir=workdir)
 
-    star_matched_tables: Dict[ShearEstimationMethods, List[Table]] = {}
-    gal_matched_tables: Dict[ShearEstimationMethods, List[Table]] = {}
+        l_bin_parameters: Optional[List[BinParameters]] = None
+        if args.bin_parameters is not None:
+            l_bin_parameters = [BinParameters(bin_parameter) for bin_parameter in args.bin_parameters]
 
-    for method in ShearEstimationMethods:
-        star_matched_tables[method] = []
-        gal_matched_tables[method] = []
+        prepare_gal_matched_table = partial(add_binning_data,
+                                            data_stack=data_stack,
+                                            l_bin_parameters=l_bin_parameters)
 
-    for ra_i in range(len(ra_limits) - 1):
-        for dec_i in range(len(dec_limits) - 1):
+    # Set up streams for the matched tables for each method, which each tile's matched rows will be written to as
+    # it's matched, so that they don't all need to be held in memory until the end
+    star_matched_tables: Dict[ShearEstimationMethods, BinTableStream] = {}
+    gal_matched_tables: Dict[ShearEstimationMethods, BinTableStream] = {}
 
-            local_ra_range = np.array((ra_limits[ra_i], ra_limits[ra_i + 1]))
-            local_dec_range = np.array((dec_limits[dec_i], dec_limits[dec_i + 1]))
+    for method in ShearEstimationMethods:
+        star_matched_tables[method] = BinTableStream(workdir=workdir)
+        gal_matched_tables[method] = BinTableStream(workdir=workdir)
+
+    try:
+        match_tiles(l_d_tile_args=l_d_tile_args,
+                    d_shared_args=d_shared_args,
+                    gal_matched_tables=gal_matched_tables,
+                    star_matched_tables=star_matched_tables,
+                    num_processes=args.num_processes,
+                    prepare_gal_matched_table=prepare_gal_matched_table)
+
+        matched_catalog_product = write_matched_catalogs(d_shear_tables=d_shear_tables,
+                                                         gal_matched_tables=gal_matched_tables,
+                                                         star_matched_tables=star_matched_tables,
+                                                         workdir=workdir)
+    finally:
+        for stream in (*gal_matched_tables.values(), *star_matched_tables.values()):
+            stream.close()
 
-            logger.info("Processing batch (" + str(ra_i + 1) + "," + str(dec_i + 1) + ") of (" +
-                        str(len(ra_limits) - 1) + "," + str(len(dec_limits) - 1) + ")")
-            logger.info("Processing ra range: " + str(local_ra_range))
-            logger.info("      and dec range: " + str(local_dec_range))
+    # Write the data product
+    file_io.write_xml_product(matched_catalog_product,
+                              args.matched_catalog,
+                              workdir=workdir,
+                              log_info=True)
 
-            match_within_coord_range(d_shear_tables, gal_matched_tables, star_matched_tables, galaxy_catalog_filenames,
-                                     star_catalog_filenames, local_ra_range, local_dec_range, match_threshold,
-                                     search_path)
 
-    # Read in the data stack
-    if args.pipeline_config[ValidationConfigKeys.TUM_ADD_BIN_COLUMNS]:
-        s_object_ids: Set[int] = get_object_id_list_from_se_tables(d_shear_tables)
-        data_stack: Optional[SHEFrameStack] = SHEFrameStack.read(exposure_listfile_filename=args.data_images,
-                                                                 detections_listfile_filename=args.detections_tables,
-                                                                 object_id_list=s_object_ids,
-                                                                 workdir=workdir)
-    else:
-        data_stack: Optional[SHEFrameStack] = None
+def write_matched_catalogs(d_shear_tables: Dict[ShearEstimationMethods, Table],
+                           gal_matched_tables: Dict[ShearEstimationMethods, BinTableStream],
+                           star_matched_tables: Dict[ShearEstimationMethods, BinTableStream],
+                           workdir: str) -> Any:
+    """ Writes out the matched catalog for each method which any tables were matched for, and creates a data product
+        pointing to them.
+    """
 
-    # Create output data product
     matched_catalog_product = products.she_measurements.create_dpd_she_measurements()
     for method in ShearEstimationMethods:
 
-        if len(gal_matched_tables[method]) == 0:
+        if gal_matched_tables[method].num_tables == 0:
             matched_catalog_product.set_method_filename(method, None)
             continue
 
-        gal_matched_table = vstack(gal_matched_tables[method])
-        if len(gal_matched_table) == 0:
+        if len(gal_matched_tables[method]) == 0:
             logger.warning(f"No measurements with method {method.value} were matched to galaxies.")
-        star_matched_table = vstack(star_matched_tables[method])
-        if len(star_matched_table) == 0:
+        if len(star_matched_tables[method]) == 0:
             logger.warning(f"No measurements with method {method.value} were matched to stars.")
 
-        # Update each galaxy table with data necessary for binning if desired
-        if args.pipeline_config[ValidationConfigKeys.TUM_ADD_BIN_COLUMNS]:
-            add_binning_data(t=gal_matched_table,
-                             data_stack=data_stack)
-
         unmatched_table = d_shear_tables[method]
 
         method_filename = file_io.get_allowed_filename("SHEAR-SIM-MATCHED-CAT",
@@ -190,25 +448,256 @@ def match_to_tu_from_args(args):
                                                        subdir="data", )
         matched_catalog_product.set_method_filename(method, method_filename)
 
-        # Turn each table into an HDU and add it to an HDU list
-        hdulist = fits.HDUList()
-        hdulist.append(fits.PrimaryHDU())
+        # Write out the file. The galaxy table goes first, since it's more relevant
+        qualified_method_filename = os.path.join(workdir, method_filename)
+        logger.info(f"Writing output matched catalog for method {method.value} to {qualified_method_filename}")
 
-        # Add the galaxy table first, since it's more relevant
-        hdulist.append(table_to_hdu(gal_matched_table))
-        hdulist.append(table_to_hdu(star_matched_table))
-        hdulist.append(table_to_hdu(unmatched_table))
+        write_matched_catalog(qualified_method_filename,
+                              [gal_matched_tables[method], star_matched_tables[method], unmatched_table])
 
-        # Write out the HDU list to a file
-        logger.info(
-            f"Writing output matched catalog for method {method.value} to {os.path.join(workdir, method_filename)}")
-        hdulist.writeto(os.path.join(workdir, method_filename), overwrite=True)
+    return matched_catalog_product
 
-    # Write the data product
-    file_io.write_xml_product(matched_catalog_product,
-                              args.matched_catalog,
-                              workdir=workdir,
-                              log_info=True)
+
+def plan_tiles(shear_tables: Dict[ShearEstimationMethods, Table],
+               ra_range: Sequence[float],
+               dec_range: Sequence[float],
+               max_objects_per_tile: Optional[int] = None) -> TilePlan:
+    """ Plans the tiles to match within, either as a regular grid of tiles no larger than `max_coverage`, or if
+        `max_objects_per_tile` is provided, balanced by the number of objects in each tile.
+    """
+
+    if max_objects_per_tile is None:
+        ra_limits = np.linspace(ra_range[0], ra_range[1], num=int(
+            (ra_range[1] - ra_range[0]) / max_coverage) + 2, endpoint=True)
+        dec_limits = np.linspace(dec_range[0], dec_range[1], num=int(
+            (dec_range[1] - dec_range[0]) / max_coverage) + 2, endpoint=True)
+        return TilePlan.from_grid(ra_limits, dec_limits)
+
+    l_ra, l_dec = get_object_positions(shear_tables)
+    return plan_balanced_tiles(l_ra, l_dec,
+                               ra_range=ra_range,
+                               dec_range=dec_range,
+                               max_coverage=max_coverage,
+                               max_objects_per_tile=max_objects_per_tile)
+
+
+def get_l_d_tile_args(tile_plan: TilePlan,
+                      d_tile_star_catalogs: Dict[int, Table],
+                      d_tile_galaxy_catalogs: Dict[int, Table]) -> List[Dict[str, Any]]:
+    """ Gets the arguments specific to each tile for match_tiles, taking the TU sources in each tile out of the
+        provided dicts as we go, so they aren't kept alive by them.
+    """
+
+    l_d_tile_args: List[Dict[str, Any]] = []
+    for tile_i, (local_ra_range, local_dec_range) in enumerate(tile_plan.l_tile_ranges):
+        l_d_tile_args.append({"local_ra_range": local_ra_range,
+                              "local_dec_range": local_dec_range,
+                              "overlapping_star_catalog": d_tile_star_catalogs.pop(tile_i),
+                              "overlapping_galaxy_catalog": d_tile_galaxy_catalogs.pop(tile_i)})
+
+    return l_d_tile_args
+
+
+def write_matched_catalog(qualified_filename: str,
+                          l_tables: Sequence[Union[Table, BinTableStream]]) -> None:
+    """ Writes out a matched catalog file, with an HDU for each table in turn. Tables may be provided as streams, in
+        which case their data is written out from the file they were streamed to, without reading it into memory.
+    """
+
+    l_hdus: List[fits.hdu.base.ExtensionHDU] = [t.to_hdu() if isinstance(t, BinTableStream) else table_to_hdu(t)
+                                                for t in l_tables]
+    fits.HDUList([fits.PrimaryHDU(), *l_hdus]).writeto(qualified_filename, overwrite=True)
+
+
+def match_tiles(l_d_tile_args: Sequence[Dict[str, Any]],
+                d_shared_args: Dict[str, Any],
+                gal_matched_tables: Dict[ShearEstimationMethods, BinTableStream],
+                star_matched_tables: Dict[ShearEstimationMethods, BinTableStream],
+                num_processes: int = 1,
+                prepare_gal_matched_table: Optional[Callable[[Table], None]] = None) -> None:
+    """ Performs the match within each tile, calling match_within_coord_range with the arguments in `d_shared_args`
+        and the arguments for each tile in `l_d_tile_args`. If `num_processes` is greater than 1, tiles will be
+        matched in parallel by a pool of worker processes. Either way, the matched tables for each tile are appended to
+        `gal_matched_tables` and `star_matched_tables` as soon as that tile is done, in the order of `l_d_tile_args`,
+        so the output doesn't depend on the number of processes used.
+
+        If `prepare_gal_matched_table` is provided, it will be called on each tile's galaxy matched table for each
+        method which has any rows before it's appended, to add any further columns to it. For methods with no rows
+        in any tile, it will instead be called on a table with no rows once all tiles are done, so that the output
+        still has these columns.
+    """
+
+    num_tiles = len(l_d_tile_args)
+
+    # The first galaxy matched table with no rows for each method, to prepare if no tile has any rows for it
+    d_empty_gal_matched_tables: Dict[ShearEstimationMethods, Table] = {}
+
+    if num_processes <= 1:
+        for tile_i, d_tile_args in enumerate(l_d_tile_args):
+            _log_tile(tile_i, num_tiles, d_tile_args)
+            _append_tile_tables(*_match_tile(d_shared_args, d_tile_args),
+                                gal_matched_tables=gal_matched_tables,
+                                star_matched_tables=star_matched_tables,
+                                prepare_gal_matched_table=prepare_gal_matched_table,
+                                d_empty_gal_matched_tables=d_empty_gal_matched_tables)
+    else:
+        _match_tiles_in_pool(l_d_tile_args=l_d_tile_args,
+                             d_shared_args=d_shared_args,
+                             gal_matched_tables=gal_matched_tables,
+                             star_matched_tables=star_matched_tables,
+                             num_processes=num_processes,
+                             prepare_gal_matched_table=prepare_gal_matched_table,
+                             d_empty_gal_matched_tables=d_empty_gal_matched_tables)
+
+    if prepare_gal_matched_table is None:
+        return
+
+    # Tables with rows have had columns added to them as they were appended, so only the columns of the streams with
+    # no rows still need to have them added. This is done by appending a prepared table with no rows to each, whose
+    # columns are merged with the others', as they would be if the tables for all tiles were stacked and prepared
+    for method, empty_gal_matched_table in d_empty_gal_matched_tables.items():
+        if len(gal_matched_tables[method]) == 0:
+            empty_gal_matched_table.meta.clear()
+            prepare_gal_matched_table(empty_gal_matched_table)
+            gal_matched_tables[method].append(empty_gal_matched_table)
+
+
+def _match_tiles_in_pool(l_d_tile_args: Sequence[Dict[str, Any]],
+                         d_shared_args: Dict[str, Any],
+                         gal_matched_tables: Dict[ShearEstimationMethods, BinTableStream],
+                         star_matched_tables: Dict[ShearEstimationMethods, BinTableStream],
+                         num_processes: int,
+                         prepare_gal_matched_table: Optional[Callable[[Table], None]],
+                         d_empty_gal_matched_tables: Dict[ShearEstimationMethods, Table]) -> None:
+    """ Performs the match within each tile in parallel with a pool of worker processes, appending the matched tables
+        for each tile in the order of `l_d_tile_args`.
+    """
+
+    num_tiles = len(l_d_tile_args)
+
+    logger.info(f"Matching {num_tiles} tiles using {num_processes} processes.")
+
+    # Keep only a limited number of tiles in flight at once, so that the arguments for all tiles aren't sent up front
+    # and the results of tiles which finish early don't pile up while waiting for earlier tiles
+    max_tiles_in_flight = 2 * num_processes
+
+    with ProcessPoolExecutor(max_workers=num_processes,
+                             initializer=_init_tile_worker,
+                             initargs=(d_shared_args,)) as executor:
+
+        q_futures: Deque[Future] = deque()
+        next_tile_i = 0
+
+        # Collect the results in the order the tiles were submitted, regardless of the order they finish in
+        for tile_i, d_tile_args in enumerate(l_d_tile_args):
+
+            while next_tile_i < num_tiles and len(q_futures) < max_tiles_in_flight:
+                q_futures.append(executor.submit(_match_tile_in_worker, l_d_tile_args[next_tile_i]))
+                next_tile_i += 1
+
+            _log_tile(tile_i, num_tiles, d_tile_args)
+            _append_tile_tables(*q_futures.popleft().result(),
+                                gal_matched_tables=gal_matched_tables,
+                                star_matched_tables=star_matched_tables,
+                                prepare_gal_matched_table=prepare_gal_matched_table,
+                                d_empty_gal_matched_tables=d_empty_gal_matched_tables)
+
+
+def _log_tile(tile_i: int, num_tiles: int, d_tile_args: Dict[str, Any]) -> None:
+    """ Logs info on the tile being processed.
+    """
+    logger.info(f"Processing batch {tile_i + 1} of {num_tiles}")
+    logger.info("Processing ra range: " + str(d_tile_args["local_ra_range"]))
+    logger.info("      and dec range: " + str(d_tile_args["local_dec_range"]))
+
+
+def _append_tile_tables(tile_gal_matched_tables: Dict[ShearEstimationMethods, TableBuffer],
+                        tile_star_matched_tables: Dict[ShearEstimationMethods, TableBuffer],
+                        gal_matched_tables: Dict[ShearEstimationMethods, BinTableStream],
+                        star_matched_tables: Dict[ShearEstimationMethods, BinTableStream],
+                        prepare_gal_matched_table: Optional[Callable[[Table], None]] = None,
+                        d_empty_gal_matched_tables: Optional[Dict[ShearEstimationMethods, Table]] = None) -> None:
+    """ Appends the matched tables for a single tile to the streams of matched tables for each method. Galaxy tables
+        with no rows are appended without being prepared, so that the columns added by preparing come after all
+        others, as they would if the tables for all tiles were stacked and then prepared. The first of these for each
+        method is recorded in `d_empty_gal_matched_tables`, if provided, to be prepared if no tile has any rows.
+    """
+
+    for method in ShearEstimationMethods:
+
+        if tile_gal_matched_tables[method].num_tables > 0:
+            tile_gal_matched_table = tile_gal_matched_tables[method].to_table()
+            if len(tile_gal_matched_table) == 0:
+                if d_empty_gal_matched_tables is not None:
+                    d_empty_gal_matched_tables.setdefault(method, tile_gal_matched_table.copy())
+            elif prepare_gal_matched_table is not None:
+                prepare_gal_matched_table(tile_gal_matched_table)
+            gal_matched_tables[method].append(tile_gal_matched_table)
+
+        if tile_star_matched_tables[method].num_tables > 0:
+            star_matched_tables[method].append(tile_star_matched_tables[method].to_table())
+
+
+def _init_tile_worker(d_shared_args: Dict[str, Any]) -> None:
+    """ Initializer for worker processes, which stores the arguments shared by all tiles, so they only need to be
+        sent to each worker once.
+    """
+    _d_worker_shared_args.clear()
+    _d_worker_shared_args.update(d_shared_args)
+
+
+def _match_tile(d_shared_args: Dict[str, Any],
+                d_tile_args: Dict[str, Any]) -> Tuple[Dict[ShearEstimationMethods, TableBuffer],
+                                                      Dict[ShearEstimationMethods, TableBuffer]]:
+    """ Performs the match within a single tile, returning the galaxy and star matched tables for each method.
+    """
+
+    gal_matched_tables: Dict[ShearEstimationMethods, TableBuffer] = {method: TableBuffer()
+                                                                     for method in ShearEstimationMethods}
+    star_matched_tables: Dict[ShearEstimationMethods, TableBuffer] = {method: TableBuffer()
+                                                                      for method in ShearEstimationMethods}
+
+    match_within_coord_range(gal_matched_tables=gal_matched_tables,
+                             star_matched_tables=star_matched_tables,
+                             **d_shared_args,
+                             **d_tile_args)
+
+    return gal_matched_tables, star_matched_tables
+
+
+def _match_tile_in_worker(d_tile_args: Dict[str, Any]) -> Tuple[Dict[ShearEstimationMethods, TableBuffer],
+                                                                Dict[ShearEstimationMethods, TableBuffer]]:
+    """ Performs the match within a single tile in a worker process, using the shared arguments stored when it was
+        initialized.
+    """
+    return _match_tile(_d_worker_shared_args, d_tile_args)
+
+
+def get_object_positions(shear_tables: Dict[ShearEstimationMethods, Table]) -> Tuple[np.ndarray, np.ndarray]:
+    """ Gets the (RA, Dec) of all objects with valid positions in the shear tables for all methods, with objects
+        measured by multiple methods included once for each, as each will need to be matched separately.
+    """
+
+    l_l_ra: List[np.ndarray] = []
+    l_l_dec: List[np.ndarray] = []
+    for method in ShearEstimationMethods:
+
+        shear_table = shear_tables[method]
+        if shear_table is None:
+            continue
+
+        sem_tf = D_SHEAR_ESTIMATION_METHOD_TUM_TABLE_FORMATS[method]
+
+        good_rows = ~np.logical_or(is_nan_or_masked(shear_table[sem_tf.ra]),
+                                   is_nan_or_masked(shear_table[sem_tf.dec]))
+
+        l_l_ra.append(np.asarray(shear_table[sem_tf.ra][good_rows], dtype=float))
+        l_l_dec.append(np.asarray(shear_table[sem_tf.dec][good_rows], dtype=float))
+
+    if len(l_l_ra) == 0:
+        return np.array([], dtype=float), np.array([], dtype=float)
+
+    return np.concatenate(l_l_ra), np.concatenate(l_l_dec)
 
 
 def determine_coord_range(shear_tables: Dict[ShearEstimationMethods, Table],
@@ -330,75 +819,63 @@ def get_catalog_filenames(args: Namespace, search_path: str) -> Tuple[List[str],
 
 
 def match_within_coord_range(shear_tables: Dict[ShearEstimationMethods, Table],
-                             gal_matched_tables: Dict[ShearEstimationMethods, List[Table]],
-                             star_matched_tables: Dict[ShearEstimationMethods, List[Table]],
+                             gal_matched_tables: Dict[ShearEstimationMethods, TableBuffer],
+                             star_matched_tables: Dict[ShearEstimationMethods, TableBuffer],
                              galaxy_catalog_filenames: Sequence[str],
                              star_catalog_filenames: Sequence[str],
                              local_ra_range: np.ndarray,
                              local_dec_range: np.ndarray,
                              match_threshold: float,
-                             search_path: str) -> None:
+                             search_path: str,
+                             overlapping_star_catalog: Optional[Table] = None,
+                             overlapping_galaxy_catalog: Optional[Table] = None,
+                             union_positions: Optional["UnionPositions"] = None) -> None:
     """ Performs a catalog match to galaxy and star catalogs within a limited range of ra/dec coordinates.
+
+        If the TU sources within this range have already been selected (e.g. through bucket_true_universe_sources),
+        they can be passed through the `overlapping_star_catalog` and `overlapping_galaxy_catalog` arguments, in which
+        case the catalog files will not be read here.
+
+        If `union_positions` is provided, the union of objects across all methods will be matched once, and the
+        results used for each method, rather than matching each method's table separately.
     """
-    # Read in the star and galaxy catalogs from the overlapping area
-    overlapping_star_catalog = select_true_universe_sources(catalog_filenames=star_catalog_filenames,
-                                                            ra_range=local_ra_range,
-                                                            dec_range=local_dec_range,
-                                                            path=search_path)
+    # Read in the star and galaxy catalogs from the overlapping area, if not already provided
+    if overlapping_star_catalog is None:
+        overlapping_star_catalog = select_true_universe_sources(catalog_filenames=star_catalog_filenames,
+                                                                ra_range=local_ra_range,
+                                                                dec_range=local_dec_range,
+                                                                path=search_path,
+                                                                excluded_columns=L_UNUSED_TU_STAR_COLUMNS)
     logger.info("Found " + str(len(overlapping_star_catalog)) + " stars in overlapping region.")
 
-    overlapping_galaxy_catalog = select_true_universe_sources(catalog_filenames=galaxy_catalog_filenames,
-                                                              ra_range=local_ra_range,
-                                                              dec_range=local_dec_range,
-                                                              path=search_path)
+    if overlapping_galaxy_catalog is None:
+        overlapping_galaxy_catalog = select_true_universe_sources(catalog_filenames=galaxy_catalog_filenames,
+                                                                  ra_range=local_ra_range,
+                                                                  dec_range=local_dec_range,
+                                                                  path=search_path,
+                                                                  excluded_columns=L_UNUSED_TU_GALAXY_COLUMNS)
     logger.info("Found " + str(len(overlapping_galaxy_catalog)) + " galaxies in overlapping region.")
 
-    # Remove unused columns in the star table
-    overlapping_star_catalog.remove_columns(['DIST', 'TU_MAG_H_2MASS', 'SED_TEMPLATE',
-                                             'AV', 'TU_FNU_VIS', 'TU_FNU_Y_NISP', 'TU_FNU_J_NISP',
-                                             'TU_FNU_H_NISP', 'TU_FNU_G_DECAM', 'TU_FNU_R_DECAM',
-                                             'TU_FNU_I_DECAM', 'TU_FNU_Z_DECAM', 'TU_FNU_U_MEGACAM',
-                                             'TU_FNU_R_MEGACAM', 'TU_FNU_G_JPCAM', 'TU_FNU_I_PANSTARRS',
-                                             'TU_FNU_Z_PANSTARRS', 'TU_FNU_Z_HSC', 'TU_FNU_G_GAIA',
-                                             'TU_FNU_BP_GAIA', 'TU_FNU_RP_GAIA', 'TU_FNU_U_LSST',
-                                             'TU_FNU_G_LSST', 'TU_FNU_R_LSST', 'TU_FNU_I_LSST',
-                                             'TU_FNU_Z_LSST', 'TU_FNU_Y_LSST', 'TU_FNU_U_KIDS',
-                                             'TU_FNU_G_KIDS', 'TU_FNU_R_KIDS', 'TU_FNU_I_KIDS',
-                                             'TU_FNU_J_2MASS', 'TU_FNU_H_2MASS', 'TU_FNU_KS_2MASS',
-                                             'GAIA_RA', 'GAIA_RA_ERROR', 'GAIA_DEC', 'GAIA_DEC_ERROR',
-                                             'GAIA_PHOT_G_MEAN_FLUX', 'GAIA_PHOT_G_MEAN_FLUX_ERROR',
-                                             'GAIA_PHOT_BP_MEAN_FLUX', 'GAIA_PHOT_BP_MEAN_FLUX_ERROR',
-                                             'GAIA_PHOT_RP_MEAN_FLUX', 'GAIA_PHOT_RP_MEAN_FLUX_ERROR'])
-
-    # Remove unused columns in the galaxy table
-    overlapping_galaxy_catalog.remove_columns(['SOURCE_ID', 'HALO_ID', 'RA', 'DEC',
-                                               'EXT_LAW', 'EBV', 'HALPHA_LOGFLAM_EXT_MAG',
-                                               'HBETA_LOGFLAM_EXT_MAG', 'O2_LOGFLAM_EXT_MAG',
-                                               'O3_LOGFLAM_EXT_MAG', 'N2_LOGFLAM_EXT_MAG',
-                                               'S2_LOGFLAM_EXT_MAG', 'AV', 'TU_FNU_VIS_MAG',
-                                               'TU_FNU_Y_NISP_MAG', 'TU_FNU_J_NISP_MAG', 'TU_FNU_H_NISP_MAG',
-                                               'TU_FNU_G_DECAM_MAG', 'TU_FNU_R_DECAM_MAG',
-                                               'TU_FNU_I_DECAM_MAG', 'TU_FNU_Z_DECAM_MAG',
-                                               'TU_FNU_U_MEGACAM_MAG', 'TU_FNU_R_MEGACAM_MAG',
-                                               'TU_FNU_G_JPCAM_MAG', 'TU_FNU_I_PANSTARRS_MAG',
-                                               'TU_FNU_Z_PANSTARRS_MAG', 'TU_FNU_Z_HSC_MAG',
-                                               'TU_FNU_G_GAIA_MAG', 'TU_FNU_BP_GAIA_MAG', 'TU_FNU_RP_GAIA_MAG',
-                                               'TU_FNU_U_LSST_MAG', 'TU_FNU_G_LSST_MAG', 'TU_FNU_R_LSST_MAG',
-                                               'TU_FNU_I_LSST_MAG', 'TU_FNU_Z_LSST_MAG', 'TU_FNU_Y_LSST_MAG',
-                                               'TU_FNU_U_KIDS_MAG', 'TU_FNU_G_KIDS_MAG', 'TU_FNU_R_KIDS_MAG',
-                                               'TU_FNU_I_KIDS_MAG', 'TU_FNU_J_2MASS_MAG',
-                                               'TU_FNU_H_2MASS_MAG', 'TU_FNU_KS_2MASS_MAG'])
-
     # Set up star and galaxy tables for matching
     ra_star = overlapping_star_catalog["RA"]
     dec_star = overlapping_star_catalog["DEC"]
-    sky_coord_star = SkyCoord(ra=ra_star, dec=dec_star)
-    overlapping_star_catalog.add_column(Column(np.arange(len(ra_star)), name=tum_tf.tu_star_index))
+    star_kdtree = SkyKDTree(ra=ra_star, dec=dec_star)
 
     ra_gal = overlapping_galaxy_catalog[tum_tf.tu_ra]
     dec_gal = overlapping_galaxy_catalog[tum_tf.tu_dec]
-    sky_coord_gal = SkyCoord(ra=ra_gal, dec=dec_gal)
-    overlapping_galaxy_catalog.add_column(Column(np.arange(len(ra_gal)), name=tum_tf.tu_gal_index))
+    gal_kdtree = SkyKDTree(ra=ra_gal, dec=dec_gal)
+
+    # If desired, match the union of objects across all methods once here
+    union_best_ids: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    if union_positions is not None:
+        union_best_ids = find_filtered_best_matches(se_kdtree=union_positions.kdtree,
+                                                    ra=union_positions.ra,
+                                                    dec=union_positions.dec,
+                                                    gal_kdtree=gal_kdtree,
+                                                    star_kdtree=star_kdtree,
+                                                    local_ra_range=local_ra_range,
+                                                    local_dec_range=local_dec_range,
+                                                    match_threshold=match_threshold)
 
     # Perform match to SIM's tables for each method
     for method in ShearEstimationMethods:
@@ -406,27 +883,34 @@ def match_within_coord_range(shear_tables: Dict[ShearEstimationMethods, Table],
                                         shear_tables=shear_tables,
                                         gal_matched_tables=gal_matched_tables,
                                         star_matched_tables=star_matched_tables,
-                                        sky_coord_gal=sky_coord_gal,
-                                        sky_coord_star=sky_coord_star,
+                                        gal_kdtree=gal_kdtree,
+                                        star_kdtree=star_kdtree,
                                         local_ra_range=local_ra_range,
                                         local_dec_range=local_dec_range,
                                         overlapping_galaxy_catalog=overlapping_galaxy_catalog,
                                         overlapping_star_catalog=overlapping_star_catalog,
-                                        match_threshold=match_threshold)
+                                        match_threshold=match_threshold,
+                                        union_positions=union_positions,
+                                        union_best_ids=union_best_ids)
 
 
 def match_for_method_in_coord_range(method: ShearEstimationMethods,
                                     shear_tables: Dict[ShearEstimationMethods, Table],
-                                    gal_matched_tables: Dict[ShearEstimationMethods, List[Table]],
-                                    star_matched_tables: Dict[ShearEstimationMethods, List[Table]],
-                                    sky_coord_gal,
-                                    sky_coord_star,
+                                    gal_matched_tables: Dict[ShearEstimationMethods, TableBuffer],
+                                    star_matched_tables: Dict[ShearEstimationMethods, TableBuffer],
+                                    gal_kdtree: "SkyKDTree",
+                                    star_kdtree: "SkyKDTree",
                                     local_ra_range: np.ndarray,
                                     local_dec_range: np.ndarray,
                                     overlapping_galaxy_catalog: Table,
                                     overlapping_star_catalog: Table,
-                                    match_threshold: float):
+                                    match_threshold: float,
+                                    union_positions: Optional["UnionPositions"] = None,
+                                    union_best_ids: Optional[Tuple[np.ndarray, np.ndarray]] = None):
     """ Matches the shear estimation table for a given method to the TU galaxy and star tables.
+
+        If `union_positions` and `union_best_ids` are provided, the best matches to stars and galaxies for each object
+        will be taken from these rather than calculated for this method's table.
     """
     unpruned_shear_table = shear_tables[method]
     if unpruned_shear_table is None:
@@ -444,25 +928,104 @@ def match_for_method_in_coord_range(method: ShearEstimationMethods,
         logger.info(f"No valid rows in catalog for method {method.value}.")
         return
 
-    sky_coord_se = SkyCoord(ra=shear_table[sem_tf.ra], dec=shear_table[sem_tf.dec])
+    if union_positions is None or union_best_ids is None:
+        se_kdtree = SkyKDTree(ra=shear_table[sem_tf.ra], dec=shear_table[sem_tf.dec])
+        best_star_id, best_gal_id = find_filtered_best_matches(se_kdtree=se_kdtree,
+                                                               ra=shear_table[sem_tf.ra],
+                                                               dec=shear_table[sem_tf.dec],
+                                                               gal_kdtree=gal_kdtree,
+                                                               star_kdtree=star_kdtree,
+                                                               local_ra_range=local_ra_range,
+                                                               local_dec_range=local_dec_range,
+                                                               match_threshold=match_threshold)
+    else:
+        # Scatter the matches for the union of objects back to the rows of this table
+        l_union_index = union_positions.get_indices(shear_table[sem_tf.ID])
+        best_star_id = union_best_ids[0][l_union_index]
+        best_gal_id = union_best_ids[1][l_union_index]
+
+    # Match to the star and galaxy tables
+    if len(star_kdtree) > 0:
+        star_matched_table = get_matched_table(shear_table, overlapping_star_catalog, best_star_id)
+        logger.info("Matched " + str(len(star_matched_table)) + " objects to stars.")
+    else:
+        star_matched_table = shear_table[False * np.ones(len(shear_table), dtype=bool)]
+
+    if len(gal_kdtree) > 0:
+        gal_matched_table = get_matched_table(shear_table, overlapping_galaxy_catalog, best_gal_id)
+        logger.info("Matched " + str(len(gal_matched_table)) + " objects to galaxies.")
+    else:
+        gal_matched_table = shear_table[False * np.ones(len(shear_table), dtype=bool)]
+
+    # Add extra useful columns to the galaxy-matched table for analysis, if we matched any galaxies
+    if len(gal_matched_table) > 0:
+        add_galaxy_analysis_columns(gal_matched_table=gal_matched_table,
+                                    sem_tf=sem_tf)
+
+    # Add these tables to the buffers of tables. Since their data is copied into the buffers, this must be done
+    # after all columns have been added to them
+    star_matched_tables[method].append(star_matched_table)
+    gal_matched_tables[method].append(gal_matched_table)
+
+
+def get_matched_table(shear_table: Table,
+                      tu_catalog: Table,
+                      best_tu_id: np.ndarray) -> Table:
+    """ Assembles a table of the objects in the shear estimates table which were matched to sources in the TU
+        catalog, with the columns of both, by gathering the rows of each which correspond to each match. This gives
+        the same result as an inner join of the tables on the index of the matched TU source: rows are sorted by this
+        index, and columns with the same name in both tables are suffixed with "_1" and "_2" respectively.
+    """
+
+    # Get the rows of each table for each match, sorted by the index of the matched TU source
+    l_se_rows = np.flatnonzero(best_tu_id >= 0)
+    l_se_rows = l_se_rows[np.argsort(best_tu_id[l_se_rows], kind="stable")]
+    l_tu_rows = best_tu_id[l_se_rows]
+
+    s_conflicting_colnames = set(shear_table.colnames) & set(tu_catalog.colnames)
+
+    matched_table = Table(meta=deepcopy(shear_table.meta))
+    matched_table.meta.update(deepcopy(tu_catalog.meta))
+
+    for t, l_rows, suffix in ((shear_table, l_se_rows, "_1"),
+                              (tu_catalog, l_tu_rows, "_2")):
+        for colname in t.colnames:
+            out_colname = colname + suffix if colname in s_conflicting_colnames else colname
+            matched_table.add_column(t[colname][l_rows], name=out_colname, copy=False)
+
+    return matched_table
+
+
+def find_filtered_best_matches(se_kdtree: "SkyKDTree",
+                               ra: Sequence[float],
+                               dec: Sequence[float],
+                               gal_kdtree: "SkyKDTree",
+                               star_kdtree: "SkyKDTree",
+                               local_ra_range: np.ndarray,
+                               local_dec_range: np.ndarray,
+                               match_threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """ Finds the best match to a star and to a galaxy for each of a set of object positions, masking with -99 where
+        the match isn't close enough, is to the other type of object, or the object is outside the range being
+        matched within.
+
+        Returns arrays of the index of the best-matching star and galaxy for each object.
+    """
 
     (best_obj_id_from_star,
      best_star_distance,
-     best_star_id) = find_best_match(sky_coord_se, sky_coord_star)
+     best_star_id) = find_best_match_kdtree(se_kdtree, star_kdtree, match_threshold)
 
     (best_obj_id_from_gal,
      best_gal_distance,
-     best_gal_id) = find_best_match(sky_coord_se, sky_coord_gal)
+     best_gal_id) = find_best_match_kdtree(se_kdtree, gal_kdtree, match_threshold)
 
     # Check that the overall best distance is less than the threshold
     best_distance = np.where(best_gal_distance <= best_star_distance,
                              best_gal_distance, best_star_distance)
 
     # Mask rows where the match isn't close enough, or to the other type of object, with -99
-    in_ra_range = np.logical_and(
-        shear_table[sem_tf.ra] >= local_ra_range[0], shear_table[sem_tf.ra] < local_ra_range[1])
-    in_dec_range = np.logical_and(
-        shear_table[sem_tf.dec] >= local_dec_range[0], shear_table[sem_tf.dec] < local_dec_range[1])
+    in_ra_range = np.logical_and(ra >= local_ra_range[0], ra < local_ra_range[1])
+    in_dec_range = np.logical_and(dec >= local_dec_range[0], dec < local_dec_range[1])
     in_range = np.logical_and(in_ra_range, in_dec_range)
 
     # Mask out with -99 if the distance is outside the threshold or it better matches to the
@@ -485,73 +1048,208 @@ def match_for_method_in_coord_range(method: ShearEstimationMethods,
                                           match_threshold=match_threshold,
                                           prioritize=True)
 
-    # Add columns to the shear estimates table so we can match to it
-    if tum_tf.tu_star_index in shear_table.colnames and len(best_star_id) > 0:
-        shear_table[tum_tf.tu_star_index] = best_star_id
-    else:
-        shear_table.add_column(Column(best_star_id, name=tum_tf.tu_star_index))
+    return best_star_id, best_gal_id
 
-    if tum_tf.tu_gal_index in shear_table.colnames and len(best_gal_id) > 0:
-        shear_table[tum_tf.tu_gal_index] = best_gal_id
-    else:
-        shear_table.add_column(Column(best_gal_id, name=tum_tf.tu_gal_index))
 
-    # Match to the star and galaxy tables
-    if len(sky_coord_star) > 0:
-        star_matched_table = join(shear_table, overlapping_star_catalog, keys=tum_tf.tu_star_index)
-        logger.info("Matched " + str(len(star_matched_table)) + " objects to stars.")
-    else:
-        star_matched_table = shear_table[False * np.ones(len(shear_table), dtype=bool)]
+def find_best_match(sky_coord_se: SkyCoord,
+                    sky_coord_tu: SkyCoord):
+    """ Finds the best match for each object in a catalog
+    """
+    if len(sky_coord_tu) > 0:
+
+        # Match to tu table
+        best_tu_id, best_tu_distance, _ = sky_coord_se.match_to_catalog_sky(sky_coord_tu)
+
+        # Perform the reverse match as well, and only use a symmetric best-match table
+        best_obj_id_from_tu, _, _ = sky_coord_tu.match_to_catalog_sky(
+            sky_coord_se)
 
-    if len(sky_coord_gal) > 0:
-        gal_matched_table = join(shear_table, overlapping_galaxy_catalog, keys=tum_tf.tu_gal_index)
-        logger.info("Matched " + str(len(gal_matched_table)) + " objects to galaxies.")
     else:
-        gal_matched_table = shear_table[False * np.ones(len(shear_table), dtype=bool)]
+        best_tu_id, best_tu_distance = [], []
+        best_obj_id_from_tu, _ = [], []
 
-    # Remove matched rows from the shear table
-    matched_rows = np.logical_or(best_star_id > 0, best_gal_id > 0)
-    matched_indices = (matched_rows * np.arange(len(matched_rows)))[matched_rows]
-    shear_table.remove_rows(matched_indices)
+    return np.array(best_obj_id_from_tu), np.array(best_tu_distance), np.array(best_tu_id)
 
-    # Remove extra columns we no longer need
-    star_matched_table.remove_columns([tum_tf.tu_star_index, tum_tf.tu_gal_index])
-    gal_matched_table.remove_columns([tum_tf.tu_star_index, tum_tf.tu_gal_index])
 
-    # Add these tables to the dictionaries of tables
-    star_matched_tables[method].append(star_matched_table)
-    gal_matched_tables[method].append(gal_matched_table)
+class SkyKDTree:
+    """ KD-tree of a set of sky positions, built on their unit vectors so that it can be reused for repeated
+        nearest-neighbour queries against the same positions.
 
-    # Skip to next batch if we didn't match any galaxies
-    if len(gal_matched_table) == 0:
-        return
+        Parameters
+        ----------
+        ra : Sequence[float]
+            Right ascension of each position, in degrees
+        dec : Sequence[float]
+            Declination of each position, in degrees
+    """
 
-    # Add extra useful columns to the galaxy-matched table for analysis
+    xyz: np.ndarray
+    tree: Optional[cKDTree] = None
 
-    add_galaxy_analysis_columns(gal_matched_table=gal_matched_table,
-                                sem_tf=sem_tf)
+    def __init__(self,
+                 ra: Sequence[float],
+                 dec: Sequence[float]):
 
+        self.xyz = get_unit_vectors(ra, dec)
 
-def find_best_match(sky_coord_se,
-                    sky_coord_tu):
-    """ Finds the best match for each object in a catalog
+        # cKDTree can't be built on zero points, so we leave the tree as None in that case
+        if len(self.xyz) > 0:
+            self.tree = cKDTree(self.xyz, balanced_tree=False, compact_nodes=False)
+
+    def __len__(self) -> int:
+        return len(self.xyz)
+
+    def query(self,
+              xyz: np.ndarray,
+              max_distance: float) -> Tuple[np.ndarray, np.ndarray]:
+        """ Finds the nearest position in this tree to each of the provided unit vectors, only considering positions
+            within the maximum distance (in degrees).
+
+            Returns arrays of the index of the nearest position and the angular distance to it (in degrees). Where
+            no position is found within the maximum distance, the index will be len(self) and the distance will be
+            inf.
+        """
+
+        # Convert the maximum angular distance to a maximum chord length between unit vectors. This is padded
+        # slightly so that a match exactly at the maximum distance isn't lost to rounding
+        max_chord = 2 * np.sin(np.deg2rad(min(max_distance, 180.)) / 2) * (1 + 1e-8)
+
+        chord, l_index = self.tree.query(xyz, k=1, distance_upper_bound=max_chord)
+
+        distance = np.rad2deg(2 * np.arcsin(np.minimum(chord, 2.) / 2))
+
+        return l_index, distance
+
+
+def get_unit_vectors(ra: Sequence[float],
+                     dec: Sequence[float]) -> np.ndarray:
+    """ Converts sky positions in degrees to an array of unit vectors, of shape (N, 3).
     """
-    if len(sky_coord_tu) > 0:
+    ra_rad = np.deg2rad(np.asarray(ra, dtype=float))
+    dec_rad = np.deg2rad(np.asarray(dec, dtype=float))
+
+    cos_dec = np.cos(dec_rad)
+
+    return np.stack((cos_dec * np.cos(ra_rad), cos_dec * np.sin(ra_rad), np.sin(dec_rad)), axis=-1)
+
+
+def find_best_match_kdtree(se_kdtree: SkyKDTree,
+                           tu_kdtree: SkyKDTree,
+                           match_threshold: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Finds the best match for each object in a catalog, using pre-built KD-trees for both catalogs. This gives
+        output which can be used in the same way as that of find_best_match, except that matches further than
+        match_threshold aren't searched for. For these, the distance will be inf and the ID will be out of bounds,
+        which get_filtered_best_match will mask out with -99 in the same way as for any other match outside the
+        threshold.
+    """
+
+    if len(tu_kdtree) > 0 and len(se_kdtree) > 0:
 
         # Match to tu table
-        best_tu_id, best_tu_distance, _ = sky_coord_se.match_to_catalog_sky(sky_coord_tu)
+        best_tu_id, best_tu_distance = tu_kdtree.query(se_kdtree.xyz, max_distance=match_threshold)
 
-        # Perform the reverse match as well, and only use a symmetric best-match table
-        best_obj_id_from_tu, _, _ = sky_coord_tu.match_to_catalog_sky(
-            sky_coord_se)
+        # Perform the reverse match as well, so we can check for a symmetric best-match
+        best_obj_id_from_tu, _ = se_kdtree.query(tu_kdtree.xyz, max_distance=match_threshold)
 
     else:
         best_tu_id, best_tu_distance = [], []
-        best_obj_id_from_tu, _ = [], []
+        best_obj_id_from_tu = []
 
     return np.array(best_obj_id_from_tu), np.array(best_tu_distance), np.array(best_tu_id)
 
 
+class UnionPositions:
+    """ Positions of the union of objects in the shear estimates tables for all methods, deduplicated by object ID,
+        so that they can be matched to the TU catalogs once for all methods. Where an object appears in the tables
+        for multiple methods, the position from the first method (in the order of ShearEstimationMethods) with a
+        valid position is used.
+
+        Matching the union gives each method's objects the same matches as matching each method's table separately
+        if all methods have the same objects at the same positions. Otherwise, the matches may differ:
+
+        * If an object's position differs between methods, it's matched at the position from the first method. The
+          number of such objects is stored in `num_objects_with_differing_positions`, and a warning is logged if there
+          are any.
+        * The check that each match is symmetric (that the object is also the best match to the TU source it's
+          matched to) is made against all objects in the union, so an object may lose a match to another object which
+          is closer to that TU source, even if that object isn't in its method's table.
+
+        Parameters
+        ----------
+        shear_tables : Dict[ShearEstimationMethods, Table]
+            The shear estimates table for each method (or None if not available for a method)
+    """
+
+    l_ids: np.ndarray
+    ra: np.ndarray
+    dec: np.ndarray
+    kdtree: SkyKDTree
+    num_objects_with_differing_positions: int
+
+    _id_index: IDIndex
+
+    def __init__(self, shear_tables: Dict[ShearEstimationMethods, Table]):
+
+        l_l_ids: List[np.ndarray] = []
+        l_l_ra: List[np.ndarray] = []
+        l_l_dec: List[np.ndarray] = []
+
+        for method in ShearEstimationMethods:
+
+            shear_table = shear_tables[method]
+            if shear_table is None:
+                continue
+
+            sem_tf = D_SHEAR_ESTIMATION_METHOD_TUM_TABLE_FORMATS[method]
+
+            good_rows = ~np.logical_or(is_nan_or_masked(shear_table[sem_tf.ra]),
+                                       is_nan_or_masked(shear_table[sem_tf.dec]))
+
+            l_l_ids.append(np.asarray(shear_table[sem_tf.ID])[good_rows])
+            l_l_ra.append(np.asarray(shear_table[sem_tf.ra], dtype=float)[good_rows])
+            l_l_dec.append(np.asarray(shear_table[sem_tf.dec], dtype=float)[good_rows])
+
+        if len(l_l_ids) == 0:
+            l_all_ids = np.array([], dtype=int)
+            l_all_ra = np.array([], dtype=float)
+            l_all_dec = np.array([], dtype=float)
+        else:
+            l_all_ids = np.concatenate(l_l_ids)
+            l_all_ra = np.concatenate(l_l_ra)
+            l_all_dec = np.concatenate(l_l_dec)
+
+        # np.unique gives the index of the first occurrence of each ID, with the IDs sorted so we can search them later
+        self.l_ids, l_first_index, l_union_index = np.unique(l_all_ids, return_index=True, return_inverse=True)
+        self.ra = l_all_ra[l_first_index]
+        self.dec = l_all_dec[l_first_index]
+
+        logger.info(f"Matching the union of {len(self.l_ids)} unique objects across {len(l_all_ids)} rows of "
+                    f"shear estimates tables.")
+
+        # Check for any objects whose positions differ between methods, which may be matched differently than if each
+        # method's table were matched separately
+        l_differs = np.logical_or(l_all_ra != self.ra[l_union_index], l_all_dec != self.dec[l_union_index])
+        self.num_objects_with_differing_positions = len(np.unique(l_union_index[l_differs]))
+
+        if self.num_objects_with_differing_positions > 0:
+            logger.warning(f"{self.num_objects_with_differing_positions} objects have different positions in the "
+                           f"shear estimates tables for different methods. These will be matched using the position "
+                           f"for the first method, so their matches may differ from those found when matching each "
+                           f"method's table separately.")
+
+        self.kdtree = SkyKDTree(ra=self.ra, dec=self.dec)
+        self._id_index = IDIndex(self.l_ids)
+
+    def __len__(self) -> int:
+        return len(self.l_ids)
+
+    def get_indices(self, l_ids: Sequence[int]) -> np.ndarray:
+        """ Gets the index in the union of each of the provided object IDs, raising a ValueError if any aren't present
+            in it.
+        """
+        return self._id_index.get_rows(l_ids)
+
+
 def get_filtered_best_match(best_tu_distance: np.ndarray,
                             best_distance: np.ndarray,
                             other_distance: np.ndarray,
@@ -0,0 +1,717 @@
+"""
+:file: python/SHE_Validation/table_utility.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Utility classes and functions for building up large tables with bounded memory usage, for aligning rows of tables by
+ID, and for reading only selected columns of tables from files
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import io
+import os
+import tempfile
+import weakref
+from copy import deepcopy
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from astropy.io import fits
+from astropy.io.fits import table_to_hdu
+from astropy.table import Column, MaskedColumn, Table, TableMergeError, vstack
+
+# Default number of rows to allocate space for in a TableBuffer when the first rows are appended to it
+DEFAULT_INITIAL_CAPACITY = 1024
+
+# Row index used by IDIndex.get_rows for IDs which aren't in the table, if they're allowed
+MISSING_ROW = -1
+
+# Maximum number of missing IDs to list in the error raised by IDIndex.get_rows
+MAX_REPORTED_MISSING_IDS = 10
+
+# Size in bytes of the blocks which FITS files are divided into
+FITS_BLOCK_SIZE = 2880
+
+# Number of rows at a time to convert when rewriting the rows already written by a BinTableStream with new columns
+BIN_TABLE_STREAM_CHUNK_SIZE = 100000
+
+
+class TableBuffer:
+    """ Buffer which tables can be appended to one at a time, storing the data of each column in a preallocated array
+        which grows geometrically as needed. This avoids holding both a list of the appended tables and their
+        combination in memory at the same time, as is needed with `vstack`.
+
+        The table output by `to_table` is the same as would be given by stacking all appended tables with `vstack`:
+        columns which are masked in any appended table, or which are missing from any appended table (including those
+        with no rows), are output as masked columns, with rows from tables missing the column masked.
+
+        Parameters
+        ----------
+        max_rows : Optional[int]
+            If provided, the maximum number of rows expected to be appended, which the capacity of the buffer will not
+            be grown past unless needed.
+        initial_capacity : int
+            The number of rows to allocate space for when the first rows are appended.
+    """
+
+    max_rows: Optional[int]
+    initial_capacity: int
+
+    num_tables: int
+    num_rows: int
+    capacity: int
+
+    l_colnames: List[str]
+    d_data: Dict[str, np.ndarray]
+    d_mask: Dict[str, np.ndarray]
+    d_column_info: Dict[str, Dict[str, Any]]
+    s_masked_colnames: Set[str]
+    meta: Dict[str, Any]
+
+    def __init__(self,
+                 max_rows: Optional[int] = None,
+                 initial_capacity: int = DEFAULT_INITIAL_CAPACITY):
+
+        self.max_rows = max_rows
+        self.initial_capacity = initial_capacity
+
+        self.num_tables = 0
+        self.num_rows = 0
+        self.capacity = 0
+
+        self.l_colnames = []
+        self.d_data = {}
+        self.d_mask = {}
+        self.d_column_info = {}
+        self.s_masked_colnames = set()
+        self.meta = {}
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def append(self, t: Table) -> None:
+        """ Appends the rows of a table to the buffer.
+        """
+
+        self.num_tables += 1
+        self.meta.update(deepcopy(t.meta))
+
+        # Any columns we have which this table doesn't will need to be masked
+        s_colnames = set(t.colnames)
+        for colname in self.l_colnames:
+            if colname not in s_colnames:
+                self.s_masked_colnames.add(colname)
+
+        for colname in t.colnames:
+            col = t[colname]
+            if colname not in self.d_data:
+                self._add_column(colname, col)
+            elif col.dtype != self.d_data[colname].dtype:
+                common_dtype = np.result_type(self.d_data[colname].dtype, col.dtype)
+                self.d_data[colname] = self.d_data[colname].astype(common_dtype)
+            if isinstance(col, MaskedColumn):
+                self.s_masked_colnames.add(colname)
+
+        num_new_rows = len(t)
+        if num_new_rows == 0:
+            return
+
+        self._reserve(self.num_rows + num_new_rows)
+
+        start = self.num_rows
+        end = start + num_new_rows
+
+        for colname in self.l_colnames:
+            if colname in s_colnames:
+                col = t[colname]
+                self.d_data[colname][start:end] = col
+                self.d_mask[colname][start:end] = col.mask if isinstance(col, MaskedColumn) else False
+            else:
+                self.d_mask[colname][start:end] = True
+
+        self.num_rows = end
+
+    def extend(self, other: "TableBuffer") -> None:
+        """ Appends the contents of another buffer to this one.
+        """
+        if other.num_tables == 0:
+            return
+        self.append(other.to_table())
+        self.num_tables += other.num_tables - 1
+
+    def to_table(self) -> Table:
+        """ Gets a table with the contents of the buffer. The buffer's arrays are trimmed to the number of rows in it
+            and used for the table's data without further copying, so the buffer shouldn't be used after calling this.
+        """
+
+        t = Table(meta=deepcopy(self.meta))
+
+        for colname in self.l_colnames:
+
+            # Trim each column in turn, so we only ever need extra memory for one column at a time
+            data = self.d_data.pop(colname)
+            mask = self.d_mask.pop(colname)
+            if len(data) > self.num_rows:
+                data = data[:self.num_rows].copy()
+                mask = mask[:self.num_rows].copy()
+
+            if colname in self.s_masked_colnames:
+                col = MaskedColumn(data, name=colname, mask=mask, copy=False, **self.d_column_info[colname])
+            else:
+                col = Column(data, name=colname, copy=False, **self.d_column_info[colname])
+
+            t.add_column(col, copy=False)
+
+        self.capacity = self.num_rows
+
+        return t
+
+    def _add_column(self, colname: str, col: Column) -> None:
+        """ Adds a new column to the buffer, masking it for all rows already in the buffer.
+        """
+
+        self.l_colnames.append(colname)
+        self.d_data[colname] = np.zeros((self.capacity,) + col.shape[1:], dtype=col.dtype)
+        self.d_mask[colname] = np.ones((self.capacity,) + col.shape[1:], dtype=bool)
+        self.d_column_info[colname] = {"unit": col.unit,
+                                       "description": col.description,
+                                       "format": col.format,
+                                       "meta": deepcopy(col.meta)}
+
+        if self.num_tables > 1:
+            self.s_masked_colnames.add(colname)
+
+    def _reserve(self, num_rows: int) -> None:
+        """ Grows the buffer if necessary so that it can hold at least the given number of rows.
+        """
+
+        if num_rows <= self.capacity:
+            return
+
+        new_capacity = max(num_rows, 2 * self.capacity, self.initial_capacity)
+        if self.max_rows is not None:
+            new_capacity = max(num_rows, min(new_capacity, self.max_rows))
+
+        for colname in self.l_colnames:
+            for d_arrays in (self.d_data, self.d_mask):
+                old_array = d_arrays[colname]
+                new_array = np.zeros((new_capacity,) + old_array.shape[1:], dtype=old_array.dtype)
+                new_array[:self.num_rows] = old_array[:self.num_rows]
+                d_arrays[colname] = new_array
+
+        self.capacity = new_capacity
+
+
+class BinTableStream:
+    """ Stream which tables can be appended to one at a time, writing their rows straight to a temporary file in the
+        layout of a FITS binary table, so that only one table needs to be held in memory at a time. Once all tables
+        have been appended, `to_hdu` gets a binary table HDU of all their rows, with the data memory-mapped from the
+        file, which can then be written out as part of an HDUList. The file is deleted when the stream is closed.
+
+        The HDU is the same as would be given by `table_to_hdu` for all appended tables stacked with `vstack`,
+        including those with no rows. The columns are promoted as each table is appended in the same way as by
+        `vstack`, and if this changes how they're stored, the rows already written are rewritten to a new file in
+        chunks. Where `vstack` would fail only because a column of a table with no rows has a type which conflicts
+        with that of tables with rows (such as the float64 type numpy gives an empty list of strings), that table's
+        type for the column is ignored instead. If the columns of tables with rows can't be stacked, the stream falls
+        back to appending all rows to a TableBuffer in memory.
+
+        Parameters
+        ----------
+        workdir : Optional[str]
+            The directory to write the temporary file to. If not provided, the system's default is used.
+    """
+
+    workdir: Optional[str]
+    qualified_filename: Optional[str]
+
+    num_tables: int
+    num_rows: int
+    meta: Dict[str, Any]
+
+    _t_columns: Optional[Table]
+    _header: Optional[fits.Header]
+    _header_offset: int
+    _fileobj: Optional[BinaryIO]
+    _table_buffer: Optional[TableBuffer]
+    _hdulist: Optional[fits.HDUList]
+    _hdu: Optional[fits.BinTableHDU]
+
+    def __init__(self, workdir: Optional[str] = None):
+
+        self.workdir = workdir
+        self.qualified_filename = None
+
+        self.num_tables = 0
+        self.num_rows = 0
+        self.meta = {}
+
+        self._t_columns = None
+        self._header = None
+        self._header_offset = 0
+        self._fileobj = None
+        self._table_buffer = None
+        self._hdulist = None
+        self._hdu = None
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def __enter__(self) -> "BinTableStream":
+        return self
+
+    def __exit__(self, *_args) -> None:
+        self.close()
+
+    def append(self, t: Table) -> None:
+        """ Appends the rows of a table to the stream, writing them to the file.
+        """
+
+        if self._hdu is not None:
+            raise ValueError("Tables can't be appended to a BinTableStream after its HDU has been created.")
+
+        self.num_tables += 1
+        self.meta.update(deepcopy(t.meta))
+
+        if self._table_buffer is None:
+            try:
+                self._write_rows(t)
+                self.num_rows += len(t)
+                return
+            except (TableMergeError, TypeError, ValueError):
+                self._fall_back_to_buffer()
+
+        self._table_buffer.append(t)
+        self.num_rows += len(t)
+
+    def to_hdu(self) -> fits.BinTableHDU:
+        """ Finishes writing the file, and gets a binary table HDU of all rows appended, with its data memory-mapped
+            from the file. The stream must not be closed while the HDU is still in use.
+        """
+
+        if self._hdu is not None:
+            return self._hdu
+
+        if self._t_columns is None:
+            raise ValueError("At least one table must be appended to a BinTableStream to get an HDU from it.")
+
+        if self._table_buffer is not None:
+            t = self._table_buffer.to_table()
+            t.meta = deepcopy(self.meta)
+            self._hdu = table_to_hdu(t)
+            return self._hdu
+
+        if self._fileobj is None:
+            self._open_file()
+        self._finish_file()
+
+        # Finalise the header with the metadata of all tables, which follows the cards for the columns in it
+        t_meta = self._t_columns.copy()
+        t_meta.meta = deepcopy(self.meta)
+        l_meta_cards = table_to_hdu(t_meta).header.cards[len(self._header):]
+
+        self._hdulist = fits.open(self.qualified_filename, memmap=True)
+        self._hdu = self._hdulist[1]
+        self._hdu.header.extend(l_meta_cards)
+
+        return self._hdu
+
+    def close(self) -> None:
+        """ Closes the stream, deleting its file. Any HDU got from it can't be used after this.
+        """
+
+        self._hdu = None
+        self._table_buffer = None
+
+        if self._hdulist is not None:
+            self._hdulist.close()
+            self._hdulist = None
+
+        self._remove_file()
+
+    def _write_rows(self, t: Table) -> None:
+        """ Writes the rows of a table to the file, first promoting the columns to be able to hold them, and rewriting
+            the rows already written if this changes how they're stored. Tables with no rows are still used to promote
+            the columns, as they would be by `vstack`.
+        """
+
+        if self._t_columns is None:
+            self._set_columns(self._get_columns_of(t))
+        else:
+            t_columns = self._get_merged_columns(t)
+            if (self._fileobj is not None and
+                    self._get_layout(table_to_hdu(t_columns).header) != self._get_layout(self._header)):
+                self._rewrite_rows(t_columns)
+            else:
+                self._set_columns(t_columns)
+
+        if len(t) == 0:
+            return
+
+        if self._fileobj is None:
+            self._open_file()
+        self._fileobj.write(self._get_data_bytes(t))
+
+    def _get_merged_columns(self, t: Table) -> Table:
+        """ Gets the stream's columns merged with those of a table, promoted in the same way as by `vstack`. If `vstack`
+            can't merge them but either the table or the stream has no rows, the columns they share are taken from
+            the side with rows, since the other has no data which would need them to be promoted.
+        """
+
+        t_columns = self._get_columns_of(t)
+
+        try:
+            return vstack([self._t_columns, t_columns], metadata_conflicts="silent")
+        except TableMergeError:
+            if len(t) > 0 and self.num_rows > 0:
+                raise
+
+        if len(t) == 0:
+            t_stream_columns = self._t_columns
+            for colname in t_columns.colnames:
+                if colname in t_stream_columns.colnames:
+                    t_columns.replace_column(colname, t_stream_columns[colname].copy())
+        else:
+            t_stream_columns = self._t_columns.copy()
+            for colname in t_stream_columns.colnames:
+                if colname in t_columns.colnames:
+                    t_stream_columns.replace_column(colname, t_columns[colname].copy())
+
+        return vstack([t_stream_columns, t_columns], metadata_conflicts="silent")
+
+    def _rewrite_rows(self, t_columns: Table) -> None:
+        """ Rewrites the rows already written to a new file with new columns, a chunk of rows at a time. If this
+            fails, the stream is left as it was.
+        """
+
+        self._finish_file()
+        old_state = (self.qualified_filename, self._t_columns, self._header, self._header_offset)
+
+        try:
+            self._set_columns(t_columns)
+            self._open_file()
+            t_written = read_memmapped_table(old_state[0])
+            for start in range(0, len(t_written), BIN_TABLE_STREAM_CHUNK_SIZE):
+                self._fileobj.write(self._get_data_bytes(t_written[start:start + BIN_TABLE_STREAM_CHUNK_SIZE]))
+            del t_written
+        except Exception:
+            self._remove_file()
+            self.qualified_filename, self._t_columns, self._header, self._header_offset = old_state
+            raise
+
+        os.remove(old_state[0])
+
+    def _fall_back_to_buffer(self) -> None:
+        """ Moves the rows already written into a TableBuffer, which all further rows will be appended to.
+        """
+
+        self._table_buffer = TableBuffer()
+
+        # Start with the columns alone, so that any which are masked stay masked
+        self._table_buffer.append(self._t_columns)
+
+        if self._fileobj is not None:
+            self._finish_file()
+            self._table_buffer.append(read_memmapped_table(self.qualified_filename))
+            self._remove_file()
+
+    def _set_columns(self, t_columns: Table) -> None:
+        """ Sets the columns of the stream, defined by a table with no rows.
+        """
+        self._t_columns = t_columns
+        self._header = table_to_hdu(t_columns).header
+
+    def _open_file(self) -> None:
+        """ Opens a new file, writing an empty primary header and the header of the binary table to it, and recording
+            where the latter starts so the number of rows in it can be filled in later.
+        """
+
+        fd, self.qualified_filename = tempfile.mkstemp(suffix=".fits", dir=self.workdir)
+        self._fileobj = os.fdopen(fd, "wb")
+
+        self._fileobj.write(fits.PrimaryHDU().header.tostring().encode("ascii"))
+        self._header_offset = self._fileobj.tell()
+        self._fileobj.write(self._header.tostring().encode("ascii"))
+
+    def _finish_file(self) -> None:
+        """ Pads the data in the file to a whole number of blocks, fills in the number of rows in the header, and
+            closes it. The length of the header doesn't change, so it can be overwritten in place.
+        """
+
+        num_rows = (self._fileobj.tell() - self._header_offset - len(self._header.tostring())) // self._header["NAXIS1"]
+
+        self._fileobj.write(b"\0" * (-self._fileobj.tell() % FITS_BLOCK_SIZE))
+        self._header["NAXIS2"] = num_rows
+        self._fileobj.seek(self._header_offset)
+        self._fileobj.write(self._header.tostring().encode("ascii"))
+        self._fileobj.close()
+        self._fileobj = None
+
+    def _remove_file(self) -> None:
+        """ Closes and deletes the file, if it's open or exists.
+        """
+
+        if self._fileobj is not None:
+            self._fileobj.close()
+            self._fileobj = None
+
+        if self.qualified_filename is not None and os.path.exists(self.qualified_filename):
+            os.remove(self.qualified_filename)
+
+    def _get_data_bytes(self, t: Table) -> bytes:
+        """ Gets the bytes of the rows of a table as they're stored in a FITS binary table with the stream's columns.
+        """
+
+        # Convert each column to the stream's columns, masking it if it's missing from the table
+        l_columns: List[Column] = []
+        for colname in self._t_columns.colnames:
+
+            stream_col: Column = self._t_columns[colname]
+            if colname in t.colnames:
+                data = np.ma.getdata(t[colname])
+                mask = np.ma.getmaskarray(t[colname])
+            else:
+                data = np.zeros((len(t),) + stream_col.shape[1:], dtype=stream_col.dtype)
+                mask = np.ones(data.shape, dtype=bool)
+
+            if data.dtype != stream_col.dtype:
+                data = data.astype(stream_col.dtype, casting="same_kind")
+
+            if isinstance(stream_col, MaskedColumn):
+                l_columns.append(MaskedColumn(data, name=colname, mask=mask, fill_value=stream_col.fill_value,
+                                              copy=False))
+            elif np.any(mask):
+                raise ValueError(f"Column {colname} of table appended to BinTableStream has masked values, but the "
+                                 f"stream's column isn't masked.")
+            else:
+                l_columns.append(Column(data, name=colname, copy=False))
+
+        table_hdu = table_to_hdu(Table(l_columns, copy=False))
+        if self._get_layout(table_hdu.header) != self._get_layout(self._header):
+            raise ValueError("Table appended to BinTableStream can't be stored in the same layout as its columns.")
+
+        # Get the bytes of the data as they'd be written to a file, which follow the primary and table headers
+        buffer = io.BytesIO()
+        fits.HDUList([fits.PrimaryHDU(), table_hdu]).writeto(buffer)
+        data_offset = len(fits.PrimaryHDU().header.tostring()) + len(table_hdu.header.tostring())
+        data_size = table_hdu.header["NAXIS1"] * table_hdu.header["NAXIS2"]
+
+        return buffer.getbuffer()[data_offset:data_offset + data_size].tobytes()
+
+    @staticmethod
+    def _get_columns_of(t: Table) -> Table:
+        """ Gets a table with the columns of a table but no rows or metadata.
+        """
+        t_columns = t[:0].copy()
+        t_columns.meta = {}
+        return t_columns
+
+    @staticmethod
+    def _get_layout(header: fits.Header) -> Tuple[Any, ...]:
+        """ Gets the values of the keywords in the header of a binary table which determine how its rows are stored.
+        """
+        return (header["NAXIS1"], header["TFIELDS"],
+                *(header.get(f"{keyword}{i + 1}") for i in range(header["TFIELDS"])
+                  for keyword in ("TTYPE", "TFORM", "TDIM", "TNULL")))
+
+
+class IDIndex:
+    """ Index of the rows of a table by the values in an ID column, which can be used to find the rows corresponding to
+        a list of IDs. This is built from a sorted permutation of the IDs, so it takes O(N log N) time to build and
+        O(M log N) time to look up M IDs, and holds only one integer array the length of the table, unlike an astropy
+        table index.
+
+        If an ID appears more than once in the table, `get_rows` uses the first row with it, while `get_all_rows` gives
+        all rows with it.
+
+        Parameters
+        ----------
+        l_ids : Sequence[int]
+            The IDs of the rows of the table, in order.
+    """
+
+    l_sorted_rows: np.ndarray
+    l_sorted_ids: np.ndarray
+
+    def __init__(self, l_ids: Sequence[int]):
+
+        l_ids = np.asarray(l_ids)
+
+        # Use a stable sort so that the first row with each ID comes first
+        self.l_sorted_rows = np.argsort(l_ids, kind="stable")
+        self.l_sorted_ids = l_ids[self.l_sorted_rows]
+
+    def __len__(self) -> int:
+        return len(self.l_sorted_ids)
+
+    def get_rows(self,
+                 l_ids: Sequence[int],
+                 allow_missing: bool = False) -> np.ndarray:
+        """ Gets the row indices in the table of each of the provided IDs, in the order they're provided. If
+            `allow_missing` is True, MISSING_ROW will be given for IDs which aren't in the table, otherwise a
+            ValueError will be raised if any are missing.
+        """
+
+        l_rows, l_found = self._search(l_ids)
+
+        if np.all(l_found):
+            return l_rows
+
+        if not allow_missing:
+            l_missing_ids = np.asarray(l_ids)[~l_found]
+            raise ValueError(f"{len(l_missing_ids)} of {len(l_rows)} IDs were not found in the table, including: "
+                             f"{l_missing_ids[:MAX_REPORTED_MISSING_IDS].tolist()}")
+
+        l_rows[~l_found] = MISSING_ROW
+
+        return l_rows
+
+    def get_all_rows(self, l_ids: Sequence[int]) -> np.ndarray:
+        """ Gets the row indices in the table of all rows with each of the provided IDs, in the order the IDs are
+            provided, and in the order of the table for IDs which appear in more than one row. IDs which aren't in the
+            table are skipped.
+        """
+
+        l_ids = np.asarray(l_ids)
+
+        l_starts: np.ndarray = np.searchsorted(self.l_sorted_ids, l_ids, side="left")
+        l_counts: np.ndarray = np.searchsorted(self.l_sorted_ids, l_ids, side="right") - l_starts
+
+        # Expand the range of positions in the sorted IDs for each ID into the positions in it. The stable sort used to
+        # build the index keeps rows with the same ID in the order of the table
+        l_range_starts: np.ndarray = np.repeat(np.cumsum(l_counts) - l_counts, l_counts)
+        l_positions: np.ndarray = np.repeat(l_starts, l_counts) + np.arange(len(l_range_starts)) - l_range_starts
+
+        return self.l_sorted_rows[l_positions]
+
+    def contains(self, l_ids: Sequence[int]) -> np.ndarray:
+        """ Gets a boolean array of whether or not each of the provided IDs is in the table.
+        """
+        return self._search(l_ids)[1]
+
+    def _search(self, l_ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """ Gets the row index in the table for each of the provided IDs (which is only meaningful for IDs which are
+            found), and whether or not each was found.
+        """
+
+        l_ids = np.asarray(l_ids)
+
+        if len(self.l_sorted_ids) == 0:
+            return np.zeros(len(l_ids), dtype=int), np.zeros(len(l_ids), dtype=bool)
+
+        # Search for the IDs in sorted order, which is much faster for large lists than searching in random order, as
+        # it accesses the sorted IDs sequentially
+        l_query_order = np.argsort(l_ids)
+
+        l_i = np.empty(len(l_ids), dtype=np.intp)
+        l_i[l_query_order] = np.searchsorted(self.l_sorted_ids, l_ids[l_query_order])
+        np.clip(l_i, 0, len(self.l_sorted_ids) - 1, out=l_i)
+
+        return self.l_sorted_rows[l_i], self.l_sorted_ids[l_i] == l_ids
+
+
+# Cache of the IDIndex built for each table and ID column, keyed by the table's id(). Each entry holds a weak reference
+# to the table, so that it can be discarded when the table is, and the ID column it was built for, so that it can be
+# rebuilt if the column is replaced
+_d_id_index_cache: Dict[Tuple[int, str], Tuple[weakref.ref, Column, IDIndex]] = {}
+
+
+def get_id_index(t: Table,
+                 id_colname: str) -> IDIndex:
+    """ Gets an IDIndex for the provided table and ID column. This is built the first time it's requested for a table
+        and cached, so that it can be shared by everything which needs to align other data with the table.
+
+        The cached index will be rebuilt if the ID column is replaced, but not if its values are modified in place, or
+        if rows are added to or removed from the table in place.
+    """
+
+    key = (id(t), id_colname)
+    id_col = t[id_colname]
+
+    cached = _d_id_index_cache.get(key)
+    if cached is not None:
+        table_ref, cached_id_col, id_index = cached
+        if table_ref() is t and cached_id_col is id_col and len(id_index) == len(id_col):
+            return id_index
+
+    id_index = IDIndex(id_col)
+
+    _d_id_index_cache[key] = (weakref.ref(t, lambda _: _d_id_index_cache.pop(key, None)), id_col, id_index)
+
+    return id_index
+
+
+def read_memmapped_table(qualified_filename: str,
+                         hdu: int = 1) -> Table:
+    """ Reads a table from an HDU of a FITS file with its data memory-mapped, so that the data of each column is only
+        read from the file when it's accessed.
+
+        Note that, unlike when a table is read without memory-mapping, NaN values in float columns and empty strings
+        in string columns aren't masked (see `mask_invalid_values`).
+    """
+    return Table.read(qualified_filename, hdu=hdu, memmap=True)
+
+
+def mask_invalid_values(t: Table) -> None:
+    """ Masks NaN values in float columns and empty strings in string columns of a table in place, as is done when a
+        FITS table is read without memory-mapping. Columns which are already masked are left unchanged.
+    """
+
+    for colname in t.colnames:
+
+        col: Column = t[colname]
+        if isinstance(col, MaskedColumn):
+            continue
+
+        if np.issubdtype(col.dtype, np.inexact):
+            l_is_invalid: np.ndarray = np.isnan(np.asarray(col))
+            fill_value: Any = np.nan
+        elif col.dtype.kind == "S":
+            l_is_invalid = np.asarray(col) == b""
+            fill_value = b""
+        else:
+            continue
+
+        if l_is_invalid.any():
+            t.replace_column(colname, MaskedColumn(col, mask=l_is_invalid, fill_value=fill_value, copy=False))
+
+
+def get_table_of_columns(t: Table,
+                         l_colnames: Sequence[str],
+                         l_rows: Optional[Sequence[int]] = None,
+                         mask_invalid: bool = False) -> Table:
+    """ Gets a copy of a table with only the listed columns, in the order they're listed, skipping duplicates and any
+        columns the table doesn't have, and optionally only the listed rows. If the table is memory-mapped, only the
+        data for these columns and rows is read into memory. If `mask_invalid` is True, invalid values in the copy are
+        masked (see `mask_invalid_values`), so that the copy of a memory-mapped table is the same as if it had been
+        read without memory-mapping.
+    """
+
+    s_colnames = set(t.colnames)
+    l_colnames_present: List[str] = [colname for colname in dict.fromkeys(l_colnames) if colname in s_colnames]
+
+    t_out: Table
+    if l_rows is None:
+        t_out = Table([t[colname] for colname in l_colnames_present], meta=deepcopy(t.meta), copy=True)
+    else:
+        # Indexing each column with the rows gives a copy of just those rows, so they don't need to be copied again
+        l_rows = np.asarray(l_rows, dtype=np.intp)
+        t_out = Table([t[colname][l_rows] for colname in l_colnames_present], meta=deepcopy(t.meta), copy=False)
+
+    if mask_invalid:
+        mask_invalid_values(t_out)
+
+    return t_out
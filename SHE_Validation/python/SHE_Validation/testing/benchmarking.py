@@ -0,0 +1,380 @@
+"""
+:file: python/SHE_Validation/testing/benchmarking.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Utilities for benchmarking the stages of True Universe matching on mock data at various scales, recording the wall
+time, peak memory use, and amount of data read for each stage
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional
+
+import astropy
+import numpy as np
+import scipy
+
+import SHE_Validation
+from SHE_PPT.constants.classes import ShearEstimationMethods
+from SHE_PPT.logging import getLogger
+from SHE_Validation.match_to_tu import (L_UNUSED_TU_GALAXY_COLUMNS, L_UNUSED_TU_STAR_COLUMNS,
+                                        bucket_true_universe_sources, determine_coord_range, get_l_d_tile_args,
+                                        match_tiles, plan_tiles, write_matched_catalog, )
+from SHE_Validation.table_utility import BinTableStream
+from SHE_Validation.testing.mock_tu_data import get_mock_region, make_mock_shear_tables, write_mock_tu_catalogs
+from SHE_Validation.tu_catalog_index import TUCatalogIndex
+
+logger = getLogger(__name__)
+
+# Version of the format of benchmark results files
+BENCHMARK_RESULTS_VERSION = 1
+
+# Default parameters for generating mock data
+DEFAULT_SOURCE_DENSITY = 2e5  # TU sources per square degree
+DEFAULT_STAR_FRACTION = 0.1
+DEFAULT_OBJECTS_PER_SOURCE = 0.1
+DEFAULT_UNMATCHED_FRACTION = 0.1
+DEFAULT_MATCH_THRESHOLD = 0.3 / 3600  # deg
+
+# Default relative increase in a measurement for it to be considered a regression, and minimum values below which
+# changes are ignored as noise
+DEFAULT_REGRESSION_TOLERANCE = 0.2
+MIN_COMPARED_WALL_TIME = 0.25  # s
+MIN_COMPARED_PEAK_RSS = 16 * 1024 ** 2  # bytes
+
+PROC_SELF_IO = "/proc/self/io"
+PROC_SELF_STATUS = "/proc/self/status"
+PROC_SELF_CLEAR_REFS = "/proc/self/clear_refs"
+
+
+@dataclass
+class StageResults:
+    """ Measurements of the resources used during one stage of a benchmark. Memory and I/O measurements are for the
+        main process only, and are None if they can't be measured on this system. Bytes read counts all data read
+        through system calls, including from the page cache, while storage bytes read counts only data which had to
+        be fetched from storage. Neither counts data accessed through memory-mapping, which instead shows up in the
+        peak RSS.
+    """
+    wall_time: float
+    peak_rss: Optional[int] = None
+    bytes_read: Optional[int] = None
+    storage_bytes_read: Optional[int] = None
+    bytes_written: Optional[int] = None
+
+
+class StageProfiler:
+    """ Class to measure the resources used by a sequence of named stages of processing.
+
+        On Linux, the peak RSS of the process is reset at the start of each stage, so the peak recorded for each stage
+        is for that stage alone. On other systems, it's the peak of the process up to the end of the stage.
+    """
+
+    d_stage_results: Dict[str, StageResults]
+    peak_rss_is_per_stage: bool
+
+    def __init__(self):
+        self.d_stage_results = {}
+        self.peak_rss_is_per_stage = os.access(PROC_SELF_CLEAR_REFS, os.W_OK)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """ Context manager which measures the resources used within it, storing them under the provided stage name.
+        """
+
+        logger.info(f"Starting benchmark stage {name}.")
+
+        _reset_peak_rss()
+        d_start_io = _read_proc_io()
+        start = perf_counter()
+
+        yield
+
+        wall_time = perf_counter() - start
+        d_end_io = _read_proc_io()
+
+        self.d_stage_results[name] = StageResults(wall_time=wall_time,
+                                                  peak_rss=_get_peak_rss(),
+                                                  bytes_read=_get_io_diff(d_start_io, d_end_io, "rchar"),
+                                                  storage_bytes_read=_get_io_diff(d_start_io, d_end_io, "read_bytes"),
+                                                  bytes_written=_get_io_diff(d_start_io, d_end_io, "wchar"))
+
+        logger.info(f"Finished benchmark stage {name} in {wall_time:.3f} s.")
+
+    def get_results(self) -> Dict[str, Dict[str, Any]]:
+        """ Gets the results for each stage as a dict, suitable for output to JSON.
+        """
+        return {name: asdict(stage_results) for name, stage_results in self.d_stage_results.items()}
+
+
+def _read_proc_io() -> Optional[Dict[str, int]]:
+    """ Reads the I/O counters for this process, if available.
+    """
+    try:
+        with open(PROC_SELF_IO, "r") as fi:
+            return {key: int(value) for key, value in (line.split(":") for line in fi if ":" in line)}
+    except OSError:
+        return None
+
+
+def _get_io_diff(d_start_io: Optional[Dict[str, int]],
+                 d_end_io: Optional[Dict[str, int]],
+                 key: str) -> Optional[int]:
+    """ Gets the change in an I/O counter, if available.
+    """
+    if d_start_io is None or d_end_io is None or key not in d_start_io or key not in d_end_io:
+        return None
+    return d_end_io[key] - d_start_io[key]
+
+
+def _reset_peak_rss() -> None:
+    """ Resets the peak RSS of this process to its current RSS, if possible.
+    """
+    try:
+        with open(PROC_SELF_CLEAR_REFS, "w") as fo:
+            fo.write("5")
+    except OSError:
+        pass
+
+
+def _get_peak_rss() -> Optional[int]:
+    """ Gets the peak RSS of this process in bytes.
+    """
+    try:
+        with open(PROC_SELF_STATUS, "r") as fi:
+            for line in fi:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    # Fall back to the peak RSS for the process's lifetime, which is in bytes on macOS and kilobytes elsewhere
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def get_benchmark_environment() -> Dict[str, Any]:
+    """ Gets information on the code and system a benchmark is run with, so that results can be compared between
+        commits.
+    """
+
+    try:
+        git_commit: Optional[str] = subprocess.run(["git", "rev-parse", "HEAD"],
+                                                   cwd=os.path.dirname(os.path.abspath(SHE_Validation.__file__)),
+                                                   capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        git_commit = None
+
+    return {"version": BENCHMARK_RESULTS_VERSION,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit,
+            "she_validation_version": SHE_Validation.__version__,
+            "python_version": platform.python_version(),
+            "numpy_version": np.__version__,
+            "astropy_version": astropy.__version__,
+            "scipy_version": scipy.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()}
+
+
+def run_match_to_tu_benchmark(workdir: str,
+                              num_sources: int,
+                              num_files: int,
+                              source_density: float = DEFAULT_SOURCE_DENSITY,
+                              star_fraction: float = DEFAULT_STAR_FRACTION,
+                              objects_per_source: float = DEFAULT_OBJECTS_PER_SOURCE,
+                              unmatched_fraction: float = DEFAULT_UNMATCHED_FRACTION,
+                              match_threshold: float = DEFAULT_MATCH_THRESHOLD,
+                              num_processes: int = 1,
+                              max_objects_per_tile: Optional[int] = None,
+                              tu_index_dir: Optional[str] = None) -> Dict[str, Any]:
+    """ Runs a benchmark of True Universe matching at a single scale. Mock TU catalogs with `num_sources` sources in
+        total, split into `num_files` files each of galaxies and stars, and mock shear estimates tables are first
+        written out, then each stage of the matching performed by SHE_Validation_MatchToTU is run in turn and
+        profiled.
+
+        Returns a dict of the parameters used, the results for each stage, and the numbers of objects matched.
+    """
+
+    d_params = {"num_sources": num_sources,
+                "num_files": num_files,
+                "source_density": source_density,
+                "star_fraction": star_fraction,
+                "objects_per_source": objects_per_source,
+                "unmatched_fraction": unmatched_fraction,
+                "match_threshold": match_threshold,
+                "num_processes": num_processes,
+                "max_objects_per_tile": max_objects_per_tile,
+                "use_tu_index": tu_index_dir is not None}
+
+    logger.info(f"Running TU matching benchmark with parameters: {d_params}")
+
+    # Generate the mock data, which isn't profiled
+    num_stars = int(round(num_sources * star_fraction))
+    num_galaxies = num_sources - num_stars
+    num_objects = int(round(num_sources * objects_per_source))
+    num_unmatched = int(round(num_objects * unmatched_fraction))
+
+    mock_ra_range, mock_dec_range = get_mock_region(num_sources, source_density)
+
+    mock_tu_catalogs = write_mock_tu_catalogs(workdir,
+                                              num_galaxies=num_galaxies,
+                                              num_stars=num_stars,
+                                              num_files=num_files,
+                                              ra_range=mock_ra_range,
+                                              dec_range=mock_dec_range,
+                                              num_sampled_sources=num_objects - num_unmatched)
+    d_shear_tables = make_mock_shear_tables(mock_tu_catalogs.l_sample_ra,
+                                            mock_tu_catalogs.l_sample_dec,
+                                            num_unmatched=num_unmatched,
+                                            ra_range=mock_ra_range,
+                                            dec_range=mock_dec_range,
+                                            match_threshold=match_threshold)
+
+    # Run through the stages of matching as in match_to_tu_from_args, profiling each
+    stage_profiler = StageProfiler()
+
+    with stage_profiler.stage("plan_tiles"):
+        ra_range, dec_range = determine_coord_range(d_shear_tables, match_threshold)
+        tile_plan = plan_tiles(d_shear_tables,
+                               ra_range=ra_range,
+                               dec_range=dec_range,
+                               max_objects_per_tile=max_objects_per_tile)
+
+    tu_index: Optional[TUCatalogIndex] = None
+    if tu_index_dir is not None:
+        tu_index = TUCatalogIndex(tu_index_dir)
+
+    with stage_profiler.stage("bucket_tu_sources"):
+        d_tile_star_catalogs = bucket_true_universe_sources(catalog_filenames=mock_tu_catalogs.l_star_catalog_filenames,
+                                                            tile_plan=tile_plan,
+                                                            path=workdir,
+                                                            excluded_columns=L_UNUSED_TU_STAR_COLUMNS,
+                                                            tu_index=tu_index)
+        d_tile_galaxy_catalogs = bucket_true_universe_sources(
+            catalog_filenames=mock_tu_catalogs.l_galaxy_catalog_filenames,
+            tile_plan=tile_plan,
+            path=workdir,
+            excluded_columns=L_UNUSED_TU_GALAXY_COLUMNS,
+            tu_index=tu_index)
+
+    star_matched_tables: Dict[ShearEstimationMethods, BinTableStream] = {}
+    gal_matched_tables: Dict[ShearEstimationMethods, BinTableStream] = {}
+    for method in ShearEstimationMethods:
+        star_matched_tables[method] = BinTableStream(workdir=workdir)
+        gal_matched_tables[method] = BinTableStream(workdir=workdir)
+
+    num_gal_matched = 0
+    num_star_matched = 0
+
+    try:
+        with stage_profiler.stage("match_tiles"):
+            d_shared_args: Dict[str, Any] = {"shear_tables": d_shear_tables,
+                                             "galaxy_catalog_filenames": mock_tu_catalogs.l_galaxy_catalog_filenames,
+                                             "star_catalog_filenames": mock_tu_catalogs.l_star_catalog_filenames,
+                                             "match_threshold": match_threshold,
+                                             "search_path": workdir,
+                                             "union_positions": None}
+            match_tiles(l_d_tile_args=get_l_d_tile_args(tile_plan, d_tile_star_catalogs, d_tile_galaxy_catalogs),
+                        d_shared_args=d_shared_args,
+                        gal_matched_tables=gal_matched_tables,
+                        star_matched_tables=star_matched_tables,
+                        num_processes=num_processes)
+
+        # The matched rows are streamed to disk as each tile is matched, so writing the output only needs to copy them
+        # into the output files
+        with stage_profiler.stage("write_output"):
+            for method in ShearEstimationMethods:
+                if gal_matched_tables[method].num_tables == 0:
+                    continue
+
+                num_gal_matched += len(gal_matched_tables[method])
+                num_star_matched += len(star_matched_tables[method])
+
+                write_matched_catalog(os.path.join(workdir, f"matched_catalog_{method.name}.fits"),
+                                      [gal_matched_tables[method], star_matched_tables[method],
+                                       d_shear_tables[method]])
+    finally:
+        for stream in (*gal_matched_tables.values(), *star_matched_tables.values()):
+            stream.close()
+
+    return {"params": d_params,
+            "num_tiles": len(tile_plan),
+            "num_objects": num_objects,
+            "num_gal_matched": num_gal_matched,
+            "num_star_matched": num_star_matched,
+            "peak_rss_is_per_stage": stage_profiler.peak_rss_is_per_stage,
+            "stages": stage_profiler.get_results()}
+
+
+def write_benchmark_results(qualified_filename: str,
+                            l_d_run_results: List[Dict[str, Any]]) -> None:
+    """ Writes the results of a set of benchmark runs to a JSON file, along with information on the environment they
+        were run in.
+    """
+    with open(qualified_filename, "w") as fo:
+        json.dump({"environment": get_benchmark_environment(),
+                   "runs": l_d_run_results}, fo, indent=2)
+
+
+def read_benchmark_results(qualified_filename: str) -> Dict[str, Any]:
+    """ Reads benchmark results from a JSON file written by write_benchmark_results.
+    """
+    with open(qualified_filename, "r") as fi:
+        return json.load(fi)
+
+
+def compare_benchmark_results(d_results: Dict[str, Any],
+                              d_baseline_results: Dict[str, Any],
+                              tolerance: float = DEFAULT_REGRESSION_TOLERANCE) -> List[str]:
+    """ Compares the results of benchmark runs against a baseline, matching up runs with the same parameters. Returns
+        a list of messages describing each stage whose wall time or peak RSS increased by more than a fraction
+        `tolerance` of its baseline value, ignoring stages whose measurements are too small to compare reliably.
+    """
+
+    d_baseline_runs = {json.dumps(d_run["params"], sort_keys=True): d_run for d_run in d_baseline_results["runs"]}
+
+    l_regressions: List[str] = []
+    for d_run in d_results["runs"]:
+        d_baseline_run = d_baseline_runs.get(json.dumps(d_run["params"], sort_keys=True))
+        if d_baseline_run is None:
+            continue
+
+        for stage_name, d_stage in d_run["stages"].items():
+            d_baseline_stage = d_baseline_run["stages"].get(stage_name)
+            if d_baseline_stage is None:
+                continue
+
+            for key, min_compared in (("wall_time", MIN_COMPARED_WALL_TIME),
+                                      ("peak_rss", MIN_COMPARED_PEAK_RSS)):
+                value = d_stage.get(key)
+                baseline_value = d_baseline_stage.get(key)
+                if value is None or baseline_value is None or max(value, baseline_value) < min_compared:
+                    continue
+                if value > baseline_value * (1 + tolerance):
+                    l_regressions.append(f"num_sources={d_run['params']['num_sources']}, stage {stage_name}: "
+                                         f"{key} increased from {baseline_value:.4g} to {value:.4g}.")
+
+    return l_regressions
@@ -0,0 +1,228 @@
+"""
+:file: python/SHE_Validation/testing/mock_tu_data.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Utilities to generate mock True Universe catalogs and shear estimates tables with objects matching sources in them,
+at scales suitable for benchmarking True Universe matching
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from astropy.table import Table
+
+from SHE_PPT.constants.classes import ShearEstimationMethods
+from SHE_PPT.constants.misc import DATA_SUBDIR
+from SHE_PPT.constants.shear_estimation_methods import D_SHEAR_ESTIMATION_METHOD_TUM_TABLE_FORMATS
+from SHE_PPT.logging import getLogger
+from SHE_PPT.table_formats.she_tu_matched import tf as tum_tf
+from SHE_Validation.testing.constants import TEST_METHODS
+from SHE_Validation.testing.mock_data import ExtendedMockMeasDataGenerator
+
+logger = getLogger(__name__)
+
+MOCK_TU_GALAXY_CATALOG_FILENAME_TEMPLATE = "mock_tu_galaxy_catalog_%i.fits"
+MOCK_TU_STAR_CATALOG_FILENAME_TEMPLATE = "mock_tu_star_catalog_%i.fits"
+
+TU_SEED = 61324
+
+# Unused columns to include in the mock catalogs, so that reading them costs something as it does for real catalogs
+L_MOCK_UNUSED_TU_GALAXY_COLUMNS = ["HALO_ID", "RA", "DEC", "EBV", "TU_FNU_VIS_MAG", "TU_FNU_H_NISP_MAG"]
+L_MOCK_UNUSED_TU_STAR_COLUMNS = ["DIST", "AV", "TU_FNU_VIS", "TU_FNU_H_NISP"]
+
+
+@dataclass
+class MockTUCatalogs:
+    """ Filenames of mock TU catalogs, relative to the workdir they were written in, and the positions of a sample of
+        the sources in them.
+    """
+    l_galaxy_catalog_filenames: List[str] = field(default_factory=list)
+    l_star_catalog_filenames: List[str] = field(default_factory=list)
+    l_sample_ra: np.ndarray = field(default_factory=lambda: np.array([], dtype=float))
+    l_sample_dec: np.ndarray = field(default_factory=lambda: np.array([], dtype=float))
+
+
+def get_mock_region(num_sources: int,
+                    source_density: float,
+                    centre: Tuple[float, float] = (60., 0.)) -> Tuple[np.ndarray, np.ndarray]:
+    """ Gets the (ra_range, dec_range) of a region with roughly equal sides, sized so that the provided number of
+        sources will have the desired density (per square degree) within it.
+    """
+
+    side = np.sqrt(num_sources / source_density)
+    half_dec_side = side / 2
+    half_ra_side = half_dec_side / np.cos(np.deg2rad(centre[1]))
+
+    return (np.array((centre[0] - half_ra_side, centre[0] + half_ra_side)),
+            np.array((centre[1] - half_dec_side, centre[1] + half_dec_side)))
+
+
+def write_mock_tu_catalogs(workdir: str,
+                           num_galaxies: int,
+                           num_stars: int,
+                           num_files: int,
+                           ra_range: Sequence[float],
+                           dec_range: Sequence[float],
+                           num_sampled_sources: int = 0,
+                           seed: int = TU_SEED) -> MockTUCatalogs:
+    """ Writes out mock TU galaxy and star catalogs with sources spread uniformly over the provided region, split
+        across the desired number of files of each type. Each file is generated and written in turn, so memory use is
+        bounded by the size of a single file.
+
+        A random sample of `num_sampled_sources` source positions (split between galaxies and stars in proportion to
+        their numbers) is returned, which can be used to place mock objects which will match to TU sources.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    os.makedirs(os.path.join(workdir, DATA_SUBDIR), exist_ok=True)
+
+    mock_tu_catalogs = MockTUCatalogs()
+    l_l_sample_ra: List[np.ndarray] = []
+    l_l_sample_dec: List[np.ndarray] = []
+
+    num_sources = num_galaxies + num_stars
+
+    for (num_of_type, make_catalog, filename_template, l_filenames) in (
+            (num_galaxies, _make_mock_tu_galaxy_catalog, MOCK_TU_GALAXY_CATALOG_FILENAME_TEMPLATE,
+             mock_tu_catalogs.l_galaxy_catalog_filenames),
+            (num_stars, _make_mock_tu_star_catalog, MOCK_TU_STAR_CATALOG_FILENAME_TEMPLATE,
+             mock_tu_catalogs.l_star_catalog_filenames)):
+
+        l_file_sizes = np.diff(np.linspace(0, num_of_type, num_files + 1).astype(int))
+        l_num_sampled = rng.multinomial(int(round(num_sampled_sources * num_of_type / max(num_sources, 1))),
+                                        l_file_sizes / max(num_of_type, 1))
+
+        first_source_id = 0
+        for file_index, (file_size, num_sampled) in enumerate(zip(l_file_sizes, l_num_sampled)):
+
+            l_ra = rng.uniform(ra_range[0], ra_range[1], file_size)
+            l_dec = rng.uniform(dec_range[0], dec_range[1], file_size)
+            l_source_ids = np.arange(first_source_id, first_source_id + file_size)
+            first_source_id += file_size
+
+            catalog = make_catalog(l_ra, l_dec, l_source_ids, rng)
+
+            filename = os.path.join(DATA_SUBDIR, filename_template % file_index)
+            catalog.write(os.path.join(workdir, filename), overwrite=True)
+            l_filenames.append(filename)
+            del catalog
+
+            l_sampled_rows = rng.choice(file_size, size=min(num_sampled, file_size), replace=False)
+            l_l_sample_ra.append(l_ra[l_sampled_rows])
+            l_l_sample_dec.append(l_dec[l_sampled_rows])
+
+    mock_tu_catalogs.l_sample_ra = np.concatenate(l_l_sample_ra)
+    mock_tu_catalogs.l_sample_dec = np.concatenate(l_l_sample_dec)
+
+    logger.info(f"Wrote {num_galaxies} mock TU galaxies and {num_stars} mock TU stars, each across {num_files} files, "
+                f"in {workdir}.")
+
+    return mock_tu_catalogs
+
+
+def _make_mock_tu_galaxy_catalog(l_ra: np.ndarray,
+                                 l_dec: np.ndarray,
+                                 l_source_ids: np.ndarray,
+                                 rng: np.random.Generator) -> Table:
+    """ Makes a mock TU galaxy catalog with the provided positions, and with random values for the other columns
+        used in matching.
+    """
+
+    num_sources = len(l_ra)
+
+    catalog = Table({"SOURCE_ID": l_source_ids,
+                     tum_tf.tu_ra: l_ra,
+                     tum_tf.tu_dec: l_dec,
+                     tum_tf.tu_gamma1: rng.normal(0., 0.03, num_sources),
+                     tum_tf.tu_gamma2: rng.normal(0., 0.03, num_sources),
+                     tum_tf.tu_kappa: rng.normal(0., 0.01, num_sources),
+                     tum_tf.tu_disk_angle: rng.uniform(-90., 90., num_sources)})
+
+    for colname in L_MOCK_UNUSED_TU_GALAXY_COLUMNS:
+        if colname not in catalog.colnames:
+            catalog[colname] = rng.random(num_sources)
+
+    return catalog
+
+
+def _make_mock_tu_star_catalog(l_ra: np.ndarray,
+                               l_dec: np.ndarray,
+                               l_source_ids: np.ndarray,
+                               rng: np.random.Generator) -> Table:
+    """ Makes a mock TU star catalog with the provided positions.
+    """
+
+    num_sources = len(l_ra)
+
+    catalog = Table({"SOURCE_ID": l_source_ids,
+                     "RA": l_ra,
+                     "DEC": l_dec})
+
+    for colname in L_MOCK_UNUSED_TU_STAR_COLUMNS:
+        catalog[colname] = rng.random(num_sources)
+
+    return catalog
+
+
+def make_mock_shear_tables(l_source_ra: np.ndarray,
+                           l_source_dec: np.ndarray,
+                           num_unmatched: int,
+                           ra_range: Sequence[float],
+                           dec_range: Sequence[float],
+                           match_threshold: float,
+                           l_methods: Sequence[ShearEstimationMethods] = TEST_METHODS,
+                           seed: int = TU_SEED) -> Dict[ShearEstimationMethods, Optional[Table]]:
+    """ Makes mock shear estimates tables for the desired methods, with one object near each provided TU source
+        position (offset randomly by much less than the match threshold), plus `num_unmatched` objects placed
+        randomly within the region. Tables for methods not desired are set to None.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    num_matched = len(l_source_ra)
+    num_objects = num_matched + num_unmatched
+
+    # Use the same positions for all methods, as the real tables will have largely the same objects
+    offset_sigma = match_threshold / 10
+    l_ra = np.concatenate((l_source_ra + rng.normal(0., offset_sigma, num_matched),
+                           rng.uniform(ra_range[0], ra_range[1], num_unmatched)))
+    l_dec = np.concatenate((l_source_dec + rng.normal(0., offset_sigma, num_matched),
+                            rng.uniform(dec_range[0], dec_range[1], num_unmatched)))
+
+    d_shear_tables: Dict[ShearEstimationMethods, Optional[Table]] = {method: None
+                                                                     for method in ShearEstimationMethods}
+
+    for method_index, method in enumerate(l_methods):
+
+        sem_tf = D_SHEAR_ESTIMATION_METHOD_TUM_TABLE_FORMATS[method]
+
+        d_data = ExtendedMockMeasDataGenerator(method=method,
+                                               num_test_points=num_objects,
+                                               seed=seed + method_index).get_data()
+
+        shear_table = Table({colname: d_data[colname] for colname in d_data})
+        shear_table[sem_tf.ID] = np.arange(num_objects)
+        shear_table[sem_tf.ra] = l_ra
+        shear_table[sem_tf.dec] = l_dec
+
+        d_shear_tables[method] = shear_table
+
+    return d_shear_tables
@@ -0,0 +1,334 @@
+"""
+:file: python/SHE_Validation/tiling.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Code for planning how to divide a region of the sky into tiles, which can be processed separately
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from SHE_PPT.logging import getLogger
+
+logger = getLogger(__name__)
+
+
+class TilePlan:
+    """ Plan of tiles covering a region of the sky, organised into bands in Dec., each of which is divided into tiles
+        in R.A. Tiles within a band needn't have the same R.A. limits as those in other bands, and the tiles in a band
+        needn't be contiguous, so that a region which wraps around R.A. = 0 can be covered by tiles which don't.
+
+        Tiles are numbered in order of band, then R.A. within each band, except where they were specified otherwise
+        on construction.
+
+        Parameters
+        ----------
+        dec_limits : Sequence[float]
+            The limits of each band in Dec., in increasing order
+        l_band_ra_ranges : Sequence[Sequence[Tuple[float, float]]]
+            For each band, the R.A. range of each tile in it, which must not overlap
+    """
+
+    dec_limits: np.ndarray
+    l_band_ra_lower: List[np.ndarray]
+    l_band_ra_upper: List[np.ndarray]
+    l_band_tile_index: List[np.ndarray]
+    l_tile_ranges: List[Tuple[np.ndarray, np.ndarray]]
+
+    def __init__(self,
+                 dec_limits: Sequence[float],
+                 l_band_ra_ranges: Sequence[Sequence[Tuple[float, float]]],
+                 l_band_tile_index: Optional[Sequence[Sequence[int]]] = None):
+
+        self.dec_limits = np.asarray(dec_limits, dtype=float)
+
+        if l_band_tile_index is None:
+            l_band_tile_index = []
+            num_tiles = 0
+            for l_ra_ranges in l_band_ra_ranges:
+                l_band_tile_index.append(np.arange(num_tiles, num_tiles + len(l_ra_ranges)))
+                num_tiles += len(l_ra_ranges)
+        else:
+            num_tiles = sum(len(l_tile_index) for l_tile_index in l_band_tile_index)
+
+        self.l_band_ra_lower = []
+        self.l_band_ra_upper = []
+        self.l_band_tile_index = []
+        self.l_tile_ranges = [(np.array((np.nan, np.nan)), np.array((np.nan, np.nan)))] * num_tiles
+
+        for band_i, (l_ra_ranges, l_tile_index) in enumerate(zip(l_band_ra_ranges, l_band_tile_index)):
+
+            l_ra_ranges = np.asarray(l_ra_ranges, dtype=float).reshape((-1, 2))
+            l_tile_index = np.asarray(l_tile_index, dtype=int)
+
+            # Store the tiles in each band sorted by lower R.A. limit, so we can search them
+            l_sorted = np.argsort(l_ra_ranges[:, 0], kind="stable")
+            self.l_band_ra_lower.append(l_ra_ranges[l_sorted, 0])
+            self.l_band_ra_upper.append(l_ra_ranges[l_sorted, 1])
+            self.l_band_tile_index.append(l_tile_index[l_sorted])
+
+            dec_range = self.dec_limits[band_i:band_i + 2]
+            for ra_range, tile_index in zip(l_ra_ranges, l_tile_index):
+                self.l_tile_ranges[tile_index] = (np.array(ra_range), np.array(dec_range))
+
+    @classmethod
+    def from_grid(cls,
+                  ra_limits: Sequence[float],
+                  dec_limits: Sequence[float]) -> "TilePlan":
+        """ Creates a plan for a regular grid of tiles, numbered in order of R.A. and then Dec., so that the tile with
+            indices (ra_i, dec_i) in the grid has index ra_i * (len(dec_limits) - 1) + dec_i.
+        """
+
+        num_ra_tiles = len(ra_limits) - 1
+        num_dec_tiles = len(dec_limits) - 1
+
+        l_ra_ranges = [(ra_limits[ra_i], ra_limits[ra_i + 1]) for ra_i in range(num_ra_tiles)]
+
+        return cls(dec_limits=dec_limits,
+                   l_band_ra_ranges=[l_ra_ranges] * num_dec_tiles,
+                   l_band_tile_index=[np.arange(num_ra_tiles) * num_dec_tiles + dec_i
+                                      for dec_i in range(num_dec_tiles)])
+
+    def __len__(self) -> int:
+        return len(self.l_tile_ranges)
+
+    def get_bounding_ranges(self) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """ Gets a list of (ra_range, dec_range) boxes which together cover all tiles. If the tiles wrap around
+            R.A. = 0, two boxes will be returned, one on either side of it, so they can still be searched for sources
+            with simple inequalities.
+        """
+
+        dec_range = self.dec_limits[[0, -1]]
+
+        l_ra_lower = np.concatenate(self.l_band_ra_lower)
+        l_ra_upper = np.concatenate(self.l_band_ra_upper)
+
+        if len(l_ra_lower) == 0:
+            return []
+
+        # Check if there's a gap between tiles which is better treated as the edge of the region
+        l_sorted = np.argsort(l_ra_lower)
+        l_ra_lower = l_ra_lower[l_sorted]
+        l_ra_upper = np.maximum.accumulate(l_ra_upper[l_sorted])
+
+        l_gaps = l_ra_lower[1:] - l_ra_upper[:-1]
+        if len(l_gaps) == 0 or np.max(l_gaps) <= 0 or l_ra_lower[0] > 0 or l_ra_upper[-1] < 360:
+            return [(np.array((l_ra_lower[0], l_ra_upper[-1])), dec_range)]
+
+        gap_i = np.argmax(l_gaps)
+        return [(np.array((l_ra_lower[gap_i + 1], l_ra_upper[-1])), dec_range),
+                (np.array((l_ra_lower[0], l_ra_upper[gap_i])), dec_range)]
+
+    def get_tile_indices(self,
+                         l_ra: Sequence[float],
+                         l_dec: Sequence[float]) -> np.ndarray:
+        """ Gets the index of the tile each position falls strictly within, or -1 if it isn't strictly within any
+            tile.
+        """
+
+        l_ra = np.asarray(l_ra)
+        l_dec = np.asarray(l_dec)
+
+        l_tile_i = np.full(len(l_ra), -1, dtype=int)
+
+        # Group positions by band, so we only need to search the tiles in each band for the positions in it
+        l_band_i = get_strict_bin_indices(l_dec, self.dec_limits)
+        l_sorted_rows = np.argsort(l_band_i, kind="stable")
+        l_sorted_band_i = l_band_i[l_sorted_rows]
+        l_unique_band_i, l_starts = np.unique(l_sorted_band_i, return_index=True)
+        l_ends = np.append(l_starts[1:], len(l_sorted_band_i))
+
+        for band_i, start, end in zip(l_unique_band_i, l_starts, l_ends):
+            if band_i < 0:
+                continue
+
+            l_rows = l_sorted_rows[start:end]
+            l_band_ra = l_ra[l_rows]
+
+            l_ra_lower = self.l_band_ra_lower[band_i]
+            l_ra_upper = self.l_band_ra_upper[band_i]
+
+            l_i = np.searchsorted(l_ra_lower, l_band_ra, side="right") - 1
+            l_is_in_tile = l_i >= 0
+            l_is_in_tile[l_is_in_tile] = np.logical_and(l_band_ra[l_is_in_tile] > l_ra_lower[l_i[l_is_in_tile]],
+                                                        l_band_ra[l_is_in_tile] < l_ra_upper[l_i[l_is_in_tile]])
+
+            l_tile_i[l_rows[l_is_in_tile]] = self.l_band_tile_index[band_i][l_i[l_is_in_tile]]
+
+        return l_tile_i
+
+
+def get_strict_bin_indices(l_coord: Sequence[float],
+                           limits: np.ndarray) -> np.ndarray:
+    """ Gets the index of the bin defined by the provided limits which each coordinate falls strictly within, or -1
+        if it isn't strictly within any bin.
+    """
+    l_coord = np.asarray(l_coord)
+
+    l_bin_i = np.searchsorted(limits, l_coord, side="right") - 1
+
+    l_is_in_bin = np.logical_and(l_bin_i >= 0, l_bin_i < len(limits) - 1)
+    l_is_in_bin[l_is_in_bin] = l_coord[l_is_in_bin] > limits[l_bin_i[l_is_in_bin]]
+
+    return np.where(l_is_in_bin, l_bin_i, -1)
+
+
+def plan_balanced_tiles(l_ra: Sequence[float],
+                        l_dec: Sequence[float],
+                        ra_range: Sequence[float],
+                        dec_range: Sequence[float],
+                        max_coverage: float,
+                        max_objects_per_tile: int) -> TilePlan:
+    """ Plans tiles covering a region of the sky, sized so that each tile contains roughly the same number of
+        objects, and no more than `max_objects_per_tile`, and so that no tile is larger than `max_coverage` degrees
+        along either side (measured as a true angle, so that tiles at high Dec. cover a wider range of R.A.).
+
+        If the objects wrap around R.A. = 0, the region covered will wrap around as well, with tiles split at
+        R.A. = 0, rather than covering the full range of R.A. in between.
+
+        Parameters
+        ----------
+        l_ra, l_dec : Sequence[float]
+            The positions of the objects which will be processed in the tiles, used to estimate the work needed for
+            each tile
+        ra_range, dec_range : Sequence[float]
+            The range of the region to cover. If this covers more than 180 degrees of R.A. but the objects can be
+            covered by a smaller range wrapping around R.A. = 0, that range will be used instead.
+        max_coverage : float
+            Maximum size of each side of a tile in degrees
+        max_objects_per_tile : int
+            Maximum number of objects to aim for in each tile
+    """
+
+    l_ra = np.asarray(l_ra, dtype=float)
+    l_dec = np.asarray(l_dec, dtype=float)
+
+    l_good = np.logical_and(np.isfinite(l_ra), np.isfinite(l_dec))
+    l_ra = l_ra[l_good]
+    l_dec = l_dec[l_good]
+
+    # Work in an R.A. frame which is continuous over the region, starting from the lower limit of the region
+    ra_start, ra_end = _get_unwrapped_ra_range(l_ra, ra_range)
+    if ra_end > 360:
+        l_ra = np.where(l_ra < ra_start, l_ra + 360, l_ra)
+
+    l_in_region = ((l_ra >= ra_start) & (l_ra < ra_end) &
+                   (l_dec >= dec_range[0]) & (l_dec < dec_range[1]))
+    l_ra = l_ra[l_in_region]
+    l_dec = l_dec[l_in_region]
+
+    # Split into bands in Dec., aiming for a roughly square grid of tiles in terms of number of objects
+    num_tiles_for_count = int(np.ceil(len(l_ra) / max_objects_per_tile))
+    num_bands = max(int(np.ceil((dec_range[1] - dec_range[0]) / max_coverage)),
+                    int(np.ceil(np.sqrt(num_tiles_for_count))),
+                    1)
+    dec_limits = get_balanced_limits(l_dec, dec_range, num_bins=num_bands, max_width=max_coverage)
+
+    l_band_i = get_strict_bin_indices(l_dec, dec_limits)
+
+    l_band_ra_ranges: List[List[Tuple[float, float]]] = []
+    for band_i in range(len(dec_limits) - 1):
+
+        l_band_ra = l_ra[l_band_i == band_i]
+
+        # Allow the range of R.A. per tile to increase with Dec., so tiles cover roughly equal areas
+        max_cos_dec = np.max(np.cos(np.deg2rad(np.clip(dec_limits[band_i:band_i + 2], -90, 90))))
+        if dec_limits[band_i] < 0 < dec_limits[band_i + 1]:
+            max_cos_dec = 1.
+        max_ra_width = min(max_coverage / max(max_cos_dec, 1e-6), 360.)
+
+        num_ra_tiles = max(int(np.ceil((ra_end - ra_start) / max_ra_width)),
+                           int(np.ceil(len(l_band_ra) / max_objects_per_tile)),
+                           1)
+        ra_limits = get_balanced_limits(l_band_ra, (ra_start, ra_end), num_bins=num_ra_tiles, max_width=max_ra_width)
+
+        # Convert back to the usual R.A. frame, splitting any tile which crosses R.A. = 360
+        l_ra_ranges: List[Tuple[float, float]] = []
+        for ra_lower, ra_upper in zip(ra_limits[:-1], ra_limits[1:]):
+            if ra_upper <= 360:
+                l_ra_ranges.append((ra_lower, ra_upper))
+            elif ra_lower >= 360:
+                l_ra_ranges.append((ra_lower - 360, ra_upper - 360))
+            else:
+                l_ra_ranges.append((ra_lower, 360.))
+                l_ra_ranges.append((0., ra_upper - 360))
+
+        l_band_ra_ranges.append(l_ra_ranges)
+
+    tile_plan = TilePlan(dec_limits=dec_limits, l_band_ra_ranges=l_band_ra_ranges)
+
+    logger.info(f"Planned {len(tile_plan)} tiles in {len(dec_limits) - 1} bands of Dec. for {len(l_ra)} objects.")
+
+    return tile_plan
+
+
+def get_balanced_limits(l_coord: np.ndarray,
+                        coord_range: Sequence[float],
+                        num_bins: int,
+                        max_width: float) -> np.ndarray:
+    """ Gets limits dividing a range into bins each containing roughly the same number of the provided coordinates,
+        with any bins wider than `max_width` subsequently split into equal-width bins. Limits between bins are placed
+        midway between neighbouring coordinates, so that no coordinate lies on a limit.
+    """
+
+    l_sorted_coord = np.sort(l_coord[np.logical_and(l_coord >= coord_range[0], l_coord < coord_range[1])])
+
+    l_limits = [coord_range[0]]
+    num_coords = len(l_sorted_coord)
+    for bin_i in range(1, num_bins):
+        split_i = int(round(bin_i * num_coords / num_bins))
+        if split_i <= 0 or split_i >= num_coords:
+            continue
+        limit = (l_sorted_coord[split_i - 1] + l_sorted_coord[split_i]) / 2
+        if limit > l_limits[-1]:
+            l_limits.append(limit)
+    l_limits.append(coord_range[1])
+
+    # Split any bins which are too wide
+    l_split_limits = [l_limits[0]]
+    for lower, upper in zip(l_limits[:-1], l_limits[1:]):
+        num_splits = max(int(np.ceil((upper - lower) / max_width)), 1)
+        l_split_limits += list(np.linspace(lower, upper, num_splits + 1)[1:])
+
+    return np.array(l_split_limits)
+
+
+def _get_unwrapped_ra_range(l_ra: np.ndarray,
+                            ra_range: Sequence[float]) -> Tuple[float, float]:
+    """ Gets the range of R.A. to cover, checking if a smaller range can be used by wrapping around R.A. = 0. If so,
+        the upper limit returned will be greater than 360.
+    """
+
+    ra_start, ra_end = ra_range[0], ra_range[1]
+
+    if ra_end - ra_start <= 180 or len(l_ra) < 2:
+        return ra_start, ra_end
+
+    # Find the largest gap between objects around the circle
+    l_sorted_ra = np.sort(l_ra % 360)
+    l_gaps = np.diff(np.append(l_sorted_ra, l_sorted_ra[0] + 360))
+    gap_i = int(np.argmax(l_gaps))
+
+    # If the largest gap is the one spanning R.A. = 0, the range doesn't need to wrap
+    if gap_i == len(l_gaps) - 1:
+        return ra_start, ra_end
+
+    # Otherwise, start after the gap, and pad the limits as much as the provided range is padded
+    padding = max(l_sorted_ra[0] - ra_start, ra_end - l_sorted_ra[-1], 0.)
+    return l_sorted_ra[gap_i + 1] - padding, l_sorted_ra[gap_i] + 360 + padding
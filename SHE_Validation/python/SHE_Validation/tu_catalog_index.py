@@ -0,0 +1,210 @@
+"""
+:file: python/SHE_Validation/tu_catalog_index.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Code for a persistent on-disk index of the positions of sources in True Universe catalogs, so that sources near a
+region of the sky can be found without reading through the full catalogs
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import hashlib
+import json
+import os
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from astropy.io import fits
+
+from SHE_PPT.logging import getLogger
+
+logger = getLogger(__name__)
+
+# Version of the index format. Indices written with a different version will be rebuilt
+TU_INDEX_VERSION = 1
+
+# Default size in degrees of the cells the sky is divided into for the index
+DEFAULT_TU_INDEX_CELL_SIZE = 0.25
+
+# Names of the arrays stored in the index for each catalog
+L_TU_INDEX_ARRAY_NAMES = ["keys", "rows", "ra", "dec"]
+
+
+def get_tu_ra_dec(catalog_data: fits.FITS_rec) -> Tuple[np.ndarray, np.ndarray]:
+    """ Gets the (RA, Dec) columns of a TU catalog's data, using the lensed positions if available.
+    """
+    ra = catalog_data.field("RA_MAG") if "RA_MAG" in catalog_data.names else catalog_data.field("RA")
+    dec = catalog_data.field("DEC_MAG") if "DEC_MAG" in catalog_data.names else catalog_data.field("DEC")
+    return ra, dec
+
+
+class TUCatalogIndex:
+    """ Persistent index of the positions of sources in True Universe catalog files.
+
+        For each catalog file, the index stores the (RA, Dec) of each source and its row in the file, sorted by the
+        cell of the sky it falls in, as .npy files in `index_dir`. These are memory-mapped when used, so finding the
+        sources in a region only reads the parts of the index for cells which overlap that region.
+
+        The index for a catalog file is built the first time it's needed, and rebuilt if the size or modification
+        time of the catalog file changes.
+
+        Parameters
+        ----------
+        index_dir : str
+            The directory to store the index in. This will be created if it doesn't exist.
+        cell_size : float
+            The size in degrees of the cells the sky is divided into.
+    """
+
+    index_dir: str
+    cell_size: float
+    num_ra_cells: int
+
+    def __init__(self,
+                 index_dir: str,
+                 cell_size: float = DEFAULT_TU_INDEX_CELL_SIZE):
+
+        self.index_dir = index_dir
+        self.cell_size = cell_size
+        self.num_ra_cells = int(np.ceil(360. / cell_size))
+
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def get_ra_dec_in_range(self,
+                            qualified_filename: str,
+                            ra_range: Sequence[float],
+                            dec_range: Sequence[float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Gets the rows and (RA, Dec) of all sources in a catalog file which are in cells overlapping the provided
+            range, building the index for the file first if necessary. This is a superset of the sources within the
+            range, so the positions should still be checked to see if they're in the desired range.
+
+            Returns arrays of the row, RA, and Dec of each source, sorted by row.
+        """
+
+        d_index_arrays = self._load(qualified_filename)
+
+        # Find the range of keys for each band of Dec. overlapping the range. Within each band, the cells
+        # overlapping the range have consecutive keys
+        min_ra_cell, max_ra_cell = self._get_cell_range(ra_range)
+        min_dec_cell, max_dec_cell = self._get_cell_range(dec_range)
+
+        l_dec_cells = np.arange(min_dec_cell, max_dec_cell + 1)
+        l_min_keys = l_dec_cells * self.num_ra_cells + max(min_ra_cell, 0)
+        l_max_keys = l_dec_cells * self.num_ra_cells + min(max_ra_cell, self.num_ra_cells - 1)
+
+        keys = d_index_arrays["keys"]
+        l_starts = np.searchsorted(keys, l_min_keys, side="left")
+        l_ends = np.searchsorted(keys, l_max_keys, side="right")
+
+        l_l_index_rows = [np.arange(start, end) for start, end in zip(l_starts, l_ends) if end > start]
+        if len(l_l_index_rows) == 0:
+            return np.array([], dtype=int), np.array([], dtype=float), np.array([], dtype=float)
+        l_index_rows = np.concatenate(l_l_index_rows)
+
+        # Sort by row in the catalog file, so that sources are returned in the same order as in the file
+        l_rows = np.asarray(d_index_arrays["rows"][l_index_rows])
+        l_sorted = np.argsort(l_rows, kind="stable")
+        l_index_rows = l_index_rows[l_sorted]
+
+        return (l_rows[l_sorted],
+                np.asarray(d_index_arrays["ra"][l_index_rows]),
+                np.asarray(d_index_arrays["dec"][l_index_rows]))
+
+    def _get_cell_range(self, coord_range: Sequence[float]) -> Tuple[int, int]:
+        """ Gets the indices of the first and last cells along an axis overlapping a range of coordinates.
+        """
+        return int(np.floor(coord_range[0] / self.cell_size)), int(np.floor(coord_range[1] / self.cell_size))
+
+    def _get_keys(self, ra: np.ndarray, dec: np.ndarray) -> np.ndarray:
+        """ Gets the key of the cell each position falls in. Positions with NaN coordinates are given the minimum
+            possible key, so they won't be found in any search.
+        """
+        ra_cell = np.floor(np.nan_to_num(ra) / self.cell_size).astype(np.int64)
+        dec_cell = np.floor(np.nan_to_num(dec) / self.cell_size).astype(np.int64)
+        keys = dec_cell * self.num_ra_cells + np.clip(ra_cell, 0, self.num_ra_cells - 1)
+        return np.where(np.logical_or(np.isnan(ra), np.isnan(dec)), np.iinfo(np.int64).min, keys)
+
+    def _get_index_stem(self, qualified_filename: str) -> str:
+        """ Gets the root of the filenames for the index of a catalog file, unique to its full path.
+        """
+        path_hash = hashlib.sha1(os.path.abspath(qualified_filename).encode()).hexdigest()[:16]
+        return os.path.join(self.index_dir, f"{os.path.basename(qualified_filename)}.{path_hash}")
+
+    def _get_expected_meta(self, qualified_filename: str) -> Dict[str, object]:
+        """ Gets the metadata which an up-to-date index for a catalog file should have.
+        """
+        stat = os.stat(qualified_filename)
+        return {"version": TU_INDEX_VERSION,
+                "filename": os.path.abspath(qualified_filename),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "cell_size": self.cell_size}
+
+    def _load(self, qualified_filename: str) -> Dict[str, np.ndarray]:
+        """ Loads the memory-mapped index arrays for a catalog file, building or rebuilding the index if necessary.
+        """
+
+        index_stem = self._get_index_stem(qualified_filename)
+        expected_meta = self._get_expected_meta(qualified_filename)
+
+        meta: Optional[Dict[str, object]] = None
+        if os.path.isfile(index_stem + ".json"):
+            with open(index_stem + ".json", "r") as fi:
+                try:
+                    meta = json.load(fi)
+                except json.JSONDecodeError:
+                    meta = None
+
+        if meta != expected_meta:
+            logger.info(f"Building index of TU source positions for {qualified_filename}.")
+            self._build(qualified_filename, index_stem, expected_meta)
+
+        return {array_name: np.load(f"{index_stem}.{array_name}.npy", mmap_mode="r")
+                for array_name in L_TU_INDEX_ARRAY_NAMES}
+
+    def _build(self,
+               qualified_filename: str,
+               index_stem: str,
+               meta: Dict[str, object]) -> None:
+        """ Builds the index for a catalog file. Each file is written to a temporary name and then moved into place,
+            with the metadata file written last, so that an interrupted build (or one running concurrently in another
+            process) will never leave an index which appears valid but isn't.
+        """
+
+        with fits.open(qualified_filename, memmap=True) as hdulist:
+            ra, dec = get_tu_ra_dec(hdulist[1].data)
+            ra = np.array(ra, dtype=float)
+            dec = np.array(dec, dtype=float)
+
+        keys = self._get_keys(ra, dec)
+        l_sorted_rows = np.argsort(keys, kind="stable")
+
+        d_index_arrays = {"keys": keys[l_sorted_rows],
+                          "rows": l_sorted_rows,
+                          "ra": ra[l_sorted_rows],
+                          "dec": dec[l_sorted_rows]}
+
+        tmp_suffix = f".{os.getpid()}.tmp"
+
+        for array_name in L_TU_INDEX_ARRAY_NAMES:
+            array_filename = f"{index_stem}.{array_name}.npy"
+            with open(array_filename + tmp_suffix, "wb") as fo:
+                np.save(fo, d_index_arrays[array_name])
+            os.replace(array_filename + tmp_suffix, array_filename)
+
+        with open(index_stem + ".json" + tmp_suffix, "w") as fo:
+            json.dump(meta, fo)
+        os.replace(index_stem + ".json" + tmp_suffix, index_stem + ".json")
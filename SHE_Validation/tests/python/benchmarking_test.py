@@ -0,0 +1,93 @@
+"""
+:file: tests/python/benchmarking_test.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Unit tests of the benchmarking.py module
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import os
+from copy import deepcopy
+
+import numpy as np
+
+from SHE_Validation.testing.benchmarking import (StageProfiler, compare_benchmark_results, read_benchmark_results,
+                                                 run_match_to_tu_benchmark, write_benchmark_results, )
+from SHE_Validation.testing.utility import SheValTestCase
+
+RESULTS_FILENAME = "benchmark_results.json"
+
+L_STAGE_NAMES = ["plan_tiles", "bucket_tu_sources", "match_tiles", "write_output"]
+
+
+class TestBenchmarking(SheValTestCase):
+    """ Unit tests of the benchmarking utilities.
+    """
+
+    def test_stage_profiler(self):
+        """ Test that the resources used by each stage are recorded.
+        """
+
+        stage_profiler = StageProfiler()
+
+        with stage_profiler.stage("allocate"):
+            a = np.ones(8 * 1024 ** 2)
+
+        with stage_profiler.stage("write"):
+            np.save(os.path.join(self.workdir, "a.npy"), a)
+
+        d_results = stage_profiler.get_results()
+
+        assert list(d_results) == ["allocate", "write"]
+        assert d_results["allocate"]["wall_time"] >= 0
+        assert d_results["allocate"]["peak_rss"] is None or d_results["allocate"]["peak_rss"] >= a.nbytes
+        assert d_results["write"]["bytes_written"] is None or d_results["write"]["bytes_written"] >= a.nbytes
+
+    def test_run_match_to_tu_benchmark(self):
+        """ Test a benchmark run at a small scale, checking that the expected objects are matched and that results
+            can be written out, read back in, and compared.
+        """
+
+        d_run_results = run_match_to_tu_benchmark(self.workdir,
+                                                  num_sources=20000,
+                                                  num_files=3,
+                                                  objects_per_source=0.05,
+                                                  unmatched_fraction=0.2)
+
+        assert list(d_run_results["stages"]) == L_STAGE_NAMES
+
+        # Each method's table has 800 objects placed on TU sources, 10% of them stars, so we expect nearly all of
+        # these to be matched, for each of the two methods, plus perhaps a few of the randomly-placed objects
+        assert 0.95 * 2 * 720 <= d_run_results["num_gal_matched"] <= 1.02 * 2 * 720
+        assert 0.95 * 2 * 80 <= d_run_results["num_star_matched"] <= 1.02 * 2 * 80
+
+        qualified_results_filename = os.path.join(self.workdir, RESULTS_FILENAME)
+        write_benchmark_results(qualified_results_filename, [d_run_results])
+        d_results = read_benchmark_results(qualified_results_filename)
+
+        assert d_results["runs"][0]["params"]["num_sources"] == 20000
+        assert "git_commit" in d_results["environment"]
+
+        # Check that results aren't flagged as a regression against themselves, but are if made slower
+        assert compare_benchmark_results(d_results, d_results) == []
+
+        d_slower_results = deepcopy(d_results)
+        d_slower_results["runs"][0]["stages"]["match_tiles"]["wall_time"] = 10.
+        l_regressions = compare_benchmark_results(d_slower_results, d_results)
+
+        assert len(l_regressions) == 1
+        assert "match_tiles" in l_regressions[0]
@@ -0,0 +1,78 @@
+"""
+:file: tests/python/bin_bitsets_test.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Unit tests of packed bitsets of bin membership
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import numpy as np
+import pytest
+
+from SHE_Validation.binning.bin_bitsets import BinBitset, get_canonical_ids
+
+
+class TestBinBitsets:
+    """ Unit tests of the BinBitset class.
+    """
+
+    def test_bitset_operations(self):
+        """ Tests that operations on bitsets give the same results as on boolean masks, for sizes which do and don't
+            fill the last byte.
+        """
+
+        rng = np.random.default_rng(seed=8613)
+
+        for num_objects in (0, 1, 8, 13, 1000):
+
+            l_canonical_ids = get_canonical_ids(rng.choice(10 * num_objects + 1, num_objects, replace=False))
+
+            l_mask_1 = rng.random(num_objects) < 0.5
+            l_mask_2 = rng.random(num_objects) < 0.3
+
+            bitset_1 = BinBitset.from_mask(l_mask_1, l_canonical_ids)
+            bitset_2 = BinBitset.from_ids(l_canonical_ids[l_mask_2], l_canonical_ids)
+
+            assert bitset_1.nbytes == (num_objects + 7) // 8
+
+            assert np.array_equal(bitset_1.to_mask(), l_mask_1)
+            assert np.array_equal(bitset_2.to_ids(), l_canonical_ids[l_mask_2])
+
+            assert np.array_equal((bitset_1 & bitset_2).to_mask(), l_mask_1 & l_mask_2)
+            assert np.array_equal((bitset_1 | bitset_2).to_mask(), l_mask_1 | l_mask_2)
+            assert np.array_equal((~bitset_1).to_mask(), ~l_mask_1)
+
+            assert bitset_1.count() == l_mask_1.sum()
+            assert (~bitset_1).count() == num_objects - l_mask_1.sum()
+
+    def test_from_ids(self):
+        """ Tests that IDs not in the canonical IDs are ignored when making a bitset, and that bitsets aligned to
+            different canonical IDs can't be combined.
+        """
+
+        l_canonical_ids = get_canonical_ids([8, 3, 5, 3, 1])
+        assert np.array_equal(l_canonical_ids, [1, 3, 5, 8])
+
+        bitset = BinBitset.from_ids([5, 1, 7], l_canonical_ids)
+        assert np.array_equal(bitset.to_ids(), [1, 5])
+
+        assert BinBitset.from_ids([], l_canonical_ids).count() == 0
+
+        # Equal canonical IDs which aren't the same object are allowed, but not different ones
+        assert (bitset & BinBitset.from_ids([1], l_canonical_ids.copy())).count() == 1
+        with pytest.raises(ValueError):
+            _ = bitset & BinBitset.from_ids([1], np.array([1, 3, 5, 9]))
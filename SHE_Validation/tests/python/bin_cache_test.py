@@ -0,0 +1,116 @@
+"""
+:file: tests/python/bin_cache_test.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Unit tests of the bin membership cache
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import gc
+
+import numpy as np
+from astropy.table import Table
+
+from SHE_Validation.binning.bin_cache import BinMembershipCache, get_bin_membership_key, get_ids_key
+
+
+class TestBinCache:
+    """ Unit tests of the BinMembershipCache class and functions for making keys for it.
+    """
+
+    @staticmethod
+    def _get_key(t: Table, bin_limits=(0., 1., 2.)):
+        return get_bin_membership_key(bin_constraint_type=BinMembershipCache,
+                                      bin_parameter="snr",
+                                      full_bin_limits=bin_limits,
+                                      l_tables=[t, None])
+
+    def test_get_and_put(self):
+        """ Tests storing and retrieving values from the cache, and the hit and miss counters.
+        """
+
+        t = Table({"ID": np.arange(10)})
+        cache = BinMembershipCache()
+
+        key = self._get_key(t)
+        assert cache.get(key) is None
+
+        l_l_binned_ids = [np.arange(5), np.arange(5, 10)]
+        cache.put(key, l_l_binned_ids, l_tables=[t])
+
+        l_l_cached_ids = cache.get(self._get_key(t))
+        assert l_l_cached_ids == l_l_binned_ids
+        assert cache.get(self._get_key(t, bin_limits=(0., 1., 3.))) is None
+
+        assert cache.get_stats() == {"num_hits": 1,
+                                     "num_misses": 2,
+                                     "num_evictions": 0,
+                                     "num_entries": 1,
+                                     "total_bytes": l_l_binned_ids[0].nbytes + l_l_binned_ids[1].nbytes, }
+
+        cache.reset_stats()
+        assert cache.num_hits == 0 and cache.num_misses == 0
+
+    def test_invalidation(self):
+        """ Tests that entries aren't used once a column is added to a table, and are discarded when the table is
+            deleted.
+        """
+
+        t = Table({"ID": np.arange(10)})
+        cache = BinMembershipCache()
+
+        cache.put(self._get_key(t), [np.arange(10)], l_tables=[t])
+        assert self._get_key(t) in cache
+
+        t["SNR"] = np.ones(10)
+        assert self._get_key(t) not in cache
+
+        del t
+        gc.collect()
+        assert len(cache) == 0
+        assert cache.total_bytes == 0
+
+    def test_eviction(self):
+        """ Tests that the least-recently-used entries are evicted to stay within the memory bound.
+        """
+
+        l_ids = np.arange(100, dtype=np.int64)
+        cache = BinMembershipCache(max_bytes=2 * l_ids.nbytes)
+
+        cache.put("a", [l_ids])
+        cache.put("b", [l_ids])
+        assert cache.get("a") is not None
+
+        cache.put("c", [l_ids])
+
+        assert "a" in cache
+        assert "b" not in cache
+        assert "c" in cache
+        assert cache.num_evictions == 1
+        assert cache.total_bytes <= cache.max_bytes
+
+        # Entries larger than the bound shouldn't be stored at all
+        cache.put("d", [np.arange(1000)])
+        assert "d" not in cache
+
+    def test_get_ids_key(self):
+        """ Tests that keys for lists of IDs depend on their contents only.
+        """
+
+        assert get_ids_key(None) is None
+        assert get_ids_key([1, 2, 3]) == get_ids_key(np.array([1, 2, 3]))
+        assert get_ids_key([1, 2, 3]) != get_ids_key([1, 2, 4])
@@ -26,23 +26,35 @@ from math import ceil
 from typing import Dict
 
 import numpy as np
-from astropy.table import Column, Row, Table
+import pytest
+from astropy.table import Column, MaskedColumn, Row, Table, vstack
 
 from SHE_PPT.constants.classes import ShearEstimationMethods
 from SHE_PPT.constants.test_data import MER_FINAL_CATALOG_TABLE_FILENAME
+from SHE_PPT.file_io import TableLoader
 from SHE_PPT.table_formats.mer_final_catalog import tf as MFC_TF
 from SHE_PPT.table_formats.she_lensmc_measurements import tf as LMC_TF
 from SHE_PPT.table_utility import is_in_format
 from SHE_PPT.utility import is_nan_or_masked
-from SHE_Validation.binning.bin_constraints import (BinParameterBinConstraint, FitclassZeroBinConstraint,
-                                                    FitflagsBinConstraint, HeteroBinConstraint, MultiBinConstraint,
-                                                    get_ids_for_bins, get_ids_for_test_cases, get_table_of_ids, )
-from SHE_Validation.binning.bin_data import (TF as BIN_TF, add_bg_column, add_colour_column, add_epoch_column,
-                                             add_size_column, add_snr_column, )
-from SHE_Validation.binning.utility import (get_auto_bin_limits_from_data,
+from SHE_Validation.binning import bin_constraints
+from SHE_Validation.binning.bin_cache import get_bin_membership_cache
+from SHE_Validation.binning.bin_constraints import (BinAssignmentEngine, BinConstraintPlan, BinParameterBinConstraint,
+                                                    BinnedMultiTableLoader, BitFlagsBinPredicate,
+                                                    FitclassZeroBinConstraint,
+                                                    FitflagsBinConstraint, RangeBinPredicate, ValueBinPredicate,
+                                                    GoodBinnedGalaxyMeasurementHBC, GoodBinnedMeasurementHBC,
+                                                    HeteroBinConstraint,
+                                                    MultiBinConstraint, VisDetBinParameterBinConstraint,
+                                                    get_bitsets_for_test_cases, get_ids_for_bins,
+                                                    get_ids_for_test_cases, get_table_of_ids, )
+from SHE_Validation.binning.bin_data import (BG_STAMP_SIZE, TF as BIN_TF, add_bg_column, add_colour_column,
+                                             add_epoch_column, add_size_column, add_snr_column, get_mean_bg_levels, )
+from SHE_Validation.binning.quantile_sketch import QuantileSketch
+from SHE_Validation.binning.utility import (get_auto_bin_limits_from_data, get_auto_bin_limits_from_sketch,
                                             get_auto_bin_limits_from_table, )
 from SHE_Validation.constants.default_config import STR_AUTO_BIN_LIMITS_HEAD, TOT_BIN_LIMITS
 from SHE_Validation.constants.test_info import BinParameters, NON_GLOBAL_BIN_PARAMETERS, TestCaseInfo
+from SHE_Validation.table_utility import read_memmapped_table
 from SHE_Validation.test_info_utility import make_test_case_info_for_bins
 from SHE_Validation.testing.mock_data import MockBinTableGenerator, TEST_L_TOT
 from SHE_Validation.testing.utility import SheValTestCase
@@ -245,6 +257,91 @@ class TestBinConstraints:
         # noinspection PyTypeChecker
         assert np.all(ids_in_bin % 12 == self.ID_OFFSET % 12)
 
+        # Check that the IDs are output sorted, and match those from intersecting sets of IDs
+        assert np.all(np.diff(ids_in_bin) > 0)
+        s_ids_in_all = set.intersection(*[set(bin_constraint.get_ids_in_bin(t).tolist()) for bin_constraint, t in
+                                          zip(full_bin_constraint.l_bin_constraints,
+                                              [self.t_mfc, self.t_lmc, self.t_lmc])])
+        assert ids_in_bin.tolist() == sorted(s_ids_in_all)
+
+    def test_compile(self, monkeypatch):
+        """ Tests compiling bin constraints into plans, and that these give the same results as the constraints.
+        """
+
+        bin_limits = self.BASE_BIN_LIMITS + self.D_PAR_OFFSETS[BinParameters.SNR]
+        bin_constraint = MultiBinConstraint(l_bin_constraints=[
+            BinParameterBinConstraint(bin_parameter=BinParameters.SNR, bin_limits=bin_limits),
+            FitflagsBinConstraint(method=ShearEstimationMethods.LENSMC)])
+
+        # Compile against a table with both the bin data and fit flags, so all columns can be resolved
+        t = self.t_mfc.copy()
+        t[LMC_TF.fit_flags] = self.t_lmc[LMC_TF.fit_flags]
+
+        plan = bin_constraint.compile(t)
+
+        assert plan.l_required_colnames == (BIN_TF.snr, LMC_TF.fit_flags)
+        assert len(plan.l_binned_predicates) == 1
+        assert plan.is_compatible(t)
+        assert not plan.is_compatible(self.t_lmc)
+
+        assert np.array_equal(plan.is_in_bin(t), bin_constraint.is_in_bin(t))
+        assert bool(plan.is_in_bin(t[0])) == bool(bin_constraint.is_in_bin(t)[0])
+
+        # Evaluating the bin constraint shouldn't change it
+        assert bin_constraint.l_bin_constraints[0].bin_colname == BIN_TF.snr
+
+        # Check that re-targeting the plan to other bin limits gives the same plan as compiling for those limits
+        other_bin_limits = bin_limits + self.NUM_ROWS_IN_BIN / 2
+        other_bin_constraint = MultiBinConstraint(l_bin_constraints=[
+            BinParameterBinConstraint(bin_parameter=BinParameters.SNR, bin_limits=other_bin_limits),
+            FitflagsBinConstraint(method=ShearEstimationMethods.LENSMC)])
+
+        other_plan = plan.with_bin_limits(other_bin_limits)
+        assert other_plan == other_bin_constraint.compile(t)
+        assert np.array_equal(other_plan.is_in_bin(t), other_bin_constraint.is_in_bin(t))
+
+        # Check that plans are cached, and shared with new bin constraints which differ only in their bin limits, so
+        # the bin data column isn't resolved again
+        def fail_to_get_bin_colname(*_args, **_kwargs):
+            raise AssertionError("Bin constraint was compiled again.")
+
+        monkeypatch.setattr(BinParameterBinConstraint, "_get_bin_colname", fail_to_get_bin_colname)
+
+        third_bin_limits = bin_limits - self.NUM_ROWS_IN_BIN / 2
+        third_bin_constraint = MultiBinConstraint(l_bin_constraints=[
+            BinParameterBinConstraint(bin_parameter=BinParameters.SNR, bin_limits=third_bin_limits),
+            FitflagsBinConstraint(method=ShearEstimationMethods.LENSMC)])
+
+        assert bin_constraint.compile(t) == plan
+        assert third_bin_constraint.compile(t) == plan.with_bin_limits(third_bin_limits)
+
+    def test_plan_chunked_evaluation(self):
+        """ Tests that evaluating a plan on a table in chunks gives the same result as evaluating each of its
+            predicates on the whole table, including for NaN and masked values.
+        """
+
+        rng = np.random.default_rng(seed=3391)
+        num_rows = 1000
+
+        t = Table({"A": rng.normal(size=num_rows),
+                   "B": MaskedColumn(rng.normal(size=num_rows), mask=rng.random(num_rows) < 0.2),
+                   "FLAGS": rng.integers(0, 16, num_rows),
+                   "CLASS": rng.integers(0, 3, num_rows), })
+        t["A"][::7] = np.nan
+
+        plan = BinConstraintPlan((RangeBinPredicate(colname="A", bin_limits=(-1., 1.), include_max=True),
+                                  RangeBinPredicate(colname="B", bin_limits=(-0.5, 2.), include_min=False),
+                                  BitFlagsBinPredicate(colname="FLAGS", bit_flags=0b1001, invert=True),
+                                  ValueBinPredicate(colname="CLASS", value=0, invert=True),
+                                  RangeBinPredicate(colname=None, bin_limits=(0., 1.)),))
+
+        l_ex_is_row_in_bin = np.logical_and.reduce([np.asarray(predicate.is_in_bin(t), dtype=bool)
+                                                    for predicate in plan.l_predicates])
+        assert 0 < l_ex_is_row_in_bin.sum() < num_rows
+
+        for chunk_size in (1, 10, 333, num_rows, 2 * num_rows):
+            assert np.array_equal(plan.get_l_is_row_in_bin(t, chunk_size=chunk_size), l_ex_is_row_in_bin)
+
     def test_get_ids_for_bins(self):
         """ Tests the get_ids_for_bins function.
         """
@@ -317,6 +414,159 @@ class TestBinConstraints:
                 assert len(l_ids) >= min_num_per_bin
                 assert len(l_ids) <= max_num_per_bin
 
+    def test_bin_assignment_engine(self):
+        """ Tests that the BinAssignmentEngine gives the same IDs in each bin as applying a bin constraint to each bin
+            in turn.
+        """
+
+        l_full_ids = self.t_mfc[ID_COLNAME][::2]
+
+        bin_assignment_engine = BinAssignmentEngine(l_full_ids=l_full_ids)
+
+        for bin_constraint_type in (BinParameterBinConstraint, VisDetBinParameterBinConstraint,
+                                    GoodBinnedMeasurementHBC):
+            for bin_parameter in BinParameters:
+
+                full_bin_limits = self.d_l_bin_limits[bin_parameter]
+
+                l_l_binned_ids = bin_assignment_engine.get_l_l_binned_ids(bin_constraint_type=bin_constraint_type,
+                                                                          bin_parameter=bin_parameter,
+                                                                          full_bin_limits=full_bin_limits,
+                                                                          detections_table=self.t_mfc,
+                                                                          measurements_table=self.t_lmc,
+                                                                          method=ShearEstimationMethods.LENSMC)
+
+                assert len(l_l_binned_ids) == len(full_bin_limits) - 1
+
+                for bin_index, l_binned_ids in enumerate(l_l_binned_ids):
+
+                    bin_limits = full_bin_limits[bin_index:bin_index + 2]
+
+                    if issubclass(bin_constraint_type, HeteroBinConstraint):
+                        bin_constraint = bin_constraint_type(method=ShearEstimationMethods.LENSMC,
+                                                             bin_parameter=bin_parameter,
+                                                             bin_limits=bin_limits)
+                        l_ex_binned_ids = bin_constraint.get_ids_in_bin([self.t_mfc, self.t_lmc],
+                                                                        l_full_ids=l_full_ids)
+                    else:
+                        bin_constraint = bin_constraint_type(bin_parameter=bin_parameter,
+                                                             bin_limits=bin_limits)
+                        l_ex_binned_ids = bin_constraint.get_ids_in_bin(self.t_mfc, l_full_ids=l_full_ids)
+
+                    assert np.array_equal(l_binned_ids, l_ex_binned_ids)
+
+    def test_bin_assignment_engine_included_limits(self):
+        """ Tests that the BinAssignmentEngine respects which limits are included in bins, for values exactly at the
+            bin limits.
+        """
+
+        full_bin_limits = [0., 1., 1., 2., 3.]
+
+        l_values = np.array([-1., 0., 0.5, 1., 1.5, 2., 2.5, 3., 4., np.nan])
+        t = Table({ID_COLNAME: np.arange(len(l_values)),
+                   BIN_TF.snr: MaskedColumn(l_values, mask=np.arange(len(l_values)) == 4)})
+
+        class MaxIncludedBinConstraint(BinParameterBinConstraint):
+            include_min = False
+            include_max = True
+
+        class NeitherIncludedBinConstraint(BinParameterBinConstraint):
+            include_min = False
+            include_max = False
+
+        class BothIncludedBinConstraint(BinParameterBinConstraint):
+            include_min = True
+            include_max = True
+
+        d_l_l_ex_binned_ids = {BinParameterBinConstraint: [[1, 2], [], [3], [5, 6]],
+                               MaxIncludedBinConstraint: [[2, 3], [], [5], [6, 7]],
+                               NeitherIncludedBinConstraint: [[2], [], [], [6]]}
+
+        for bin_constraint_type, l_l_ex_binned_ids in d_l_l_ex_binned_ids.items():
+
+            l_l_binned_ids = BinAssignmentEngine().get_l_l_binned_ids(bin_constraint_type=bin_constraint_type,
+                                                                      bin_parameter=BinParameters.SNR,
+                                                                      full_bin_limits=full_bin_limits,
+                                                                      detections_table=t)
+
+            for bin_index, (l_binned_ids, l_ex_binned_ids) in enumerate(zip(l_l_binned_ids, l_l_ex_binned_ids)):
+                bin_constraint = bin_constraint_type(bin_parameter=BinParameters.SNR,
+                                                     bin_limits=full_bin_limits[bin_index:bin_index + 2])
+                assert np.array_equal(l_binned_ids, l_ex_binned_ids)
+                assert np.array_equal(l_binned_ids, bin_constraint.get_ids_in_bin(t))
+
+        # Values at limits between bins are in two bins if both limits are included, so they can't be assigned to
+        # bins all at once
+        assert BinAssignmentEngine().get_l_l_binned_ids(bin_constraint_type=BothIncludedBinConstraint,
+                                                        bin_parameter=BinParameters.SNR,
+                                                        full_bin_limits=full_bin_limits,
+                                                        detections_table=t) is None
+
+    def test_get_bitsets_for_test_cases(self):
+        """ Tests that get_bitsets_for_test_cases gives bitsets of the same objects as get_ids_for_test_cases.
+        """
+
+        base_test_case_info = TestCaseInfo(base_test_case_id="MOCK-ID",
+                                           base_description="mock description",
+                                           method=ShearEstimationMethods.LENSMC)
+
+        l_test_case_info = make_test_case_info_for_bins(base_test_case_info)
+
+        for bin_constraint_type in (BinParameterBinConstraint, GoodBinnedMeasurementHBC,
+                                    GoodBinnedGalaxyMeasurementHBC):
+
+            d_l_l_ids = get_ids_for_test_cases(l_test_case_info=l_test_case_info,
+                                               d_bin_limits=self.d_l_bin_limits,
+                                               detections_table=self.t_mfc,
+                                               d_measurements_tables={ShearEstimationMethods.LENSMC: self.t_lmc},
+                                               bin_constraint_type=bin_constraint_type,
+                                               use_cache=False)
+
+            d_l_bitsets = get_bitsets_for_test_cases(l_test_case_info=l_test_case_info,
+                                                     d_bin_limits=self.d_l_bin_limits,
+                                                     detections_table=self.t_mfc,
+                                                     d_measurements_tables={ShearEstimationMethods.LENSMC: self.t_lmc},
+                                                     bin_constraint_type=bin_constraint_type)
+
+            for test_case_info in l_test_case_info:
+                for l_ids, bitset in zip(d_l_l_ids[test_case_info.name], d_l_bitsets[test_case_info.name]):
+                    assert bitset.count() == len(l_ids)
+                    assert np.array_equal(bitset.to_ids(), np.sort(l_ids))
+
+    def test_get_ids_for_test_cases_cache(self):
+        """ Tests that get_ids_for_test_cases reuses bin memberships from the cache when test cases share bins.
+        """
+
+        base_test_case_info = TestCaseInfo(base_test_case_id="MOCK-ID",
+                                           base_description="mock description",
+                                           method=ShearEstimationMethods.LENSMC)
+
+        l_test_case_info = make_test_case_info_for_bins(base_test_case_info)
+
+        bin_membership_cache = get_bin_membership_cache()
+        bin_membership_cache.clear()
+        bin_membership_cache.reset_stats()
+
+        d_l_l_ids = get_ids_for_test_cases(l_test_case_info=l_test_case_info,
+                                           d_bin_limits=self.d_l_bin_limits,
+                                           detections_table=self.t_mfc,
+                                           bin_constraint_type=BinParameterBinConstraint)
+
+        assert bin_membership_cache.num_hits == 0
+        assert bin_membership_cache.num_misses == len(l_test_case_info)
+
+        # Calling again should use the cache for every test case, and give the same results
+        d_l_l_cached_ids = get_ids_for_test_cases(l_test_case_info=l_test_case_info,
+                                                  d_bin_limits=self.d_l_bin_limits,
+                                                  detections_table=self.t_mfc,
+                                                  bin_constraint_type=BinParameterBinConstraint)
+
+        assert bin_membership_cache.num_hits == len(l_test_case_info)
+
+        for test_case_info in l_test_case_info:
+            for l_ids, l_cached_ids in zip(d_l_l_ids[test_case_info.name], d_l_l_cached_ids[test_case_info.name]):
+                assert np.array_equal(l_ids, l_cached_ids)
+
     def test_get_table_of_ids(self):
         """ Unit test for the get_table_of_ids function.
         """
@@ -330,6 +580,22 @@ class TestBinConstraints:
         assert isinstance(get_table_of_ids(self.t_mfc, one_id_in), Row)
         assert len(get_table_of_ids(self.t_mfc, all_ids_in)) == 2
         assert len(get_table_of_ids(self.t_mfc, some_ids_in)) == 2
+        assert isinstance(get_table_of_ids(self.t_mfc, [self.ID_OFFSET - 1, self.ID_OFFSET]), Row)
+        assert len(get_table_of_ids(self.t_mfc, [self.ID_OFFSET - 1])) == 0
+
+        # Check that rows are returned in the order of the requested IDs, skipping any missing
+        l_ids = [self.ID_OFFSET + 50, self.ID_OFFSET - 1, self.ID_OFFSET + 3, self.ID_OFFSET + 99,
+                 self.ID_OFFSET + self.TABLE_SIZE]
+        assert np.all(get_table_of_ids(self.t_mfc, l_ids)[ID_COLNAME] == [l_ids[0], l_ids[2], l_ids[3]])
+
+        # Check that all rows are returned for IDs which appear more than once in the table, as with t.loc
+        t_dup = vstack([self.t_mfc[:5], self.t_mfc[:5]])
+        l_ids = [self.ID_OFFSET + 3, self.ID_OFFSET + 1]
+        t_dup_of_ids = get_table_of_ids(t_dup, l_ids)
+        assert np.all(t_dup_of_ids[ID_COLNAME] == [l_ids[0], l_ids[0], l_ids[1], l_ids[1]])
+
+        t_dup.add_index(ID_COLNAME)
+        assert np.all(t_dup_of_ids[ID_COLNAME] == t_dup.loc[l_ids][ID_COLNAME])
 
 
 class TestBinData(SheValTestCase):
@@ -385,6 +651,39 @@ class TestBinData(SheValTestCase):
         add_epoch_column(mfc_t_copy, self.data_stack)
         assert np.allclose(mfc_t_copy[BIN_TF.epoch], 0.)
 
+    def test_add_column_for_missing_id(self):
+        """ Tests that adding a column of bin data from the data stack to a table with an object which isn't in the
+            detections catalogue raises a KeyError, as selecting it with `loc` would.
+        """
+
+        t = Table({MFC_TF.ID: [self.mfc_t[MFC_TF.ID][0], -1]})
+
+        with pytest.raises(KeyError):
+            add_size_column(t, self.data_stack)
+
+    def test_get_mean_bg_levels(self):
+        """ Tests that getting background levels for all objects at once gives the same result as extracting a stamp
+            for each object in turn.
+        """
+
+        l_object_ids = np.asarray(self.mfc_t[MFC_TF.ID])
+
+        # Check the default stamp size, and a larger one where stamps can extend off the edges of detectors
+        for stamp_size in (BG_STAMP_SIZE, 5):
+
+            l_mean_bg = get_mean_bg_levels(l_object_ids, self.data_stack, stamp_size=stamp_size)
+
+            for object_id, mean_bg in zip(l_object_ids, l_mean_bg):
+                stamp_stack = self.data_stack.extract_galaxy_stack(object_id, width=stamp_size,
+                                                                   extract_stacked_stamp=False)
+                l_ex_bg = [exp_image.background_map.mean() for exp_image in stamp_stack.exposures
+                           if exp_image is not None]
+                ex_mean_bg = np.mean(l_ex_bg) if len(l_ex_bg) > 0 else -99
+                assert np.isclose(mean_bg, ex_mean_bg)
+
+        # Check that an empty list of objects is handled
+        assert len(get_mean_bg_levels(np.array([], dtype=int), self.data_stack)) == 0
+
     def test_get_auto_bin_limits_from_data(self):
         """ Unit test of determining bin limits automatically from a data array.
         """
@@ -413,6 +712,56 @@ class TestBinData(SheValTestCase):
                 l_data_in_bin = l_data[np.logical_and(l_data >= bin_lo, l_data < bin_hi)]
                 assert len(l_data_in_bin) == ex_n_per_bin
 
+    def test_get_auto_bin_limits_from_tied_data(self):
+        """ Unit test of determining bin limits automatically from data with many repeated values, where the quantiles
+            fall on data values and need to be shifted.
+        """
+
+        num_test_points = 1000
+
+        # Make some mock data with only a few distinct values, and some bad values
+        l_data = self.rng.integers(0, 8, size=num_test_points).astype(float)
+        l_data[::50] = np.nan
+
+        for num_quantiles in (3, 4, 10):
+            l_bin_limits = get_auto_bin_limits_from_data(l_data=l_data,
+                                                         num_quantiles=num_quantiles)
+
+            assert len(l_bin_limits) == num_quantiles + 1
+            assert np.isclose(l_bin_limits[0], -1e99)
+            assert np.isclose(l_bin_limits[-1], 1e99)
+
+            # None of the bin limits should be equal to a data value, so each value is unambiguously in one bin
+            l_good_data = l_data[~np.isnan(l_data)]
+            assert not np.any(np.isin(l_bin_limits, l_good_data))
+
+            l_num_in_bin = [np.sum(np.logical_and(l_good_data >= l_bin_limits[bin_index],
+                                                  l_good_data < l_bin_limits[bin_index + 1]))
+                            for bin_index in range(num_quantiles)]
+            assert np.sum(l_num_in_bin) == len(l_good_data)
+
+    def test_get_auto_bin_limits_from_sketch(self):
+        """ Unit test of determining bin limits automatically from a sketch of the data.
+        """
+
+        l_data = self.rng.integers(0, 20, size=600).astype(float)
+
+        # An exact sketch, filled in parts, should give the same bin limits as the data it was filled with
+        sketch = QuantileSketch()
+        for l_chunk in np.array_split(l_data, 3):
+            sketch.update(l_chunk)
+
+        assert np.array_equal(get_auto_bin_limits_from_sketch(sketch, num_quantiles=5),
+                              get_auto_bin_limits_from_data(l_data, num_quantiles=5))
+
+        # A compacted sketch should give bin limits which split the data roughly evenly
+        l_data = self.rng.uniform(size=100000)
+        sketch = QuantileSketch(sketch_size=256)
+        sketch.update(l_data)
+
+        l_bin_limits = get_auto_bin_limits_from_sketch(sketch, num_quantiles=4)
+        assert np.allclose(l_bin_limits[1:-1], [0.25, 0.5, 0.75], atol=0.02)
+
     def test_get_auto_bin_limits_from_table(self):
         """ Unit test of determining bin limits automatically from a data table.
         """
@@ -450,3 +799,189 @@ class TestBinData(SheValTestCase):
 
         assert len(l_l_bin_ids[0]) == TEST_L_TOT // 2
         assert len(l_l_bin_ids[1]) == TEST_L_TOT // 2
+
+
+class TestBinnedMultiTableLoader(SheValTestCase):
+    """ Class to perform tests of loading binned data from multiple tables.
+    """
+
+    def test_load_tables(self):
+        """ Tests that loading only some columns, with or without multiple threads, gives the same results as stacking
+            the full tables, including masking NaN values.
+        """
+
+        rng = np.random.default_rng(seed=6017)
+
+        l_filenames = []
+        l_tables = []
+        for file_index, num_rows in enumerate((200, 0, 1, 500, 30)):
+            t = Table({ID_COLNAME: np.arange(num_rows) + 1000 * file_index,
+                       BIN_TF.snr: rng.uniform(0, 10, num_rows),
+                       "G1": rng.normal(size=num_rows),
+                       "UNUSED": rng.normal(size=(num_rows, 3)), })
+
+            # Include NaN values in some tables, which are masked when the full tables are read
+            if file_index % 2 == 0:
+                t["G1"][rng.random(num_rows) < 0.1] = np.nan
+
+            filename = f"binned_table_{file_index}.fits"
+            t.write(os.path.join(self.workdir, filename), overwrite=True)
+            l_filenames.append(filename)
+            l_tables.append(Table.read(os.path.join(self.workdir, filename)))
+
+        t_all = vstack(l_tables)
+        assert isinstance(t_all["G1"], MaskedColumn)
+        l_ids = [3, 2000, 3010, 99999]
+        bin_constraint = BinParameterBinConstraint(bin_parameter=BinParameters.SNR, bin_limits=(2., 5.))
+        l_ex_is_in_bin = np.logical_and(t_all[BIN_TF.snr] >= 2., t_all[BIN_TF.snr] < 5.)
+
+        for num_threads, max_files_in_flight, max_bytes_in_flight in ((1, None, None),
+                                                                      (3, None, None),
+                                                                      (3, 1, 1024 ** 3),
+                                                                      (3, None, 1)):
+
+            loader = BinnedMultiTableLoader(l_filenames=l_filenames,
+                                            workdir=self.workdir,
+                                            file_loader_type=TableLoader,
+                                            id_colname=ID_COLNAME,
+                                            l_colnames=["G1"],
+                                            num_threads=num_threads,
+                                            max_files_in_flight=max_files_in_flight,
+                                            max_bytes_in_flight=max_bytes_in_flight)
+
+            t = loader.get_table_for_all()
+            assert t.colnames == [ID_COLNAME, "G1"]
+            assert np.all(t[ID_COLNAME] == t_all[ID_COLNAME])
+            assert np.all(t["G1"] == t_all["G1"])
+            assert np.all(t["G1"].mask == t_all["G1"].mask)
+
+            t = loader.get_table_for_ids(l_ids)
+            assert np.all(t[ID_COLNAME] == [3, 2000, 3010])
+
+            # The columns needed for the bin constraint should be loaded as well
+            t = loader.get_table_for_bin_constraint(bin_constraint)
+            assert t.colnames == [ID_COLNAME, "G1", BIN_TF.snr]
+            assert np.all(t[ID_COLNAME] == t_all[ID_COLNAME][l_ex_is_in_bin])
+            assert np.all(t["G1"] == t_all["G1"][l_ex_is_in_bin])
+            assert np.all(t["G1"].mask == t_all["G1"].mask[l_ex_is_in_bin])
+
+    def test_load_full_tables(self):
+        """ Tests that loading the full tables, with or without multiple threads, gives the same results as stacking
+            them, without reading the files' headers or checking their sizes unless a limit on size is set.
+        """
+
+        rng = np.random.default_rng(seed=2318)
+
+        l_filenames = []
+        l_tables = []
+        for file_index, num_rows in enumerate((50, 0, 120)):
+            t = Table({ID_COLNAME: np.arange(num_rows) + 1000 * file_index,
+                       BIN_TF.snr: rng.uniform(0, 10, num_rows), })
+            filename = f"full_table_{file_index}.fits"
+            t.write(os.path.join(self.workdir, filename), overwrite=True)
+            l_filenames.append(filename)
+            l_tables.append(Table.read(os.path.join(self.workdir, filename)))
+
+        t_all = vstack(l_tables)
+        s_qualified_filenames = {os.path.join(self.workdir, filename) for filename in l_filenames}
+
+        l_checked_filenames = []
+
+        def getval_and_record(qualified_filename, *args, **kwargs):
+            if qualified_filename in s_qualified_filenames:
+                l_checked_filenames.append(qualified_filename)
+            return fits_getval(qualified_filename, *args, **kwargs)
+
+        def getsize_and_record(qualified_filename):
+            if qualified_filename in s_qualified_filenames:
+                l_checked_filenames.append(qualified_filename)
+            return os_getsize(qualified_filename)
+
+        fits_getval = bin_constraints.fits.getval
+        os_getsize = os.path.getsize
+
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(bin_constraints.fits, "getval", getval_and_record)
+            mp.setattr(os.path, "getsize", getsize_and_record)
+
+            for num_threads in (1, 3):
+
+                loader = BinnedMultiTableLoader(l_filenames=l_filenames,
+                                                workdir=self.workdir,
+                                                file_loader_type=TableLoader,
+                                                id_colname=ID_COLNAME,
+                                                num_threads=num_threads)
+
+                t = loader.get_table_for_all()
+                assert t.colnames == t_all.colnames
+                assert np.all(t[ID_COLNAME] == t_all[ID_COLNAME])
+                assert np.all(t[BIN_TF.snr] == t_all[BIN_TF.snr])
+
+            assert l_checked_filenames == []
+
+            # The sizes of the files should be checked if they're limited
+            loader = BinnedMultiTableLoader(l_filenames=l_filenames,
+                                            workdir=self.workdir,
+                                            file_loader_type=TableLoader,
+                                            id_colname=ID_COLNAME,
+                                            num_threads=3,
+                                            max_bytes_in_flight=1)
+
+            t = loader.get_table_for_all()
+            assert np.all(t[ID_COLNAME] == t_all[ID_COLNAME])
+
+            assert sorted(l_checked_filenames) == sorted(s_qualified_filenames)
+
+    def test_keep_open(self):
+        """ Tests that when loading only some columns, the files are kept open to be reused for other bin constraints
+            if desired, and are read again once closed.
+        """
+
+        rng = np.random.default_rng(seed=4470)
+
+        l_filenames = []
+        l_tables = []
+        for file_index in range(3):
+            t = Table({ID_COLNAME: np.arange(100) + 1000 * file_index,
+                       BIN_TF.snr: rng.uniform(0, 10, 100),
+                       "G1": rng.normal(size=100), })
+            filename = f"kept_open_table_{file_index}.fits"
+            t.write(os.path.join(self.workdir, filename), overwrite=True)
+            l_filenames.append(filename)
+            l_tables.append(t)
+
+        t_all = vstack(l_tables)
+
+        l_read_filenames = []
+
+        def read_and_record_memmapped_table(qualified_filename, *args, **kwargs):
+            l_read_filenames.append(qualified_filename)
+            return read_memmapped_table(qualified_filename, *args, **kwargs)
+
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(bin_constraints, "read_memmapped_table", read_and_record_memmapped_table)
+
+            loader = BinnedMultiTableLoader(l_filenames=l_filenames,
+                                            workdir=self.workdir,
+                                            file_loader_type=TableLoader,
+                                            id_colname=ID_COLNAME,
+                                            l_colnames=["G1"])
+
+            # Each file should only be read the first time, when loading for each bin
+            for bin_limits in ((0., 5.), (5., 10.)):
+                bin_constraint = BinParameterBinConstraint(bin_parameter=BinParameters.SNR, bin_limits=bin_limits)
+                t = loader.get_table_for_bin_constraint(bin_constraint, keep_open=True)
+
+                l_ex_is_in_bin = np.logical_and(t_all[BIN_TF.snr] >= bin_limits[0],
+                                                t_all[BIN_TF.snr] < bin_limits[1])
+                assert np.all(t[ID_COLNAME] == t_all[ID_COLNAME][l_ex_is_in_bin])
+                assert np.all(t["G1"] == t_all["G1"][l_ex_is_in_bin])
+
+            assert l_read_filenames == [os.path.join(self.workdir, filename) for filename in l_filenames]
+
+            # Once closed, the files should be read again each time if not kept open
+            loader.close_all()
+            loader.get_table_for_bin_constraint(bin_constraint, keep_open=False)
+            loader.get_table_for_bin_constraint(bin_constraint, keep_open=False)
+
+            assert len(l_read_filenames) == 3 * len(l_filenames)
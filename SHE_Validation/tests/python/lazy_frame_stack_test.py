@@ -0,0 +1,110 @@
+"""
+:file: tests/python/lazy_frame_stack_test.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Unit tests of the lazy_frame_stack.py module
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from astropy.table import Table
+
+from SHE_PPT.table_formats.mer_final_catalog import tf as MFC_TF
+from SHE_Validation.binning.bin_data import BIN_TF, add_binning_data
+from SHE_Validation.constants.test_info import BinParameters
+from SHE_Validation.lazy_frame_stack import LazySHEFrameStack
+
+NUM_OBJECTS = 10
+
+
+class RecordingFrameStack:
+    """ Frame stack type which records the arguments it's read with, and has a mock detections catalogue.
+    """
+
+    l_d_read_kwargs: List[Dict[str, Any]] = []
+
+    detections_catalogue: Table
+    has_exposures: bool
+
+    def __init__(self, exposure_listfile_filename: Optional[str]):
+        self.detections_catalogue = Table({MFC_TF.ID: np.arange(NUM_OBJECTS),
+                                           MFC_TF.FLUX_VIS_APER: np.full(NUM_OBJECTS, 10.),
+                                           MFC_TF.FLUXERR_VIS_APER: np.full(NUM_OBJECTS, 2.),
+                                           MFC_TF.FLUX_NIR_STACK_APER: np.full(NUM_OBJECTS, 1.),
+                                           MFC_TF.SEGMENTATION_AREA: np.full(NUM_OBJECTS, 5.)})
+        self.has_exposures = exposure_listfile_filename is not None
+
+    @classmethod
+    def read(cls, **kwargs):
+        cls.l_d_read_kwargs.append(kwargs)
+        return cls(kwargs["exposure_listfile_filename"])
+
+
+class RecordingLazySHEFrameStack(LazySHEFrameStack):
+    """ LazySHEFrameStack which reads a RecordingFrameStack.
+    """
+    frame_stack_type = RecordingFrameStack
+
+
+class TestLazyFrameStack:
+    """ Unit tests of the LazySHEFrameStack class.
+    """
+
+    def setup_method(self):
+        RecordingFrameStack.l_d_read_kwargs.clear()
+
+    def test_detections_only(self):
+        """ Test that adding bin columns which only need the detections catalogue doesn't read exposures.
+        """
+
+        data_stack = RecordingLazySHEFrameStack(exposure_listfile_filename="exposures.json",
+                                                detections_listfile_filename="detections.json",
+                                                workdir=".")
+
+        t = Table({MFC_TF.ID: np.arange(NUM_OBJECTS)[::-1]})
+        add_binning_data(t, data_stack, l_bin_parameters=[BinParameters.SNR, BinParameters.COLOUR,
+                                                          BinParameters.SIZE, BinParameters.EPOCH])
+
+        assert not data_stack.is_fully_read
+        assert len(RecordingFrameStack.l_d_read_kwargs) == 1
+        assert RecordingFrameStack.l_d_read_kwargs[0] == {"exposure_listfile_filename": None,
+                                                          "detections_listfile_filename": "detections.json",
+                                                          "workdir": "."}
+
+        assert np.allclose(t[BIN_TF.snr], 5.)
+        assert np.allclose(t[BIN_TF.colour], 2.5)
+        assert BIN_TF.bg not in t.colnames
+
+    def test_full_read(self):
+        """ Test that requesting anything other than the detections catalogue reads in the full stack, once.
+        """
+
+        data_stack = RecordingLazySHEFrameStack(exposure_listfile_filename="exposures.json",
+                                                detections_listfile_filename="detections.json")
+
+        assert len(data_stack.detections_catalogue) == NUM_OBJECTS
+
+        assert data_stack.has_exposures
+        assert data_stack.is_fully_read
+        assert len(RecordingFrameStack.l_d_read_kwargs) == 2
+        assert RecordingFrameStack.l_d_read_kwargs[1]["exposure_listfile_filename"] == "exposures.json"
+
+        # Further requests should use the full stack, without reading anything else
+        assert data_stack.detections_catalogue is data_stack.full_stack.detections_catalogue
+        assert len(RecordingFrameStack.l_d_read_kwargs) == 2
@@ -0,0 +1,591 @@
+"""
+:file: tests/python/match_to_tu_test.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Unit tests of the match_to_tu.py module
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import os
+from typing import List
+
+import numpy as np
+import pytest
+from astropy.coordinates import SkyCoord
+from astropy.io import fits
+from astropy.table import MaskedColumn, Table, join, vstack
+
+from SHE_PPT.constants.misc import DATA_SUBDIR
+from SHE_PPT.constants.shear_estimation_methods import (D_SHEAR_ESTIMATION_METHOD_TUM_TABLE_FORMATS,
+                                                        ShearEstimationMethods, )
+from SHE_Validation import match_to_tu
+from SHE_Validation.match_to_tu import (SkyKDTree, UnionPositions, bucket_true_universe_sources, find_best_match,
+                                        find_best_match_kdtree, find_filtered_best_matches, get_filtered_best_match,
+                                        get_matched_table, match_tiles, select_true_universe_sources,
+                                        write_matched_catalog, )
+from SHE_Validation.table_utility import BinTableStream
+from SHE_Validation.testing.benchmarking import run_match_to_tu_benchmark
+from SHE_Validation.testing.utility import SheValTestCase
+from SHE_Validation.tiling import TilePlan
+from SHE_Validation.tu_catalog_index import TUCatalogIndex
+
+TU_CATALOG_FILENAME_TEMPLATE = "mock_tu_catalog_%i.fits"
+
+
+class TestMatchToTU(SheValTestCase):
+    """ Unit tests of functions used for matching to True Universe catalogs.
+    """
+
+    NUM_FILES = 4
+    NUM_SOURCES_PER_FILE = 500
+
+    RA_RANGE = np.array((10., 13.))
+    DEC_RANGE = np.array((-2., 0.))
+
+    NUM_OBJECTS = 2000
+    NUM_SOURCES = 5000
+    MATCH_THRESHOLD = 0.3 / 3600
+
+    l_catalog_filenames: List[str]
+    ra_limits: np.ndarray
+    dec_limits: np.ndarray
+
+    def post_setup(self):
+        """ Write out a set of mock TU catalogs, which spill over the edges of the region we'll match within.
+        """
+
+        rng = np.random.default_rng(seed=8451)
+
+        self.ra_limits = np.linspace(self.RA_RANGE[0], self.RA_RANGE[1], num=4, endpoint=True)
+        self.dec_limits = np.linspace(self.DEC_RANGE[0], self.DEC_RANGE[1], num=3, endpoint=True)
+
+        os.makedirs(os.path.join(self.workdir, DATA_SUBDIR), exist_ok=True)
+
+        self.l_catalog_filenames = []
+        for file_index in range(self.NUM_FILES):
+            l_ra = rng.uniform(self.RA_RANGE[0] - 0.5, self.RA_RANGE[1] + 0.5, self.NUM_SOURCES_PER_FILE)
+            l_dec = rng.uniform(self.DEC_RANGE[0] - 0.5, self.DEC_RANGE[1] + 0.5, self.NUM_SOURCES_PER_FILE)
+
+            # Put some sources exactly on tile boundaries, which should be excluded from all tiles
+            l_ra[:5] = self.ra_limits[1]
+            l_dec[5:10] = self.dec_limits[1]
+
+            l_source_ids = np.arange(self.NUM_SOURCES_PER_FILE) + file_index * self.NUM_SOURCES_PER_FILE
+
+            catalog = Table({"RA_MAG": l_ra,
+                             "DEC_MAG": l_dec,
+                             "SOURCE_ID": l_source_ids})
+
+            filename = os.path.join(DATA_SUBDIR, TU_CATALOG_FILENAME_TEMPLATE % file_index)
+            catalog.write(os.path.join(self.workdir, filename))
+            self.l_catalog_filenames.append(filename)
+
+    def test_bucket_true_universe_sources(self):
+        """ Test that reading all catalogs once and bucketing them into tiles gives the same sources as reading them
+            for each tile.
+        """
+
+        tile_plan = TilePlan.from_grid(self.ra_limits, self.dec_limits)
+        num_dec_tiles = len(self.dec_limits) - 1
+
+        d_tile_catalogs = bucket_true_universe_sources(catalog_filenames=self.l_catalog_filenames,
+                                                       tile_plan=tile_plan,
+                                                       path=self.workdir)
+
+        # Also bucket the sources using an index of their positions, which should give the same result
+        d_indexed_tile_catalogs = bucket_true_universe_sources(catalog_filenames=self.l_catalog_filenames,
+                                                               tile_plan=tile_plan,
+                                                               path=self.workdir,
+                                                               tu_index=TUCatalogIndex(os.path.join(self.workdir,
+                                                                                                    "tu_index")))
+
+        assert len(d_tile_catalogs) == (len(self.ra_limits) - 1) * (len(self.dec_limits) - 1)
+
+        for ra_i in range(len(self.ra_limits) - 1):
+            for dec_i in range(len(self.dec_limits) - 1):
+                ex_catalog = select_true_universe_sources(catalog_filenames=self.l_catalog_filenames,
+                                                          ra_range=self.ra_limits[ra_i:ra_i + 2],
+                                                          dec_range=self.dec_limits[dec_i:dec_i + 2],
+                                                          path=self.workdir)
+                tile_i = ra_i * num_dec_tiles + dec_i
+                tile_catalog = d_tile_catalogs[tile_i]
+
+                assert len(tile_catalog) > 0
+                assert np.all(tile_catalog["SOURCE_ID"] == ex_catalog["SOURCE_ID"])
+                assert np.all(d_indexed_tile_catalogs[tile_i]["SOURCE_ID"] == ex_catalog["SOURCE_ID"])
+
+    def test_get_tu_rows_in_wrapped_plan(self):
+        """ Test that sources are found only once with an index when a tile plan wraps around R.A. = 0, with a gap
+            between its bounding ranges smaller than a cell of the index.
+        """
+
+        num_sources = 200
+
+        rng = np.random.default_rng(seed=2753)
+        catalog = Table({"RA_MAG": rng.uniform(0., 1., num_sources),
+                         "DEC_MAG": rng.uniform(-0.5, 0.5, num_sources)})
+
+        qualified_filename = os.path.join(self.workdir, "mock_tu_catalog_wrapped.fits")
+        catalog.write(qualified_filename)
+
+        tile_plan = TilePlan(dec_limits=[-1., 1.], l_band_ra_ranges=[[(-0.5, 0.3), (0.4, 360.5)]])
+        l_bounding_ranges = tile_plan.get_bounding_ranges()
+        assert len(l_bounding_ranges) == 2
+        assert 0 < l_bounding_ranges[0][0][0] - l_bounding_ranges[1][0][1] < 0.25
+
+        with fits.open(qualified_filename, memmap=True) as hdulist:
+            l_rows, ra, dec = match_to_tu._get_tu_rows_ra_dec_in_plan(hdulist[1], qualified_filename, tile_plan,
+                                                                      tu_index=TUCatalogIndex(
+                                                                          os.path.join(self.workdir, "tu_index"),
+                                                                          cell_size=0.25))
+
+        assert np.all(l_rows == np.arange(num_sources))
+        assert np.all(ra == catalog["RA_MAG"])
+        assert np.all(dec == catalog["DEC_MAG"])
+
+    def test_select_true_universe_sources_columns(self):
+        """ Test that only the requested columns are read in, with the same data as reading in the full catalogs.
+        """
+
+        ra_range = self.ra_limits[0:2]
+        dec_range = self.dec_limits[0:2]
+
+        # Read in the catalogs in full and select the sources in the range, to compare against
+        l_ex_catalogs = []
+        for filename in self.l_catalog_filenames:
+            full_catalog = Table.read(os.path.join(self.workdir, filename))
+            l_in_range = ((full_catalog["RA_MAG"] > ra_range[0]) & (full_catalog["RA_MAG"] < ra_range[1]) &
+                          (full_catalog["DEC_MAG"] > dec_range[0]) & (full_catalog["DEC_MAG"] < dec_range[1]))
+            l_ex_catalogs.append(full_catalog[l_in_range])
+        ex_catalog = vstack(l_ex_catalogs)
+
+        catalog = select_true_universe_sources(catalog_filenames=self.l_catalog_filenames,
+                                               ra_range=ra_range,
+                                               dec_range=dec_range,
+                                               path=self.workdir,
+                                               excluded_columns=["DEC_MAG"])
+
+        assert catalog.colnames == ["RA_MAG", "SOURCE_ID"]
+        assert np.all(catalog["SOURCE_ID"] == ex_catalog["SOURCE_ID"])
+        assert np.all(catalog["RA_MAG"] == ex_catalog["RA_MAG"])
+
+        # Check that an explicit list of columns is respected
+        catalog = select_true_universe_sources(catalog_filenames=self.l_catalog_filenames,
+                                               ra_range=ra_range,
+                                               dec_range=dec_range,
+                                               path=self.workdir,
+                                               columns=["SOURCE_ID"])
+
+        assert catalog.colnames == ["SOURCE_ID"]
+        assert np.all(catalog["SOURCE_ID"] == ex_catalog["SOURCE_ID"])
+
+    def test_read_tu_rows(self):
+        """ Test that reading selected rows of a TU catalog gives the same metadata, column attributes, and masking
+            as reading in the full catalog and selecting the rows from it.
+        """
+
+        num_sources = 20
+
+        catalog = Table({"RA_MAG": np.linspace(10., 11., num_sources),
+                         "FLUX": np.linspace(1., 2., num_sources),
+                         "NAME": np.array(["src%i" % i for i in range(num_sources)]),
+                         "SOURCE_ID": MaskedColumn(np.arange(num_sources), mask=np.arange(num_sources) % 5 == 0)},
+                        meta={"EXTNAME": "TU_CAT", "TILEID": 17})
+        catalog["RA_MAG"].unit = "deg"
+        catalog["RA_MAG"].description = "Right ascension"
+        catalog["FLUX"].format = "%.3f"
+        catalog["FLUX"][[1, 4, 9]] = np.nan
+        catalog["NAME"][[2, 4]] = ""
+
+        qualified_filename = os.path.join(self.workdir, "mock_tu_catalog_attrs.fits")
+        catalog.write(qualified_filename)
+
+        l_rows = np.array([0, 1, 2, 4, 7, 10, 19])
+        ex_catalog = Table.read(qualified_filename)[l_rows]
+
+        with fits.open(qualified_filename, memmap=True, character_as_bytes=True) as hdulist:
+            rows_catalog = match_to_tu._read_tu_rows(hdulist[1], l_rows, excluded_columns=["FLUX"])
+
+        assert rows_catalog.colnames == ["RA_MAG", "NAME", "SOURCE_ID"]
+        assert rows_catalog.meta == ex_catalog.meta
+        assert rows_catalog.meta["TILEID"] == 17
+
+        for colname in rows_catalog.colnames:
+            col = rows_catalog[colname]
+            ex_col = ex_catalog[colname]
+            assert col.unit == ex_col.unit
+            assert col.description == ex_col.description
+            assert col.format == ex_col.format
+            assert col.dtype == ex_col.dtype
+            assert np.all(np.ma.getmaskarray(col) == np.ma.getmaskarray(ex_col))
+            assert np.all(col == ex_col)
+
+        assert np.all(np.ma.getmaskarray(rows_catalog["NAME"]) == np.isin(l_rows, [2, 4]))
+        assert np.all(np.ma.getmaskarray(rows_catalog["SOURCE_ID"]) == (l_rows % 5 == 0))
+
+        # Check that masked floats are masked too, when requested
+        with fits.open(qualified_filename, memmap=True, character_as_bytes=True) as hdulist:
+            rows_catalog = match_to_tu._read_tu_rows(hdulist[1], l_rows, columns=["FLUX"])
+
+        assert rows_catalog["FLUX"].format == ex_catalog["FLUX"].format
+        assert np.all(np.ma.getmaskarray(rows_catalog["FLUX"]) == np.isin(l_rows, [1, 4]))
+        assert np.all(np.ma.getmaskarray(rows_catalog["FLUX"]) ==
+                      np.ma.getmaskarray(ex_catalog["FLUX"]))
+
+    def test_find_best_match_kdtree(self):
+        """ Test that the KD-tree matcher gives the same filtered matches as the SkyCoord matcher.
+        """
+
+        rng = np.random.default_rng(seed=4512)
+
+        l_ra_tu = rng.uniform(self.RA_RANGE[0], self.RA_RANGE[0] + 0.1, self.NUM_SOURCES)
+        l_dec_tu = rng.uniform(self.DEC_RANGE[0], self.DEC_RANGE[0] + 0.1, self.NUM_SOURCES)
+
+        # Place each object near a random source, so that some but not all will be matched
+        l_source_index = rng.integers(0, self.NUM_SOURCES, self.NUM_OBJECTS)
+        l_ra_se = l_ra_tu[l_source_index] + rng.normal(0, self.MATCH_THRESHOLD / 2, self.NUM_OBJECTS)
+        l_dec_se = l_dec_tu[l_source_index] + rng.normal(0, self.MATCH_THRESHOLD / 2, self.NUM_OBJECTS)
+
+        ex_results = find_best_match(SkyCoord(ra=l_ra_se, dec=l_dec_se, unit="deg"),
+                                     SkyCoord(ra=l_ra_tu, dec=l_dec_tu, unit="deg"))
+        kdtree_results = find_best_match_kdtree(SkyKDTree(ra=l_ra_se, dec=l_dec_se),
+                                                SkyKDTree(ra=l_ra_tu, dec=l_dec_tu),
+                                                self.MATCH_THRESHOLD)
+
+        l_ex_best_tu_id, l_best_tu_id = [get_filtered_best_match(best_tu_distance=best_tu_distance,
+                                                                 best_distance=best_tu_distance,
+                                                                 other_distance=np.full(self.NUM_OBJECTS, np.inf),
+                                                                 best_tu_id=best_tu_id,
+                                                                 best_obj_id_from_tu=best_obj_id_from_tu,
+                                                                 in_range=np.ones(self.NUM_OBJECTS, dtype=bool),
+                                                                 match_threshold=self.MATCH_THRESHOLD,
+                                                                 prioritize=True)
+                                         for (best_obj_id_from_tu, best_tu_distance, best_tu_id)
+                                         in (ex_results, kdtree_results)]
+
+        assert np.any(l_ex_best_tu_id >= 0)
+        assert np.any(l_ex_best_tu_id < 0)
+        assert np.all(l_best_tu_id == l_ex_best_tu_id)
+
+        # Check that distances agree for all matches within the threshold
+        l_is_matched = l_best_tu_id >= 0
+        assert np.allclose(kdtree_results[1][l_is_matched], ex_results[1][l_is_matched], rtol=0, atol=1e-12)
+
+        # Check that an empty TU catalog is handled
+        l_best_obj_id_from_tu, l_best_tu_distance, l_best_tu_id = find_best_match_kdtree(
+            SkyKDTree(ra=l_ra_se, dec=l_dec_se), SkyKDTree(ra=[], dec=[]), self.MATCH_THRESHOLD)
+        assert len(l_best_obj_id_from_tu) == len(l_best_tu_distance) == len(l_best_tu_id) == 0
+
+    def test_union_positions(self):
+        """ Test that the union of objects across methods is deduplicated, with positions from the first method.
+        """
+
+        rng = np.random.default_rng(seed=1245)
+
+        l_ids = np.arange(self.NUM_OBJECTS)
+        l_ra = rng.uniform(self.RA_RANGE[0], self.RA_RANGE[1], self.NUM_OBJECTS)
+        l_dec = rng.uniform(self.DEC_RANGE[0], self.DEC_RANGE[1], self.NUM_OBJECTS)
+
+        # Give each method a shuffled, overlapping subset of the objects, with the second method's positions offset
+        # slightly so we can tell which was used
+        l_methods = list(ShearEstimationMethods)
+        first_method, second_method = l_methods[:2]
+
+        d_l_rows = {first_method: rng.permutation(self.NUM_OBJECTS)[:self.NUM_OBJECTS // 2],
+                    second_method: rng.permutation(self.NUM_OBJECTS)[:self.NUM_OBJECTS // 2]}
+        d_offset = {first_method: 0., second_method: 1.}
+
+        d_shear_tables = {method: None for method in l_methods}
+        for method, l_rows in d_l_rows.items():
+            sem_tf = D_SHEAR_ESTIMATION_METHOD_TUM_TABLE_FORMATS[method]
+            d_shear_tables[method] = Table({sem_tf.ID: l_ids[l_rows],
+                                            sem_tf.ra: l_ra[l_rows] + d_offset[method],
+                                            sem_tf.dec: l_dec[l_rows]})
+
+        union_positions = UnionPositions(d_shear_tables)
+
+        l_ex_ids = np.union1d(l_ids[d_l_rows[first_method]], l_ids[d_l_rows[second_method]])
+        assert np.all(union_positions.l_ids == l_ex_ids)
+        assert len(union_positions.kdtree) == len(union_positions) == len(l_ex_ids)
+
+        # Check that positions come from the first method where an object is present in both
+        l_in_first = np.isin(l_ex_ids, l_ids[d_l_rows[first_method]])
+        assert np.allclose(union_positions.ra[l_in_first], l_ra[l_ex_ids[l_in_first]])
+        assert np.allclose(union_positions.ra[~l_in_first], l_ra[l_ex_ids[~l_in_first]] + 1.)
+        assert np.allclose(union_positions.dec, l_dec[l_ex_ids])
+
+        # Check that we can find each method's rows in the union, and that IDs not in it aren't allowed
+        for method, l_rows in d_l_rows.items():
+            l_union_index = union_positions.get_indices(l_ids[l_rows])
+            assert np.all(union_positions.l_ids[l_union_index] == l_ids[l_rows])
+
+        with pytest.raises(ValueError):
+            union_positions.get_indices([l_ex_ids[0], self.NUM_OBJECTS])
+
+        # Check that the objects whose positions differ between methods are counted
+        num_in_both = len(np.intersect1d(d_l_rows[first_method], d_l_rows[second_method]))
+        assert 0 < num_in_both
+        assert union_positions.num_objects_with_differing_positions == num_in_both
+
+    def test_union_matches(self):
+        """ Test that matching the union of objects gives the same matches for each method's objects as matching each
+            method's table separately, when all methods have the same objects at the same positions.
+        """
+
+        rng = np.random.default_rng(seed=3307)
+
+        local_ra_range = np.array((self.RA_RANGE[0], self.RA_RANGE[0] + 0.1))
+        local_dec_range = np.array((self.DEC_RANGE[0], self.DEC_RANGE[0] + 0.1))
+
+        # Make mock TU galaxies and stars, with objects placed near random sources of both, some outside the range
+        d_tu_kdtrees = {}
+        l_ra_sources = []
+        l_dec_sources = []
+        for source_type in ("gal", "star"):
+            l_ra_tu = rng.uniform(local_ra_range[0] - 0.01, local_ra_range[1] + 0.01, self.NUM_SOURCES)
+            l_dec_tu = rng.uniform(local_dec_range[0] - 0.01, local_dec_range[1] + 0.01, self.NUM_SOURCES)
+            d_tu_kdtrees[source_type] = SkyKDTree(ra=l_ra_tu, dec=l_dec_tu)
+            l_ra_sources.append(l_ra_tu)
+            l_dec_sources.append(l_dec_tu)
+
+        l_source_index = rng.integers(0, 2 * self.NUM_SOURCES, self.NUM_OBJECTS)
+        l_ids = np.arange(self.NUM_OBJECTS)
+        l_ra = np.concatenate(l_ra_sources)[l_source_index] + rng.normal(0, self.MATCH_THRESHOLD, self.NUM_OBJECTS)
+        l_dec = np.concatenate(l_dec_sources)[l_source_index] + rng.normal(0, self.MATCH_THRESHOLD, self.NUM_OBJECTS)
+
+        # Give each method all objects, in a different order
+        d_shear_tables = {}
+        for method in ShearEstimationMethods:
+            sem_tf = D_SHEAR_ESTIMATION_METHOD_TUM_TABLE_FORMATS[method]
+            l_rows = rng.permutation(self.NUM_OBJECTS)
+            d_shear_tables[method] = Table({sem_tf.ID: l_ids[l_rows],
+                                            sem_tf.ra: l_ra[l_rows],
+                                            sem_tf.dec: l_dec[l_rows]})
+
+        union_positions = UnionPositions(d_shear_tables)
+        assert union_positions.num_objects_with_differing_positions == 0
+
+        d_match_args = {"gal_kdtree": d_tu_kdtrees["gal"],
+                        "star_kdtree": d_tu_kdtrees["star"],
+                        "local_ra_range": local_ra_range,
+                        "local_dec_range": local_dec_range,
+                        "match_threshold": self.MATCH_THRESHOLD}
+
+        union_best_star_id, union_best_gal_id = find_filtered_best_matches(se_kdtree=union_positions.kdtree,
+                                                                           ra=union_positions.ra,
+                                                                           dec=union_positions.dec,
+                                                                           **d_match_args)
+
+        for method, shear_table in d_shear_tables.items():
+            sem_tf = D_SHEAR_ESTIMATION_METHOD_TUM_TABLE_FORMATS[method]
+
+            l_ex_best_star_id, l_ex_best_gal_id = find_filtered_best_matches(
+                se_kdtree=SkyKDTree(ra=shear_table[sem_tf.ra], dec=shear_table[sem_tf.dec]),
+                ra=shear_table[sem_tf.ra],
+                dec=shear_table[sem_tf.dec],
+                **d_match_args)
+
+            assert np.any(l_ex_best_gal_id >= 0)
+            assert np.any(l_ex_best_star_id >= 0)
+            assert np.any(l_ex_best_gal_id < 0)
+
+            l_union_index = union_positions.get_indices(shear_table[sem_tf.ID])
+            assert np.all(union_best_star_id[l_union_index] == l_ex_best_star_id)
+            assert np.all(union_best_gal_id[l_union_index] == l_ex_best_gal_id)
+
+    def test_get_matched_table(self):
+        """ Test that gathering the matched rows of the shear estimates and TU tables gives the same table as joining
+            them on the index of the matched TU source.
+        """
+
+        rng = np.random.default_rng(seed=2351)
+
+        num_matches = self.NUM_OBJECTS // 4
+
+        shear_table = Table({"OBJECT_ID": np.arange(self.NUM_OBJECTS),
+                             "RA": rng.uniform(self.RA_RANGE[0], self.RA_RANGE[1], self.NUM_OBJECTS)})
+        tu_catalog = Table({"RA": rng.uniform(self.RA_RANGE[0], self.RA_RANGE[1], self.NUM_SOURCES),
+                            "SOURCE_ID": np.arange(self.NUM_SOURCES)})
+
+        l_best_tu_id = np.full(self.NUM_OBJECTS, -99)
+        l_matched_rows = rng.choice(self.NUM_OBJECTS, num_matches, replace=False)
+        l_best_tu_id[l_matched_rows] = rng.choice(self.NUM_SOURCES, num_matches, replace=False)
+
+        matched_table = get_matched_table(shear_table, tu_catalog, l_best_tu_id)
+
+        # Compare to the table we get from joining on the index of the TU source
+        shear_table["TU_INDEX"] = l_best_tu_id
+        tu_catalog["TU_INDEX"] = np.arange(self.NUM_SOURCES)
+        ex_matched_table = join(shear_table, tu_catalog, keys="TU_INDEX")
+        ex_matched_table.remove_column("TU_INDEX")
+
+        assert len(matched_table) == num_matches
+        assert matched_table.colnames == ex_matched_table.colnames
+        for colname in matched_table.colnames:
+            assert np.all(matched_table[colname] == ex_matched_table[colname])
+
+    @staticmethod
+    def _make_tile_matched_table(tile_i: int, num_rows: int, with_tu_columns: bool = True) -> Table:
+        """ Makes a mock matched table for a tile, with columns which differ between tiles in their types, widths, and
+            masking, as can happen with real data, and without the TU columns if desired, as for tiles with no matches.
+        """
+
+        rng = np.random.default_rng(seed=tile_i)
+
+        t = Table({"OBJECT_ID": np.arange(num_rows, dtype=np.int32 if tile_i % 2 == 0 else np.int64) + 1000 * tile_i,
+                   "G1": rng.random(num_rows)},
+                  meta={"TILE": tile_i})
+        if with_tu_columns:
+            t["SOURCE_ID"] = MaskedColumn(rng.integers(0, 1000, num_rows), mask=rng.random(num_rows) < 0.1 * tile_i)
+            t["NAME"] = np.array(["s" * (tile_i + 1)] * num_rows)
+
+        return t
+
+    def test_match_tiles_streamed_output(self, monkeypatch):
+        """ Test that matching tiles and writing out the matched catalog streamed from them gives the same file as
+            stacking the matched tables for all tiles with `vstack` and writing that out.
+        """
+
+        l_num_rows = [0, 200, 0, 50, 300]
+        l_d_tile_args = [{"tile_i": tile_i,
+                          "local_ra_range": self.RA_RANGE,
+                          "local_dec_range": self.DEC_RANGE} for tile_i in range(len(l_num_rows))]
+
+        def mock_match_within_coord_range(gal_matched_tables, star_matched_tables, tile_i, **_kwargs):
+            num_rows = l_num_rows[tile_i]
+            for method in ShearEstimationMethods:
+                gal_matched_tables[method].append(self._make_tile_matched_table(tile_i, num_rows,
+                                                                                with_tu_columns=num_rows > 0))
+                star_matched_tables[method].append(self._make_tile_matched_table(tile_i, num_rows // 2,
+                                                                                 with_tu_columns=num_rows // 2 > 0))
+
+        def add_bin_column(t: Table):
+            assert len(t) > 0
+            t["BIN"] = 2 * t["G1"]
+
+        monkeypatch.setattr(match_to_tu, "match_within_coord_range", mock_match_within_coord_range)
+
+        gal_matched_tables = {method: BinTableStream(workdir=self.workdir) for method in ShearEstimationMethods}
+        star_matched_tables = {method: BinTableStream(workdir=self.workdir) for method in ShearEstimationMethods}
+
+        match_tiles(l_d_tile_args=l_d_tile_args,
+                    d_shared_args={},
+                    gal_matched_tables=gal_matched_tables,
+                    star_matched_tables=star_matched_tables,
+                    prepare_gal_matched_table=add_bin_column)
+
+        method = ShearEstimationMethods.LENSMC
+        unmatched_table = self._make_tile_matched_table(0, 100)
+
+        qualified_filename = os.path.join(self.workdir, "streamed_matched_catalog.fits")
+        write_matched_catalog(qualified_filename,
+                              [gal_matched_tables[method], star_matched_tables[method], unmatched_table])
+
+        for stream in (*gal_matched_tables.values(), *star_matched_tables.values()):
+            stream.close()
+
+        # Stack the tables for all tiles, including those with no matches, and add the bin column to the stacked galaxy
+        # table, as was done before the output was streamed, and write that out to compare
+        l_gal_tables = [self._make_tile_matched_table(tile_i, num_rows, with_tu_columns=num_rows > 0)
+                        for tile_i, num_rows in enumerate(l_num_rows)]
+        l_star_tables = [self._make_tile_matched_table(tile_i, num_rows // 2, with_tu_columns=num_rows // 2 > 0)
+                         for tile_i, num_rows in enumerate(l_num_rows)]
+
+        ex_gal_table = vstack(l_gal_tables, metadata_conflicts="silent")
+        add_bin_column(ex_gal_table)
+        ex_star_table = vstack(l_star_tables, metadata_conflicts="silent")
+        for t in (ex_gal_table, ex_star_table):
+            t.meta = {"TILE": len(l_num_rows) - 1}
+
+        ex_qualified_filename = os.path.join(self.workdir, "stacked_matched_catalog.fits")
+        write_matched_catalog(ex_qualified_filename, [ex_gal_table, ex_star_table, unmatched_table])
+
+        with open(qualified_filename, "rb") as fi, open(ex_qualified_filename, "rb") as ex_fi:
+            assert fi.read() == ex_fi.read()
+
+    def test_match_tiles_num_processes(self):
+        """ Test that matching tiles in parallel with a pool of worker processes gives the same output files as matching
+            them one at a time.
+        """
+
+        d_l_output = {}
+        for num_processes in (1, 2):
+
+            workdir = os.path.join(self.workdir, f"num_processes_{num_processes}")
+            os.makedirs(workdir)
+
+            d_run_results = run_match_to_tu_benchmark(workdir,
+                                                      num_sources=20000,
+                                                      num_files=3,
+                                                      objects_per_source=0.05,
+                                                      unmatched_fraction=0.2,
+                                                      num_processes=num_processes,
+                                                      max_objects_per_tile=100)
+
+            # Check there are more tiles than can be in flight at once, so that the results are collected while
+            # further tiles are still being submitted
+            assert d_run_results["num_tiles"] > 2 * num_processes
+            assert d_run_results["num_gal_matched"] > 0
+            assert d_run_results["num_star_matched"] > 0
+
+            l_output = []
+            for method in ShearEstimationMethods:
+                qualified_filename = os.path.join(workdir, f"matched_catalog_{method.name}.fits")
+                if os.path.exists(qualified_filename):
+                    with open(qualified_filename, "rb") as fi:
+                        l_output.append(fi.read())
+            d_l_output[num_processes] = l_output
+
+        assert len(d_l_output[1]) > 0
+        assert d_l_output[2] == d_l_output[1]
+
+    def test_match_tiles_no_gal_matches(self, monkeypatch):
+        """ Test that the galaxy matched table for each method has the columns added by `prepare_gal_matched_table`
+            even if no tile has any galaxy matches.
+        """
+
+        l_d_tile_args = [{"tile_i": tile_i,
+                          "local_ra_range": self.RA_RANGE,
+                          "local_dec_range": self.DEC_RANGE} for tile_i in range(3)]
+
+        def mock_match_within_coord_range(gal_matched_tables, star_matched_tables, tile_i, **_kwargs):
+            for method in ShearEstimationMethods:
+                gal_matched_tables[method].append(self._make_tile_matched_table(tile_i, 0, with_tu_columns=False))
+                star_matched_tables[method].append(self._make_tile_matched_table(tile_i, 10))
+
+        def add_bin_column(t: Table):
+            t["BIN"] = 2 * t["G1"]
+
+        monkeypatch.setattr(match_to_tu, "match_within_coord_range", mock_match_within_coord_range)
+
+        gal_matched_tables = {method: BinTableStream(workdir=self.workdir) for method in ShearEstimationMethods}
+        star_matched_tables = {method: BinTableStream(workdir=self.workdir) for method in ShearEstimationMethods}
+
+        match_tiles(l_d_tile_args=l_d_tile_args,
+                    d_shared_args={},
+                    gal_matched_tables=gal_matched_tables,
+                    star_matched_tables=star_matched_tables,
+                    prepare_gal_matched_table=add_bin_column)
+
+        try:
+            for method in ShearEstimationMethods:
+                gal_hdu = gal_matched_tables[method].to_hdu()
+                assert gal_hdu.header["NAXIS2"] == 0
+                assert "BIN" in gal_hdu.columns.names
+        finally:
+            for stream in (*gal_matched_tables.values(), *star_matched_tables.values()):
+                stream.close()
@@ -0,0 +1,147 @@
+"""
+:file: tests/python/quantile_sketch_test.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Unit tests of the mergeable quantile sketch used to determine bin limits from many catalogs
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+from astropy.table import Table
+
+from SHE_Validation.binning import quantile_sketch
+from SHE_Validation.binning.quantile_sketch import QuantileSketch, get_sketch_for_file, get_sketch_for_files
+from SHE_Validation.testing.utility import SheValTestCase
+
+
+class TestQuantileSketch(SheValTestCase):
+    """ Unit tests of the QuantileSketch class and functions for filling it from files.
+    """
+
+    def test_exact(self):
+        """ Tests that a sketch which hasn't exceeded its size stores all good values added to it, including when
+            merged from other sketches.
+        """
+
+        rng = np.random.default_rng(seed=4251)
+
+        l_data_1 = rng.normal(size=100)
+        l_data_2 = rng.normal(size=50)
+        l_data_2[::10] = np.nan
+
+        sketch = QuantileSketch(sketch_size=1000)
+        sketch.update(l_data_1)
+
+        other_sketch = QuantileSketch(sketch_size=1000)
+        other_sketch.update(l_data_2)
+        sketch.merge(other_sketch)
+
+        assert sketch.is_exact
+        assert len(sketch) == 145
+        assert len(other_sketch) == 45
+
+        l_sorted_values, l_weights = sketch.get_sorted_values_and_weights()
+        l_good_data = np.concatenate((l_data_1, l_data_2[~np.isnan(l_data_2)]))
+
+        assert np.array_equal(l_sorted_values, np.sort(l_good_data))
+        assert np.all(l_weights == 1)
+
+    def test_compacted(self):
+        """ Tests that a sketch of many more values than its size stays bounded in memory and estimates quantiles
+            accurately.
+        """
+
+        rng = np.random.default_rng(seed=8890)
+
+        num_values = 200000
+        l_data = rng.lognormal(size=num_values)
+
+        sketch = QuantileSketch(sketch_size=512)
+        for l_chunk in np.array_split(l_data, 20):
+            sketch.update(l_chunk)
+
+        assert not sketch.is_exact
+        assert len(sketch) == num_values
+        assert sketch.nbytes <= 3 * 512 * 8 + 8 * len(sketch.l_levels)
+
+        l_sorted_values, l_weights = sketch.get_sorted_values_and_weights()
+        assert l_weights.sum() == num_values
+
+        # Check the rank of each stored value, as estimated from the weights, against its true rank
+        l_est_rank = (np.cumsum(l_weights) - l_weights / 2) / num_values
+        l_true_rank = np.searchsorted(np.sort(l_data), l_sorted_values) / num_values
+        assert np.max(np.abs(l_est_rank - l_true_rank)) < 0.02
+
+    def test_get_sketch_for_files(self):
+        """ Tests reading sketches of a column from files, with files missing the column skipped.
+        """
+
+        workdir = self.workdir
+        rng = np.random.default_rng(seed=1302)
+
+        l_filenames = []
+        l_l_data = []
+        for file_index in range(3):
+            l_data = rng.normal(size=100).astype(np.float32)
+            filename = f"bin_data_{file_index}.fits"
+            Table({"SNR": l_data, "SIZE": np.ones(100)}).write(os.path.join(workdir, filename), overwrite=True)
+            l_filenames.append(filename)
+            l_l_data.append(l_data)
+
+        Table({"SIZE": np.ones(10)}).write(os.path.join(workdir, "no_snr.fits"), overwrite=True)
+
+        sketch = get_sketch_for_files(l_filenames + ["no_snr.fits"], colname="SNR", workdir=workdir)
+
+        assert len(sketch) == 300
+        assert np.array_equal(sketch.get_sorted_values_and_weights()[0], np.sort(np.concatenate(l_l_data)))
+
+        # Check that the sketch for each file is cached and not modified by merging
+        qualified_filename = os.path.join(workdir, l_filenames[0])
+        file_sketch = get_sketch_for_file(qualified_filename, colname="SNR")
+        assert get_sketch_for_file(qualified_filename, colname="SNR") is file_sketch
+        assert len(file_sketch) == 100
+
+    def test_file_sketch_cache_size(self, monkeypatch):
+        """ Tests that only the most-recently-used sketches of files are kept in the cache.
+        """
+
+        monkeypatch.setattr(quantile_sketch, "MAX_CACHED_FILE_SKETCHES", 2)
+        monkeypatch.setattr(quantile_sketch, "_d_file_sketch_cache", OrderedDict())
+
+        l_qualified_filenames = []
+        for file_index in range(3):
+            qualified_filename = os.path.join(self.workdir, f"cached_bin_data_{file_index}.fits")
+            Table({"SNR": np.arange(10.) + file_index}).write(qualified_filename, overwrite=True)
+            l_qualified_filenames.append(qualified_filename)
+
+        l_sketches = [get_sketch_for_file(qualified_filename, colname="SNR")
+                      for qualified_filename in l_qualified_filenames[:2]]
+
+        # Using the first sketch again should make the second the least-recently-used, so it's discarded to make room
+        # for the third
+        assert get_sketch_for_file(l_qualified_filenames[0], colname="SNR") is l_sketches[0]
+        get_sketch_for_file(l_qualified_filenames[2], colname="SNR")
+        assert len(quantile_sketch._d_file_sketch_cache) == 2
+
+        assert get_sketch_for_file(l_qualified_filenames[0], colname="SNR") is l_sketches[0]
+        sketch = get_sketch_for_file(l_qualified_filenames[1], colname="SNR")
+        assert sketch is not l_sketches[1]
+        assert np.array_equal(sketch.get_sorted_values_and_weights()[0],
+                              l_sketches[1].get_sorted_values_and_weights()[0])
@@ -0,0 +1,371 @@
+"""
+:file: tests/python/table_utility_test.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Unit tests of the table_utility.py module
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import io
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pytest
+from astropy.io import fits
+from astropy.io.fits import table_to_hdu
+from astropy.table import MaskedColumn, Table, TableMergeError, vstack
+
+from SHE_Validation import table_utility
+from SHE_Validation.table_utility import (BinTableStream, IDIndex, MISSING_ROW, TableBuffer, get_id_index,
+                                          get_table_of_columns, read_memmapped_table, )
+from SHE_Validation.testing.utility import SheValTestCase
+
+
+class TestTableUtility:
+    """ Unit tests of classes and functions in the table_utility module.
+    """
+
+    @staticmethod
+    def _make_tables() -> List[Table]:
+        """ Makes a list of tables which can be stacked, including tables with no rows, with missing columns, and
+            with masked columns.
+        """
+
+        rng = np.random.default_rng(seed=5134)
+
+        l_tables = []
+        for i, num_rows in enumerate((0, 700, 0, 1500, 20)):
+            t = Table({"ID": np.arange(num_rows) + 10000 * i,
+                       "X": rng.random(num_rows),
+                       "NAME": np.array(["a" * (i + 1)] * num_rows, dtype=f"U{i + 1}")},
+                      meta={"KEY": "VALUE"})
+            t["X"].unit = "deg"
+
+            # Leave a column out of some tables, and mask another in some
+            if i % 2 == 1:
+                t["Y"] = MaskedColumn(rng.random(num_rows), mask=rng.random(num_rows) < 0.5)
+            if i != 0:
+                t["Z"] = np.full(num_rows, i)
+
+            l_tables.append(t)
+
+        return l_tables
+
+    @staticmethod
+    def _assert_tables_equal(t: Table, ex_t: Table):
+        """ Checks that two tables are identical, including masks and column types.
+        """
+
+        assert len(t) == len(ex_t)
+        assert t.colnames == ex_t.colnames
+        assert t.meta == ex_t.meta
+
+        for colname in ex_t.colnames:
+            assert type(t[colname]) is type(ex_t[colname])
+            assert t[colname].dtype == ex_t[colname].dtype
+            assert t[colname].unit == ex_t[colname].unit
+            if isinstance(ex_t[colname], MaskedColumn):
+                assert np.all(t[colname].mask == ex_t[colname].mask)
+                assert np.all(t[colname][~t[colname].mask] == ex_t[colname][~ex_t[colname].mask])
+            else:
+                assert np.all(t[colname] == ex_t[colname])
+
+    def test_table_buffer(self):
+        """ Test that appending tables to a TableBuffer gives the same result as stacking them.
+        """
+
+        l_tables = self._make_tables()
+
+        table_buffer = TableBuffer(initial_capacity=100)
+        for t in l_tables:
+            table_buffer.append(t)
+
+        assert table_buffer.num_tables == len(l_tables)
+        assert len(table_buffer) == sum(len(t) for t in l_tables)
+
+        self._assert_tables_equal(table_buffer.to_table(), vstack(l_tables))
+
+    def test_table_buffer_extend(self):
+        """ Test that extending a TableBuffer with others gives the same result as appending all tables to it.
+        """
+
+        l_tables = self._make_tables()
+
+        table_buffer = TableBuffer(max_rows=1000)
+        for i in range(0, len(l_tables), 2):
+            other_table_buffer = TableBuffer()
+            for t in l_tables[i:i + 2]:
+                other_table_buffer.append(t)
+            table_buffer.extend(other_table_buffer)
+
+        assert table_buffer.num_tables == len(l_tables)
+
+        self._assert_tables_equal(table_buffer.to_table(), vstack(l_tables))
+
+    def test_id_index(self):
+        """ Test that an IDIndex finds the proper rows for IDs, and handles missing and duplicate IDs.
+        """
+
+        rng = np.random.default_rng(seed=1245)
+
+        l_ids = rng.permutation(1000) * 3
+        id_index = IDIndex(l_ids)
+
+        assert len(id_index) == len(l_ids)
+
+        # Check that we get the right rows, in the order of the requested IDs
+        l_requested_rows = rng.choice(len(l_ids), 200)
+        l_rows = id_index.get_rows(l_ids[l_requested_rows])
+        assert np.all(l_rows == l_requested_rows)
+
+        # Check handling of missing IDs, including IDs below and above the range of those in the table
+        l_requested_ids = np.array([l_ids[5], 1, -10, 10000, l_ids[7]])
+        with pytest.raises(ValueError):
+            id_index.get_rows(l_requested_ids)
+        assert np.all(id_index.get_rows(l_requested_ids, allow_missing=True) ==
+                      [5, MISSING_ROW, MISSING_ROW, MISSING_ROW, 7])
+        assert np.all(id_index.contains(l_requested_ids) == [True, False, False, False, True])
+
+        # Check that the first row is used for duplicate IDs, or all rows if requested
+        assert np.all(IDIndex([4, 2, 4, 2]).get_rows([2, 4]) == [1, 0])
+        assert np.all(IDIndex([4, 2, 4, 2, 4]).get_all_rows([2, 7, 4, 2]) == [1, 3, 0, 2, 4, 1, 3])
+        assert np.all(id_index.get_all_rows(l_requested_ids) == [5, 7])
+        assert len(IDIndex([]).get_all_rows([1, 2])) == 0
+
+        # Check handling of empty indices and requests
+        assert len(id_index.get_rows([])) == 0
+        assert np.all(IDIndex([]).get_rows([1, 2], allow_missing=True) == MISSING_ROW)
+
+    def test_get_id_index(self):
+        """ Test that the IDIndex for a table is cached, and rebuilt when the ID column is replaced.
+        """
+
+        t = Table({"ID": np.arange(10)[::-1]})
+
+        id_index = get_id_index(t, "ID")
+        assert get_id_index(t, "ID") is id_index
+        assert np.all(id_index.get_rows([0, 9]) == [9, 0])
+
+        t["ID"] = np.arange(20)
+
+        new_id_index = get_id_index(t, "ID")
+        assert new_id_index is not id_index
+        assert np.all(new_id_index.get_rows([0, 19]) == [0, 19])
+
+
+class TestReadTableColumns(SheValTestCase):
+    """ Unit tests of reading only selected columns of tables from files.
+    """
+
+    def test_get_table_of_columns(self):
+        """ Tests that selecting columns of a memory-mapped table gives an in-memory table with only those columns.
+        """
+
+        rng = np.random.default_rng(seed=2291)
+
+        num_rows = 1000
+        t = Table({"ID": np.arange(num_rows),
+                   "X": rng.random(num_rows),
+                   "Y": MaskedColumn(rng.integers(0, 10, num_rows), mask=rng.random(num_rows) < 0.2),
+                   "Z": rng.random((num_rows, 2))},
+                  meta={"KEY": "VALUE"})
+        t["X"].unit = "deg"
+
+        qualified_filename = os.path.join(self.workdir, "columns.fits")
+        t.write(qualified_filename, overwrite=True)
+
+        t_mmap = read_memmapped_table(qualified_filename)
+        assert t_mmap.colnames == t.colnames
+
+        # Check that duplicate and missing columns are skipped, and the order of the listed columns is used
+        t_cols = get_table_of_columns(t_mmap, ["Y", "X", "Y", "W"])
+
+        assert t_cols.colnames == ["Y", "X"]
+        assert t_cols.meta["KEY"] == "VALUE"
+        assert t_cols["X"].unit == "deg"
+        assert np.all(t_cols["X"] == t["X"])
+        assert isinstance(t_cols["Y"], MaskedColumn)
+        assert np.all(t_cols["Y"].mask == t["Y"].mask)
+        assert np.all(t_cols["Y"][~t["Y"].mask] == t["Y"][~t["Y"].mask])
+
+        # Check selecting only some rows as well
+        l_rows = np.flatnonzero(t["X"] > 0.7)
+        t_rows = get_table_of_columns(t_mmap, ["ID", "Y", "Z"], l_rows=l_rows)
+        del t_mmap
+
+        assert t_rows.colnames == ["ID", "Y", "Z"]
+        assert np.all(t_rows["ID"] == l_rows)
+        assert np.all(t_rows["Z"] == t["Z"][l_rows])
+        assert np.all(t_rows["Y"].mask == t["Y"].mask[l_rows])
+
+        # Check that the data isn't memory-mapped, and so stays valid after the file is overwritten
+        Table({"ID": np.arange(10)}).write(qualified_filename, overwrite=True)
+        assert np.all(t_cols["X"] == t["X"])
+        assert np.all(t_rows["Z"] == t["Z"][l_rows])
+
+    def test_mask_invalid(self):
+        """ Tests that masking invalid values in columns of a memory-mapped table gives the same table as reading it
+            without memory-mapping.
+        """
+
+        rng = np.random.default_rng(seed=8821)
+
+        num_rows = 500
+        t = Table({"ID": np.arange(num_rows),
+                   "X": rng.random(num_rows),
+                   "Y": rng.random(num_rows),
+                   "NAME": rng.choice(["a", "bc", ""], num_rows)})
+        t["X"][rng.random(num_rows) < 0.3] = np.nan
+
+        qualified_filename = os.path.join(self.workdir, "invalid.fits")
+        t.write(qualified_filename, overwrite=True)
+
+        t_read = Table.read(qualified_filename)
+        t_mmap = read_memmapped_table(qualified_filename)
+
+        # Check the columns aren't masked when read with memory-mapping, but are once copied with invalid values masked
+        assert not isinstance(t_mmap["X"], MaskedColumn)
+
+        t_cols = get_table_of_columns(t_mmap, t.colnames, mask_invalid=True)
+        l_rows = np.flatnonzero(t["Y"] > 0.5)
+        t_rows = get_table_of_columns(t_mmap, t.colnames, l_rows=l_rows, mask_invalid=True)
+        del t_mmap
+
+        for colname in t.colnames:
+            assert isinstance(t_cols[colname], MaskedColumn) == isinstance(t_read[colname], MaskedColumn)
+            assert np.all(np.ma.getmaskarray(t_cols[colname]) == np.ma.getmaskarray(t_read[colname]))
+            assert np.all(np.ma.getmaskarray(t_rows[colname]) == np.ma.getmaskarray(t_read[colname])[l_rows])
+            assert np.all(t_cols[colname] == t_read[colname])
+            assert np.all(t_rows[colname] == t_read[colname][l_rows])
+
+    def _write_streamed_and_stacked(self,
+                                    l_tables: List[Table],
+                                    l_ex_tables: Optional[List[Table]] = None) -> Tuple[bytes, bytes]:
+        """ Writes out a list of tables streamed through a BinTableStream and stacked with `vstack` (or the tables in
+            `l_ex_tables` stacked, if provided), and returns the contents of both files.
+        """
+
+        qualified_filename = os.path.join(self.workdir, "stream.fits")
+        with BinTableStream(workdir=self.workdir) as stream:
+            for t in l_tables:
+                stream.append(t)
+
+            assert stream.num_tables == len(l_tables)
+            assert len(stream) == sum(len(t) for t in l_tables)
+
+            # Check the rows were streamed to a file, rather than falling back to being combined in memory
+            assert stream._table_buffer is None
+
+            fits.HDUList([fits.PrimaryHDU(), stream.to_hdu()]).writeto(qualified_filename, overwrite=True)
+
+        if stream.qualified_filename is not None:
+            assert os.path.dirname(stream.qualified_filename) == self.workdir
+            assert not os.path.exists(stream.qualified_filename)
+
+        if l_ex_tables is None:
+            l_ex_tables = l_tables
+
+        # The stacked table is of all tables, including those with no rows, with the metadata of all
+        ex_t = vstack(l_ex_tables)
+        ex_t.meta.clear()
+        for t in l_ex_tables:
+            ex_t.meta.update(t.meta)
+
+        ex_qualified_filename = os.path.join(self.workdir, "stacked.fits")
+        fits.HDUList([fits.PrimaryHDU(), table_to_hdu(ex_t)]).writeto(ex_qualified_filename, overwrite=True)
+
+        with open(qualified_filename, "rb") as fi, open(ex_qualified_filename, "rb") as ex_fi:
+            return fi.read(), ex_fi.read()
+
+    def test_bin_table_stream(self, monkeypatch):
+        """ Tests that streaming tables to a file and writing out the HDU from it gives the same file as stacking them.
+        """
+
+        # Use small chunks when rewriting rows, so that this is tested over multiple chunks
+        monkeypatch.setattr(table_utility, "BIN_TABLE_STREAM_CHUNK_SIZE", 100)
+
+        rng = np.random.default_rng(seed=6107)
+
+        # Start with a table with no rows and fewer columns, as is the case for tiles with no matches. The tables with
+        # rows differ in the types, widths, and masking of their columns, which the stream needs to promote
+        l_tables = [Table({"ID": np.arange(0)})]
+        for i, num_rows in enumerate((300, 0, 1200, 50)):
+            t = Table({"ID": np.arange(num_rows, dtype=np.int32 if i == 0 else np.int64) + 10000 * i,
+                       "X": rng.random(num_rows),
+                       "NAME": np.array(["a" * (i + 1)] * num_rows, dtype=f"U{i + 1}"),
+                       "Z": rng.random((num_rows, 2)).astype(np.float32)},
+                      meta={"KEY": "VALUE", f"KEY{i}": i})
+            t["X"][rng.random(num_rows) < 0.2] = np.nan
+            t["X"].unit = "deg"
+            if i >= 2:
+                t["ID"] = MaskedColumn(t["ID"], mask=rng.random(num_rows) < 0.1)
+            if i != 2:
+                t["W"] = rng.integers(0, 10, num_rows)
+            l_tables.append(t)
+
+        streamed, stacked = self._write_streamed_and_stacked(l_tables)
+        assert streamed == stacked
+
+        # Check that if no tables have rows, the output has the columns of all tables
+        streamed, stacked = self._write_streamed_and_stacked([t[:0] for t in l_tables])
+        assert streamed == stacked
+        assert set(Table.read(io.BytesIO(streamed)).colnames) == {"ID", "X", "NAME", "Z", "W"}
+
+        # Check that a table with no rows which is missing columns masks them, even once rows have been written, so
+        # that integer columns are written with null values
+        l_tables = [Table({"ID": np.arange(100), "W": rng.integers(0, 10, 100)}),
+                    Table({"ID": np.arange(0)})]
+        streamed, stacked = self._write_streamed_and_stacked(l_tables)
+        assert streamed == stacked
+        with fits.open(io.BytesIO(streamed)) as hdulist:
+            assert "TNULL2" in hdulist[1].header
+
+        # Check that a table with no rows whose column has a type conflicting with those of tables with rows, as
+        # numpy gives for an empty list of strings, doesn't change the column's type, whether it comes before or after
+        # the first rows
+        for empty_i in (0, 1):
+            l_tables = [Table({"ID": np.arange(100), "NAME": np.array(["a"] * 100)}),
+                        Table({"ID": np.arange(50), "NAME": np.array(["aaa"] * 50)})]
+            l_tables.insert(empty_i, Table({"ID": np.arange(0), "NAME": np.array([]), "W": np.arange(0)}))
+            with pytest.raises(TableMergeError):
+                vstack(l_tables)
+
+            l_ex_tables = [t.copy() for t in l_tables]
+            l_ex_tables[empty_i]["NAME"] = np.array([], dtype="U1")
+
+            streamed, stacked = self._write_streamed_and_stacked(l_tables, l_ex_tables)
+            assert streamed == stacked
+            with fits.open(io.BytesIO(streamed)) as hdulist:
+                assert hdulist[1].header["TFORM2"] == "3A"
+
+        # Check that tables with rows which can't be stacked with `vstack` are still combined, in memory
+        l_tables = [Table({"ID": np.arange(100), "FLAG": np.zeros(100, dtype=bool)}),
+                    Table({"ID": np.arange(50), "FLAG": np.ones(50, dtype=np.int16)})]
+        with pytest.raises(TableMergeError):
+            vstack(l_tables)
+
+        with BinTableStream(workdir=self.workdir) as stream:
+            for t in l_tables:
+                stream.append(t)
+            t_streamed = Table(stream.to_hdu().data)
+
+        table_buffer = TableBuffer()
+        for t in l_tables:
+            table_buffer.append(t)
+
+        TestTableUtility._assert_tables_equal(t_streamed, table_buffer.to_table())
@@ -0,0 +1,115 @@
+"""
+:file: tests/python/tiling_test.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Unit tests of the tiling.py module
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import numpy as np
+
+from SHE_Validation.tiling import TilePlan, get_strict_bin_indices, plan_balanced_tiles
+
+MAX_COVERAGE = 1.0
+MAX_OBJECTS_PER_TILE = 500
+
+
+class TestTiling:
+    """ Unit tests of classes and functions in the tiling module.
+    """
+
+    def test_from_grid(self):
+        """ Test that a plan for a regular grid assigns positions to the same tiles as binning in R.A. and Dec.
+            separately.
+        """
+
+        rng = np.random.default_rng(seed=1254)
+
+        ra_limits = np.linspace(10., 13., 4)
+        dec_limits = np.linspace(-1., 1., 3)
+
+        l_ra = rng.uniform(9.5, 13.5, 2000)
+        l_dec = rng.uniform(-1.5, 1.5, 2000)
+
+        # Put some positions exactly on limits, which shouldn't be in any tile
+        l_ra[:5] = ra_limits[1]
+        l_dec[5:10] = dec_limits[1]
+
+        tile_plan = TilePlan.from_grid(ra_limits, dec_limits)
+        assert len(tile_plan) == 6
+
+        l_ra_i = get_strict_bin_indices(l_ra, ra_limits)
+        l_dec_i = get_strict_bin_indices(l_dec, dec_limits)
+        l_ex_tile_i = np.where((l_ra_i >= 0) & (l_dec_i >= 0), l_ra_i * (len(dec_limits) - 1) + l_dec_i, -1)
+
+        assert np.all(tile_plan.get_tile_indices(l_ra, l_dec) == l_ex_tile_i)
+        assert np.all(l_ex_tile_i[:10] == -1)
+
+        ra_range, dec_range = tile_plan.l_tile_ranges[1 * 2 + 1]
+        assert np.all(ra_range == ra_limits[1:3])
+        assert np.all(dec_range == dec_limits[1:3])
+
+    def test_plan_balanced_tiles(self):
+        """ Test that a balanced plan covers all objects, with no tile too large or holding too many objects.
+        """
+
+        rng = np.random.default_rng(seed=8735)
+
+        # Use a clustered distribution of objects at high Dec.
+        l_ra = np.concatenate((rng.uniform(40., 44., 3000), rng.normal(41., 0.1, 3000)))
+        l_dec = np.concatenate((rng.uniform(60., 62., 3000), rng.normal(61., 0.1, 3000)))
+
+        ra_range = (np.min(l_ra) - 0.01, np.max(l_ra) + 0.01)
+        dec_range = (np.min(l_dec) - 0.01, np.max(l_dec) + 0.01)
+
+        tile_plan = plan_balanced_tiles(l_ra, l_dec, ra_range=ra_range, dec_range=dec_range,
+                                        max_coverage=MAX_COVERAGE, max_objects_per_tile=MAX_OBJECTS_PER_TILE)
+
+        l_tile_i = tile_plan.get_tile_indices(l_ra, l_dec)
+        assert np.all(l_tile_i >= 0)
+
+        l_counts = np.bincount(l_tile_i, minlength=len(tile_plan))
+        assert np.max(l_counts) <= MAX_OBJECTS_PER_TILE
+
+        for tile_ra_range, tile_dec_range in tile_plan.l_tile_ranges:
+            max_cos_dec = np.max(np.cos(np.deg2rad(tile_dec_range)))
+            assert (tile_ra_range[1] - tile_ra_range[0]) * max_cos_dec <= MAX_COVERAGE * (1 + 1e-9)
+            assert tile_dec_range[1] - tile_dec_range[0] <= MAX_COVERAGE * (1 + 1e-9)
+
+    def test_plan_balanced_tiles_wraparound(self):
+        """ Test that a region wrapping around R.A. = 0 is tiled without covering the R.A. range in between.
+        """
+
+        rng = np.random.default_rng(seed=3387)
+
+        l_ra = rng.uniform(-1., 1., 4000) % 360.
+        l_dec = rng.uniform(-0.5, 0.5, 4000)
+
+        tile_plan = plan_balanced_tiles(l_ra, l_dec,
+                                        ra_range=(np.min(l_ra) - 0.01, np.max(l_ra) + 0.01),
+                                        dec_range=(-0.51, 0.51),
+                                        max_coverage=MAX_COVERAGE,
+                                        max_objects_per_tile=MAX_OBJECTS_PER_TILE)
+
+        l_tile_i = tile_plan.get_tile_indices(l_ra, l_dec)
+        assert np.all(l_tile_i >= 0)
+        assert np.max(np.bincount(l_tile_i)) <= MAX_OBJECTS_PER_TILE
+
+        # The total R.A. range covered by tiles should be small, and split into two boxes either side of R.A. = 0
+        l_bounding_ranges = tile_plan.get_bounding_ranges()
+        assert len(l_bounding_ranges) == 2
+        assert sum(ra_range[1] - ra_range[0] for ra_range, _ in l_bounding_ranges) < 3.
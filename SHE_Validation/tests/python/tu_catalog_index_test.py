@@ -0,0 +1,110 @@
+"""
+:file: tests/python/tu_catalog_index_test.py
+
+:date: 16 October 2026
+:author: Bryan Gillis
+
+Unit tests of the tu_catalog_index.py module
+"""
+
+# Copyright (C) 2012-2020 Euclid Science Ground Segment
+#
+# This library is free software; you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation; either version 3.0 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+# warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along with this library; if not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import os
+
+import numpy as np
+from astropy.table import Table
+
+from SHE_Validation.testing.utility import SheValTestCase
+from SHE_Validation.tu_catalog_index import TUCatalogIndex
+
+TU_CATALOG_FILENAME = "mock_tu_catalog.fits"
+INDEX_SUBDIR = "tu_index"
+
+
+class TestTUCatalogIndex(SheValTestCase):
+    """ Unit tests of the TUCatalogIndex class.
+    """
+
+    NUM_SOURCES = 5000
+
+    qualified_filename: str
+
+    def post_setup(self):
+        """ Write out a mock TU catalog, including some sources with NaN positions.
+        """
+
+        rng = np.random.default_rng(seed=6124)
+
+        l_ra = rng.uniform(358., 362., self.NUM_SOURCES) % 360.
+        l_dec = rng.uniform(-1., 1., self.NUM_SOURCES)
+        l_ra[:5] = np.nan
+
+        self.qualified_filename = os.path.join(self.workdir, TU_CATALOG_FILENAME)
+        Table({"RA_MAG": l_ra,
+               "DEC_MAG": l_dec,
+               "SOURCE_ID": np.arange(self.NUM_SOURCES)}).write(self.qualified_filename, overwrite=True)
+
+    def test_get_ra_dec_in_range(self):
+        """ Test that all sources within a range are found, in the order they are in the catalog.
+        """
+
+        tu_index = TUCatalogIndex(os.path.join(self.workdir, INDEX_SUBDIR))
+        catalog = Table.read(self.qualified_filename)
+
+        for ra_range, dec_range in (((0.1, 1.3), (-0.6, 0.2)),
+                                    ((358.4, 359.95), (-2., 2.)),
+                                    ((-0.1, 0.01), (0.9, 0.95)),
+                                    ((10., 20.), (-0.5, 0.5))):
+
+            l_rows, l_ra, l_dec = tu_index.get_ra_dec_in_range(self.qualified_filename,
+                                                               ra_range=ra_range,
+                                                               dec_range=dec_range)
+
+            assert np.all(np.diff(l_rows) > 0)
+            assert np.all(l_ra == catalog["RA_MAG"][l_rows])
+            assert np.all(l_dec == catalog["DEC_MAG"][l_rows])
+
+            l_ex_rows = np.flatnonzero((catalog["RA_MAG"] > ra_range[0]) & (catalog["RA_MAG"] < ra_range[1]) &
+                                       (catalog["DEC_MAG"] > dec_range[0]) & (catalog["DEC_MAG"] < dec_range[1]))
+            l_in_range = (l_ra > ra_range[0]) & (l_ra < ra_range[1]) & (l_dec > dec_range[0]) & (l_dec < dec_range[1])
+
+            assert np.all(l_rows[l_in_range] == l_ex_rows)
+
+    def test_rebuild(self):
+        """ Test that the index is rebuilt when the catalog file changes, and not otherwise.
+        """
+
+        tu_index = TUCatalogIndex(os.path.join(self.workdir, INDEX_SUBDIR))
+
+        l_rows, _, _ = tu_index.get_ra_dec_in_range(self.qualified_filename, ra_range=(0., 2.), dec_range=(-1., 1.))
+        assert len(l_rows) > 0
+
+        # Check that the index isn't rebuilt when it's still valid
+        index_stem = tu_index._get_index_stem(self.qualified_filename)
+        index_mtime = os.stat(index_stem + ".json").st_mtime_ns
+
+        tu_index.get_ra_dec_in_range(self.qualified_filename, ra_range=(0., 2.), dec_range=(-1., 1.))
+        assert os.stat(index_stem + ".json").st_mtime_ns == index_mtime
+
+        # Overwrite the catalog with one which has all sources elsewhere, and check that the index is rebuilt
+        Table({"RA_MAG": np.full(10, 100.),
+               "DEC_MAG": np.full(10, 50.),
+               "SOURCE_ID": np.arange(10)}).write(self.qualified_filename, overwrite=True)
+
+        l_rows, _, _ = tu_index.get_ra_dec_in_range(self.qualified_filename, ra_range=(0., 2.), dec_range=(-1., 1.))
+        assert len(l_rows) == 0
+
+        l_rows, _, _ = tu_index.get_ra_dec_in_range(self.qualified_filename, ra_range=(99., 101.),
+                                                    dec_range=(49., 51.))
+        assert np.all(l_rows == np.arange(10))
@@ -40,7 +40,7 @@ from SHE_PPT.products.she_validation_test_results import create_validation_test_
 from SHE_PPT.she_frame_stack import SHEFrameStack
 from SHE_PPT.utility import join_without_none
 from SHE_Validation.argument_parser import CA_SHE_EXP_TEST_RESULTS_LIST, CA_SHE_EXT_CAT, CA_SHE_OBS_TEST_RESULTS
-from SHE_Validation.binning.bin_constraints import GoodBinnedGalaxyMeasurementHBC, get_ids_for_test_cases
+from SHE_Validation.binning.bin_constraints import GoodBinnedGalaxyMeasurementHBC, get_bitsets_for_test_cases
 from SHE_Validation.binning.bin_data import add_bin_columns
 from SHE_Validation.binning.utility import get_d_l_bin_limits
 from SHE_Validation.constants.test_info import BinParameters, TestCaseInfo
@@ -300,13 +300,14 @@ def validate_cti_gal(data_stack: SHEFrameStack,
     for _ in enumerate(l_object_data_table):
         l_d_d_exposure_plot_filenames.append({})
 
-    # Get IDs for all bins
-    d_l_l_test_case_object_ids = get_ids_for_test_cases(l_test_case_info=L_CTI_GAL_TEST_CASE_INFO,
-                                                        d_bin_limits=d_bin_limits,
-                                                        detections_table=data_stack.detections_catalogue,
-                                                        d_measurements_tables=shear_estimate_tables,
-                                                        data_stack=data_stack,
-                                                        bin_constraint_type=GoodBinnedGalaxyMeasurementHBC)
+    # Get bitsets of the objects in all bins, which take much less memory to hold for all test cases at once than
+    # arrays of their IDs. Since the detections catalogue is used to bin objects, all objects in bins are in it
+    d_l_test_case_bitsets = get_bitsets_for_test_cases(l_test_case_info=L_CTI_GAL_TEST_CASE_INFO,
+                                                       d_bin_limits=d_bin_limits,
+                                                       detections_table=data_stack.detections_catalogue,
+                                                       d_measurements_tables=shear_estimate_tables,
+                                                       data_stack=data_stack,
+                                                       bin_constraint_type=GoodBinnedGalaxyMeasurementHBC)
 
     for test_case_info in L_CTI_GAL_TEST_CASE_INFO:
 
@@ -317,7 +318,7 @@ def validate_cti_gal(data_stack: SHEFrameStack,
             l_d_d_exposure_plot_filenames[exp_index][test_case_info.name] = {}
         test_case_bin_limits = d_bin_limits[test_case_info.bins]
         num_bins = len(test_case_bin_limits) - 1
-        l_l_test_case_object_ids = d_l_l_test_case_object_ids[test_case_info.name]
+        l_test_case_bitsets = d_l_test_case_bitsets[test_case_info.name]
 
         # Double check we have at least one bin
         assert num_bins >= 1
@@ -327,8 +328,8 @@ def validate_cti_gal(data_stack: SHEFrameStack,
 
         for bin_index in range(num_bins):
 
-            # Get info for this bin
-            l_test_case_object_ids = l_l_test_case_object_ids[bin_index]
+            # Get info for this bin, only converting its bitset to the (sorted) IDs in it while it's being used
+            l_test_case_object_ids = l_test_case_bitsets[bin_index].to_ids()
             bin_limits = test_case_bin_limits[bin_index:bin_index + 2]
 
             # We'll now loop over the table for each exposure, eventually getting regression results and plots
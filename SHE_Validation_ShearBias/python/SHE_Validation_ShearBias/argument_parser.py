@@ -28,6 +28,7 @@ from .constants.shear_bias_default_config import D_SHEAR_BIAS_CONFIG_CLINE_ARGS
 CA_MAX_G_IN = D_SHEAR_BIAS_CONFIG_CLINE_ARGS[ValidationConfigKeys.SBV_MAX_G_IN]
 CA_BOOTSTRAP_ERRORS = D_SHEAR_BIAS_CONFIG_CLINE_ARGS[ValidationConfigKeys.SBV_BOOTSTRAP_ERRORS]
 CA_REQ_FITCLASS_ZERO = D_SHEAR_BIAS_CONFIG_CLINE_ARGS[ValidationConfigKeys.SBV_REQUIRE_FITCLASS_ZERO]
+CA_NUM_THREADS = "num_threads"
 
 
 class ShearValidationArgumentParser(ValidationArgumentParser):
@@ -51,3 +52,5 @@ class ShearValidationArgumentParser(ValidationArgumentParser):
         self.add_arg_with_type(f'--{CA_REQ_FITCLASS_ZERO}', type=bool, default=None, arg_type=ClineArgType.OPTION,
                                help='If set to true, will only include objects identified as galaxies ('
                                     'FITCLASS==0) in analysis.')
+        self.add_arg_with_type(f'--{CA_NUM_THREADS}', type=int, default=1, arg_type=ClineArgType.OPTION,
+                               help='Number of threads to use to load the matched catalog tables.')
@@ -56,6 +56,7 @@ class ShearBiasDataLoader:
     l_filenames: Sequence[str]
     workdir: str
     method: ShearEstimationMethods
+    num_threads: int = 1
 
     # Attributes determined at init
     _table_loader: BinnedMultiTableLoader
@@ -73,20 +74,42 @@ class ShearBiasDataLoader:
     def __init__(self,
                  l_filenames: Sequence[str],
                  workdir: str,
-                 method: ShearEstimationMethods, ):
+                 method: ShearEstimationMethods,
+                 num_threads: int = 1, ):
 
         # Set attributes from args
         self.l_filenames = l_filenames
         self.workdir = workdir
         self.method = method
+        self.num_threads = num_threads
 
-        # Create a table loader with this list of filenames
+        # Determine the table format
+        self._sem_tf = D_SHEAR_ESTIMATION_METHOD_TUM_TABLE_FORMATS[self.method]
+
+        # Create a table loader with this list of filenames, which loads only the columns we need (plus any needed for
+        # bin constraints), using multiple threads if desired
         self._table_loader = BinnedMultiTableLoader(l_filenames=self.l_filenames,
                                                     workdir=self.workdir,
-                                                    file_loader_type=TableLoader)
+                                                    file_loader_type=TableLoader,
+                                                    l_colnames=self.l_colnames,
+                                                    num_threads=self.num_threads)
 
-        # Determine the table format
-        self._sem_tf = D_SHEAR_ESTIMATION_METHOD_TUM_TABLE_FORMATS[self.method]
+    # Properties
+
+    @property
+    def l_colnames(self) -> List[str]:
+        """ The names of the columns of the tables needed to calculate shear bias, aside from any bin columns.
+        """
+        return [self._sem_tf.tu_gamma1,
+                self._sem_tf.tu_gamma2,
+                self._sem_tf.tu_kappa,
+                self._sem_tf.g1,
+                self._sem_tf.g2,
+                self._sem_tf.g1_err,
+                self._sem_tf.g2_err,
+                self._sem_tf.fit_flags,
+                self._sem_tf.fit_class,
+                self._sem_tf.weight, ]
 
     # Output properties
 
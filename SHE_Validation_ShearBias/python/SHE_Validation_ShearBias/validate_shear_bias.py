@@ -24,7 +24,6 @@ import os
 from typing import Any, Dict, List
 
 import numpy as np
-from astropy.table import Table
 
 from SHE_PPT import file_io
 from SHE_PPT.argument_parser import CA_DRY_RUN, CA_PIPELINE_CONFIG, CA_WORKDIR
@@ -38,6 +37,7 @@ from SHE_Validation.argument_parser import CA_SHE_MATCHED_CAT, CA_SHE_MATCHED_CA
 from SHE_Validation.binning.utility import get_d_l_bin_limits
 from SHE_Validation.constants.default_config import ExecutionMode
 from SHE_Validation.constants.test_info import BinParameters
+from .argument_parser import CA_NUM_THREADS
 from .constants.shear_bias_test_info import (L_SHEAR_BIAS_TEST_CASE_C_INFO, L_SHEAR_BIAS_TEST_CASE_M_INFO,
                                              NUM_SHEAR_BIAS_TEST_CASES, )
 from .data_processing import ShearBiasDataLoader, ShearBiasTestCaseDataProcessor
@@ -81,14 +81,16 @@ def validate_shear_bias_from_args(d_args: Dict[str, Any], mode: ExecutionMode) -
     for method in ShearEstimationMethods:
         d_data_loaders[method] = ShearBiasDataLoader(l_filenames=d_method_l_table_filenames[method],
                                                      workdir=workdir,
-                                                     method=method)
+                                                     method=method,
+                                                     num_threads=d_args[CA_NUM_THREADS])
 
-    # Get the bin limits from the pipeline_config. Use the first LensMC table to determine auto bin limits FIXME
-    bin_data_table = Table.read(os.path.join(workdir, d_method_l_table_filenames[ShearEstimationMethods.LENSMC][0]))
+    # Get the bin limits from the pipeline_config. Use all LensMC tables to determine auto bin limits, streaming only
+    # the needed column from each
+    l_bin_data_filenames = d_method_l_table_filenames[ShearEstimationMethods.LENSMC]
     d_l_bin_limits: Dict[BinParameters, np.ndarray] = get_d_l_bin_limits(d_args[CA_PIPELINE_CONFIG],
                                                                          d_local_bin_keys=D_SHEAR_BIAS_BIN_KEYS,
-                                                                         bin_data_table=bin_data_table)
-    # TODO: Figure out a bin data table here to use
+                                                                         l_bin_data_filenames=l_bin_data_filenames,
+                                                                         workdir=workdir)
 
     # Perform validation for each shear estimation method
     for test_case_index, test_case_info in enumerate(L_SHEAR_BIAS_TEST_CASE_M_INFO):